@@ -1,42 +1,41 @@
 """
 Bot setup
 
-Configuration of logging, DB connection and cog loading is done here.
+Configuration of logging, DB connection and the bot is done here.
+Cog loading and the rest of startup is handled by SuperJBot, see utils/startup.py
 """
 
+# Recorded before anything else, so that logged startup times include imports
+import time
+START_TIME = time.perf_counter()
+
 # external imports
 import os
-import logging
 from mongoengine import connect
+from pymongo import monitoring
 
 # discord imports
 import discord
-from discord.ext.commands import Bot
 
 # module imports
-import utils.tasks
-from settings.constants import TOKEN
+from utils import logs
+from utils import metrics
+from utils.lag import LagMonitor
+from utils.members import MemberCache
+from utils.outbox import Outbox
+from utils.startup import SuperJBot
+from settings.constants import TOKEN, MEMBER_CACHE, MEMBER_LRU_SIZE, METRICS_PORT, LAG_THRESHOLD
 
 ## Configure Logging
 
-# Create handlers
-c_handler = logging.StreamHandler()
-f_handler = logging.FileHandler('superjbot.log')
-c_handler.setLevel(logging.INFO)
-f_handler.setLevel(logging.DEBUG)
-
-# Create formatters and add it to handlers
-c_format = logging.Formatter('%(asctime)s:%(name)s:%(levelname)s# %(message)s', datefmt='%d.%m.%y-%H:%M:%S')
-f_format = logging.Formatter('%(asctime)s:%(name)s:%(levelname)s# %(message)s', datefmt='%d.%m.%y-%H:%M:%S')
-c_handler.setFormatter(c_format)
-f_handler.setFormatter(f_format)
-
-# Add handlers to the logger
-# Level also set here as logs weren't being output without it
-logging.basicConfig(
-    level=logging.DEBUG,
-    handlers=[c_handler, f_handler]
-    )
+# Records are written by a background thread, so logging never blocks the event loop
+# Chatty loggers are rate limited, as (records, per seconds)
+logs.setup('superjbot.log', rate_limits={
+    # A line for every command invocation
+    "bot.commands": (30, 60),
+    # discord.py logs every gateway event at DEBUG
+    "discord.gateway": (60, 60)
+})
 
 # Create required intents
 # Add members intent to run member events
@@ -44,31 +43,28 @@ intents = discord.Intents.default()
 intents.members = True
 
 # Instantiate the bot
-bot = Bot(command_prefix="!", intents=intents)
+# In lazy member cache mode, members aren't chunked on connect or cached by discord.py
+# Member events are still received, and members are fetched when needed into the bounded bot.members cache
+if MEMBER_CACHE == "lazy":
+    bot = SuperJBot(command_prefix="!", intents=intents, start_time=START_TIME,
+                    chunk_guilds_at_startup=False, member_cache_flags=discord.MemberCacheFlags.none())
+else:
+    bot = SuperJBot(command_prefix="!", intents=intents, start_time=START_TIME)
 
-# Connect to the mongodb cluster
-connect(host=os.environ['DBURL'])
+bot.members = MemberCache(bot, MEMBER_LRU_SIZE)
 
-# Run when the bot succesfully logs into Discord
-@bot.event
-async def on_ready():
-    # For each guild that the bot is logged into, prints user, guild name and ID
-    for i in bot.guilds:
-        logging.info(f"Logged in as \'{bot.user}\' in \'{i.name}\' (Guild ID: {i.id})")
+# Measure event loop lag for the lifetime of the bot, reported by !ping and !lag
+bot.lag_monitor = LagMonitor(threshold=LAG_THRESHOLD)
 
-    # Load all of the cogs in the cogs/ folder
-    # Cogs are loaded on_ready in case any of the loops need to send updates to channels
-    for filename in os.listdir("./bot/cogs"):
-        if filename.endswith(".py") and filename != "__init__.py":
-            bot.load_extension(f"cogs.{filename[:-3]}")
+# Queue for notifications sent by watchers and listeners, paced to stay within rate limits
+bot.outbox = Outbox()
 
-            logging.info(f"Loaded Cog: {filename[:-3]}")
-    
-    # Store guild, channel and user IDs in bot attributes
-    logging.info("Creating bot attributes from IDs")
-    utils.tasks.set_ids(bot)
+# Time every DB command for the metrics endpoint, this has to be registered before connecting
+if METRICS_PORT:
+    monitoring.register(metrics.MongoListener())
 
-    logging.info("Finished logging in")
+# Connect to the mongodb cluster
+connect(host=os.environ['DBURL'])
 
 # Starts the bot when the module is run
 # TOKEN is defined in constants and should be set for staging or prod environments
@@ -12,9 +12,16 @@ from mongoengine import errors
 import discord
 from discord.ext import commands
 
+from utils import cache
 from utils import checks
+from utils import db
 from utils import embeds
-from database.models import SpoilerMode, ScheduleShow
+from utils import outbox
+from utils import singleflight
+from database.models import SpoilerMode, ScheduleShow, ScrapeRun
+
+# Number of each scraper job's latest runs summarised by !scrapestatus
+SCRAPE_STATUS_RUNS = 20
 
 class Admin(commands.Cog):
     def __init__(self, bot):
@@ -33,7 +40,10 @@ class Admin(commands.Cog):
         )
     @commands.check(checks.is_admin)
     async def ping(self, ctx):
-        await ctx.send(f"Hello, I'm here :grinning: \nBot Latency: {round(self.bot.latency * 1000)}ms")
+        lag = self.bot.lag_monitor.summary()
+        await ctx.send(f"Hello, I'm here :grinning: \nBot Latency: {round(self.bot.latency * 1000)}ms"
+                       f"\nEvent Loop Lag: {lag['current']:.1f}ms now, {lag['mean']:.1f}ms mean, {lag['window_max']:.1f}ms max (last 2 min), {lag['max']:.1f}ms max since start"
+                       f"\nDB: {db.summary()}")
 
     # Admin only - stops the bot from running
     # In production, the container will restart, rendering this a "restart" function
@@ -80,39 +90,47 @@ class Admin(commands.Cog):
         try:
             # send to relevant channel
             if mode == "njpw":
-                spoiler_mode.save()
-                await self.bot.general_channel.send(
+                await db.run(spoiler_mode.save)
+                cache.invalidate("spoiler_mode")
+                self.bot.outbox.send(self.bot.general_channel,
                             content=f"@here **{spoiler_mode.title}** starting. Head to {self.bot.njpw_spoiler_channel.mention} for spoiler chat.",
-                            embed=embeds.spoiler_mode_embed(spoiler_mode)
+                            embed=embeds.spoiler_mode_embed(spoiler_mode),
+                            priority=outbox.HIGH
                         )
 
             elif mode == "non-njpw":
-                spoiler_mode.save()
-                await self.bot.non_njpw_channel.send(
+                await db.run(spoiler_mode.save)
+                cache.invalidate("spoiler_mode")
+                self.bot.outbox.send(self.bot.non_njpw_channel,
                             content=f"@here **{spoiler_mode.title}** starting. Head to {self.bot.non_njpw_spoiler_channel.mention} for spoiler chat",
-                            embed=embeds.spoiler_mode_embed(spoiler_mode)
+                            embed=embeds.spoiler_mode_embed(spoiler_mode),
+                            priority=outbox.HIGH
                         )
 
             elif mode == "off":
-                spoiler_mode = SpoilerMode.objects.get(title=title)
-                spoiler_mode.delete()
+                spoiler_mode = await db.run(lambda: SpoilerMode.objects.get(title=title))
+                await db.run(spoiler_mode.delete)
+                cache.invalidate("spoiler_mode")
                 if spoiler_mode.mode == "njpw":
-                    await self.bot.general_channel.send(
+                    next_show = await db.run(lambda: list(ScheduleShow.objects(date__gt=datetime.now())[:1]))
+                    self.bot.outbox.send(self.bot.general_channel,
                             content=f"@here **{title}** _#spoiler-zone_ time has ended. Spoil away.\n\nNext show:",
-                            embed=embeds.schedule_shows_embed(ScheduleShow.objects(date__gt=datetime.now())[:1], 1)
+                            embed=embeds.schedule_shows_embed(next_show, 1),
+                            priority=outbox.HIGH
                         )
 
                 if spoiler_mode.mode == "non-njpw":
-                    await self.bot.non_njpw_channel.send(
-                        f"@here **{title}** _#spoiler-zone_ time has ended. Spoil away."
+                    self.bot.outbox.send(self.bot.non_njpw_channel,
+                        f"@here **{title}** _#spoiler-zone_ time has ended. Spoil away.",
+                        priority=outbox.HIGH
                     )
 
             else:
                 await ctx.send("_mode_ must be one of: \"njpw\", \"non-njpw\", \"off\"")
-                spoiler_mode.delete()
+                await db.run(spoiler_mode.delete)
         
         except errors.NotUniqueError:
-            spoiler_mode = SpoilerMode.objects.get(title=title)
+            spoiler_mode = await db.run(lambda: SpoilerMode.objects.get(title=title))
             await ctx.send(content=f"Event \"{title}\" already exists",
                             embed=embeds.spoiler_mode_embed(spoiler_mode))
 
@@ -120,6 +138,119 @@ class Admin(commands.Cog):
                     await ctx.send(content=f"Event \"{title}\" does not exist.")
 
 
+    # Show hit/miss counts for the read-through cache used by read-mostly commands
+    @commands.command(name="cachestats",
+        brief="Show cache hit rates",
+        help="""Shows the number of hits, misses and invalidations of the query cache for each collection,
+                and the number of identical concurrent requests which were coalesced into a single lookup.""",
+        hidden=True
+        )
+    @commands.check(checks.is_admin)
+    async def cache_stats(self, ctx):
+        lines = cache.summary()
+        await ctx.send("**Cache stats**\n" + ("\n".join(lines) if lines else "No cached queries yet"))
+
+        lines = singleflight.summary()
+        await ctx.send("**Coalesced requests**\n" + ("\n".join(lines) if lines else "No lookups yet"))
+
+    # Show event loop lag and what has blocked the loop for longest since the bot started
+    @commands.command(name="lag",
+        brief="Show what has been blocking the bot",
+        help="""Shows current and maximum event loop lag, and the commands, listeners and background tasks which have
+                blocked the event loop for longest since the bot started, with a stack sample of the worst block.""",
+        hidden=True
+        )
+    @commands.check(checks.is_admin)
+    async def lag(self, ctx):
+        lag = self.bot.lag_monitor.summary()
+        lines = [f"**Event loop lag**: {lag['current']:.1f}ms now, {lag['mean']:.1f}ms mean, {lag['max']:.1f}ms max since start"]
+
+        offenders = self.bot.lag_monitor.worst_offenders()
+        if not offenders:
+            lines.append(f"Nothing has blocked the loop for more than {self.bot.lag_monitor.threshold * 1000:.0f}ms")
+
+        for o in offenders:
+            lines.append(f"`{o.name}`: {o.count} blocks, {o.worst * 1000:.0f}ms worst, {o.total / o.count * 1000:.0f}ms mean")
+
+        # The stack sample gets whatever room is left in the message, keeping its innermost frames
+        message = "\n".join(lines)
+        if offenders:
+            prefix, suffix = "\nWorst block:\n```", "```"
+            room = embeds.MESSAGE_LIMIT - len(message) - len(prefix) - len(suffix)
+            stack = "".join(offenders[0].stack)
+            if len(stack) > room:
+                stack = "..." + stack[-(room - 3):] if room > 3 else ""
+            if stack:
+                message += prefix + stack + suffix
+
+        await ctx.send(embeds.truncate(message, embeds.MESSAGE_LIMIT))
+
+    # Show the state of the outbound message queue
+    @commands.command(name="outbox",
+        brief="Show outbound message queue stats",
+        help="Shows the number of queued, sent, retried and failed notifications, and time spent waiting on rate limits.",
+        hidden=True
+        )
+    @commands.check(checks.is_admin)
+    async def outbox_stats(self, ctx):
+        await ctx.send("**Outbox**\n" + "\n".join(self.bot.outbox.summary()))
+
+    # Summarise the scraper's latest runs of each job from the scrape run ledger
+    @commands.command(name="scrapestatus",
+        brief="Show when each scraper job last ran and how it went",
+        help=f"""For each scraper job, shows how long ago it last ran and last succeeded, the median and maximum time
+                taken and number of failures over its last {SCRAPE_STATUS_RUNS} runs, and what its last run fetched and
+                wrote, along with the first error if it failed.""",
+        hidden=True
+        )
+    @commands.check(checks.is_admin)
+    async def scrape_status(self, ctx):
+        runs = await db.run(self.latest_scrape_runs)
+        if not runs:
+            await ctx.send("No scraper runs recorded yet")
+            return
+
+        # Ledger times are UTC
+        now = datetime.utcnow()
+        messages = ["**Scraper status**"]
+
+        for job, job_runs in sorted(runs.items()):
+            lines = []
+            last = job_runs[0]
+            last_ok = next((r for r in job_runs if r.ok), None)
+            seconds = sorted(r.seconds for r in job_runs)
+            failures = len([r for r in job_runs if not r.ok])
+            statuses = ", ".join(f"{code} x{count}" for code, count in sorted(last.statuses.items())) or "none"
+
+            lines.append(f"**{job}**: last ran {ago(last.started_at, now)} ({'ok' if last.ok else 'failed'}, "
+                         f"{last.seconds:.1f}s on {last.worker}), last ok "
+                         + (ago(last_ok.started_at, now) if last_ok else f"not in the last {len(job_runs)} runs"))
+            lines.append(f"\u2003Last {len(job_runs)} runs: {seconds[len(seconds) // 2]:.1f}s median, "
+                         f"{seconds[-1]:.1f}s max, {failures} failed")
+            lines.append(f"\u2003Last run: {last.requests} requests ({last.bytes_fetched / 1024:.0f}KB, {statuses}), "
+                         f"{last.parse_seconds:.1f}s parsing, {last.seen} seen, {last.inserted} inserted, "
+                         f"{last.modified} modified, {last.skipped} skipped")
+            if last.errors:
+                lines.append(f"\u2003Error: `{embeds.truncate(last.errors[0], 200)}`")
+
+            # Jobs are packed into as few messages as fit, without splitting a job across messages
+            block = "\n".join(lines)
+            if len(messages[-1]) + 1 + len(block) > embeds.MESSAGE_LIMIT:
+                messages.append(block)
+            else:
+                messages[-1] += "\n" + block
+
+        for message in messages:
+            await ctx.send(embeds.truncate(message, embeds.MESSAGE_LIMIT))
+
+    # Runs in the DB executor. The latest runs of each job, as {job: [ScrapeRun]} newest first
+    # Each job's runs are a single read on the job and start time index
+    def latest_scrape_runs(self):
+        return {
+            job: list(ScrapeRun.objects(job=job).order_by("-started_at").limit(SCRAPE_STATUS_RUNS))
+            for job in ScrapeRun.objects.distinct("job")
+        }
+
     ###
     # Cog Controls
     ###
@@ -207,5 +338,14 @@ class Admin(commands.Cog):
                 await ctx.invoke(self.bot.get_command("reload"), cog)
 
 
+# How long ago a time was, ie "5m ago"
+def ago(then, now):
+    seconds = (now - then).total_seconds()
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m ago"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h ago"
+    return f"{seconds / 86400:.1f}d ago"
+
 def setup(bot):
-    bot.add_cog(Admin(bot))
\ No newline at end of file
+    bot.add_cog(Admin(bot))
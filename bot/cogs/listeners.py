@@ -5,29 +5,91 @@ Behaviours triggered by certain discord events are defined here
 """
 
 import logging
+import time
 from datetime import datetime, timedelta
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 import utils.tasks
-from database.models import SpoilerMode, KennyAlarm
+from utils import checks
+from utils import db
+from utils import metrics
+from utils.alarm import KennyAlarmState
+from database.models import SpoilerMode
 from settings.constants import (
     NEW_MEMBER_CHANNEL, RULES_CHANNEL, NEW_POD_CHANNEL, OWNER_ID, NJPW_SPOILER_CHANNEL, NON_NJPW_SPOILER_CHANNEL
 )
 
+# Logs every command invocation, so it is rate limited when logging is set up
+commands_log = logging.getLogger("bot.commands")
+
 class Listeners(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-        # If the list of triggers for the Kenny alarm is updated, the listerner cog can be reloaded to update the list
-        # This is more efficient than pulling the list from the DB, which would have to be done on every message
-        self.kenny_alarm_trigger_terms = KennyAlarm.objects.first().trigger_terms
-        logging.info(f"Current kenny alarm trigger terms: {self.kenny_alarm_trigger_terms}")
-        # Pull a list of channels where the alarm cannot be triggered
-        self.kenny_alarm_whitelist_channels = KennyAlarm.objects.first().whitelist_channels
-        logging.info(f"Current kenny alarm whitelisted channels: {self.kenny_alarm_whitelist_channels}")
-        
+        # The Kenny alarm is held in memory so that messages never need a DB read
+        # The state is stored as a bot attribute so that other cogs (ie !gamer) can read it
+        # It is first loaded by warm_up during startup, then kept up to date by kenny_alarm_refresher
+        self.kenny_alarm = KennyAlarmState()
+        self.bot.kenny_alarm = self.kenny_alarm
+
+        # Start the loops which keep the in-memory state and DB in sync
+        logging.info("Starting kenny_alarm_flusher")
+        self.kenny_alarm_flusher.start()
+        logging.info("Starting kenny_alarm_refresher")
+        self.kenny_alarm_refresher.start()
+
+    # Stop the loops and write any pending alarm state when the cog is unloaded
+    # bot.close() unloads all extensions, so this also runs on shutdown
+    # cog_unload can't be a coroutine, so the final flush is a blocking write
+    def cog_unload(self):
+        self.kenny_alarm_flusher.cancel()
+        self.kenny_alarm_refresher.cancel()
+
+        try:
+            self.kenny_alarm.flush()
+        except Exception as e:
+            logging.error("Unable to flush kenny alarm state on unload: " + str(e))
+
+        if getattr(self.bot, "kenny_alarm", None) is self.kenny_alarm:
+            del self.bot.kenny_alarm
+
+    # Run once during startup, before logging in
+    async def warm_up(self):
+        await db.run(self.kenny_alarm.refresh)
+
+    ###
+    # Background Tasks
+    # https://discordpy.readthedocs.io/en/latest/ext/tasks/index.html?highlight=tasks%20loop#discord.ext.tasks.loop
+    ###
+
+    # Persist alarm triggers from the last interval in a single write
+    @tasks.loop(seconds=15)
+    @metrics.watcher("kenny_alarm_flusher")
+    async def kenny_alarm_flusher(self):
+        try:
+            await db.run(self.kenny_alarm.flush)
+        except Exception as e:
+            logging.error("Error encountered while running kenny_alarm_flusher: " + str(e))
+            metrics.watcher_failures.inc("kenny_alarm_flusher")
+
+    # Pick up changes made directly to the kenny_alarm document, ie new trigger terms or whitelisted channels
+    @tasks.loop(minutes=1)
+    @metrics.watcher("kenny_alarm_refresher")
+    async def kenny_alarm_refresher(self):
+        try:
+            await db.run(self.kenny_alarm.refresh)
+        except Exception as e:
+            logging.error("Error encountered while running kenny_alarm_refresher: " + str(e))
+            metrics.watcher_failures.inc("kenny_alarm_refresher")
+
+    # Loops are started when the cog is loaded, but wait for the bot to finish starting up before their first run
+    @kenny_alarm_flusher.before_loop
+    @kenny_alarm_refresher.before_loop
+    async def wait_until_started(self):
+        await self.bot.wait_until_started()
+
     ###
     # Event Listeners
     # https://discordpy.readthedocs.io/en/latest/ext/commands/api.html?highlight=bot%20listen#discord.ext.commands.Bot.listen
@@ -52,14 +114,16 @@ class Listeners(commands.Cog):
             logging.error(f"Unable to create DM channel for {member.name}:" + e)
 
         # If spoiler mode is on, mentions them in #general and points them in the direction of the spoiler-zone channels
-        spoiler_mode = SpoilerMode.objects()
+        # The lines are joined into one message to save on the channel's rate-limit budget
+        spoiler_mode = await db.run(lambda: list(SpoilerMode.objects()))
         if spoiler_mode:
-            await self.bot.general_channel.send(f"Welcome {member.mention}! For spoilerific chat about the ongoing/last show, join us in the spoiler channels:\n")
+            lines = [f"Welcome {member.mention}! For spoilerific chat about the ongoing/last show, join us in the spoiler channels:"]
             for s in spoiler_mode:
                 if s.mode == "njpw":
-                    await self.bot.general_channel.send(f"**{s.title}**: {self.bot.njpw_spoiler_channel.mention}")
+                    lines.append(f"**{s.title}**: {self.bot.njpw_spoiler_channel.mention}")
                 if s.mode == "non-njpw":
-                    await self.bot.general_channel.send(f"**{s.title}**: {self.bot.non_njpw_spoiler_channel.mention}")
+                    lines.append(f"**{s.title}**: {self.bot.non_njpw_spoiler_channel.mention}")
+            self.bot.outbox.send(self.bot.general_channel, "\n".join(lines))
 
     # A listener for all messages in the server
     # Most likely use case will be for temporary or "unofficial" commands that do not use the standard prefix
@@ -71,43 +135,59 @@ class Listeners(commands.Cog):
 
         ## Kenny Alarm
         # Trigger Kenny Alarm if he is mentioned
-        if any(x in message.content.lower() for x in self.kenny_alarm_trigger_terms) and (message.channel.id not in self.kenny_alarm_whitelist_channels):
+        if self.kenny_alarm.matches(message):
 
             logging.info(f"Kenny Alarm triggered by \'{message.author}\' in \'{message.channel}\' ({message.channel.id}). Triggering message: \'{message.content}\'")
 
-            # Look up the kenny_alarm document in DB
-            alarm_obj = KennyAlarm.objects.first()
-
-            # Calculate time since last breach
-            days_between_breaches = (datetime.now() - alarm_obj.last_mention_time).days
-
-            # Update the record days if the ending timespan is the longest ever
-            if days_between_breaches > alarm_obj.record_days:
-                alarm_obj.update(
-                    record_days=days_between_breaches
-                )
-            
-            # Update the kenny_alarm document with the latest trigger details
-            alarm_obj.update(
-                last_mention_time=message.created_at,
-                last_mention_user=message.author.display_name,
-                last_mention_message=message.content,
-                last_mention_link=message.jump_url
-            )
+            # Update the in-memory alarm state, the DB is updated by kenny_alarm_flusher
+            self.kenny_alarm.trigger(message)
 
             await message.add_reaction('🚨')
 
 
+    # Keep the cached admin checks and members in line with member and role changes
+    # on_member_update and on_member_remove are only dispatched for members in discord.py's member cache, which is
+    # empty in lazy member cache mode, so the raw gateway events are used instead
+    @commands.Cog.listener("on_socket_response")
+    async def on_socket_response(self, msg):
+        if msg.get("t") in ("GUILD_MEMBER_UPDATE", "GUILD_MEMBER_REMOVE"):
+            member_id = int(msg["d"]["user"]["id"])
+            checks.invalidate(member_id)
+            self.bot.members.discard(member_id)
+
+    # Role changes can move roles above or below @everyone and rename them, so all cached checks are dropped
+    @commands.Cog.listener("on_guild_role_create")
+    async def on_guild_role_create(self, role):
+        checks.invalidate()
+
+    @commands.Cog.listener("on_guild_role_update")
+    async def on_guild_role_update(self, before, after):
+        checks.invalidate()
+
+    @commands.Cog.listener("on_guild_role_delete")
+    async def on_guild_role_delete(self, role):
+        checks.invalidate()
+
     # Log all instance of command invocations, succesful and errored
+    # Also times each command for the metrics endpoint, on_command is dispatched before checks are run
     
     @commands.Cog.listener("on_command")
     async def on_command(self, ctx):
-        logging.info(f"Command [{ctx.command}] invoked with msg [{ctx.message.content}] by {ctx.author}")
+        ctx.started_at = time.perf_counter()
+        commands_log.info("Command [%s] invoked with msg [%s] by %s", ctx.command, ctx.message.content, ctx.author)
+
+    @commands.Cog.listener("on_command_completion")
+    async def on_command_completion(self, ctx):
+        metrics.command_latency.observe(time.perf_counter() - ctx.started_at, ctx.command.qualified_name, "ok")
 
     @commands.Cog.listener("on_command_error")
     async def on_command_error(self, ctx, error):
         logging.error(f"Command [{ctx.invoked_with}] failed with msg [{ctx.message.content}] by {ctx.author}: {error}")
 
+        # Unknown commands aren't timed
+        if ctx.command and hasattr(ctx, "started_at"):
+            metrics.command_latency.observe(time.perf_counter() - ctx.started_at, ctx.command.qualified_name, "error")
+
 
 def setup(bot):
     bot.add_cog(Listeners(bot))
\ No newline at end of file
@@ -8,6 +8,7 @@ import discord
 from discord.ext import commands
 
 import utils.embeds
+from utils import db
 from database.models import (
     KennyAlarm
 )
@@ -22,7 +23,11 @@ class Meta(commands.Cog):
         hidden=True
         )
     async def gamer(self, ctx):
-        embed = utils.embeds.kenny_alarm_embed(KennyAlarm.objects.first())
+        # Use the in-memory alarm state held by the Listeners cog, falling back to the DB if it isn't loaded
+        kenny_alarm = getattr(self.bot, "kenny_alarm", None)
+        if not kenny_alarm or not kenny_alarm.loaded:
+            kenny_alarm = await db.run(lambda: KennyAlarm.objects.first())
+        embed = utils.embeds.kenny_alarm_embed(kenny_alarm)
         await ctx.send(embed=embed)
 
 def setup(bot):
@@ -4,16 +4,79 @@ Cog for podcast related commands
 Commands in this cog fetch and display information related to the Super J-Cast podcast
 """
 
-from discord.ext import commands
+import asyncio
+import logging
+
+from discord.ext import commands, tasks
 import discord
 
 import utils.embeds
+from utils import cache
+from utils import db
+from utils import metrics
+from utils import singleflight
+from utils.paginator import Paginator, ListSource
+from utils.search import EpisodeIndex
 from database.models import PodcastInfo, PodcastEpisode
+from settings.constants import CACHE_TTL, EPISODE_SEARCH_RESULTS
+
+# Maximum number of episodes displayed on each page of !searchpod
+EPISODES_PER_PAGE = 5
 
 class Podcast(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+        # Searches are answered from an in-memory index of episode titles and descriptions
+        self.episode_index = EpisodeIndex(max_results=EPISODE_SEARCH_RESULTS)
+
+        logging.info("Starting episode_index_refresher")
+        self.episode_index_refresher.start()
+
+    def cog_unload(self):
+        self.episode_index_refresher.cancel()
+
+    # Run once during startup, before logging in
+    async def warm_up(self):
+        await self.refresh_episode_index()
+
+    ###
+    # Background Tasks
+    # https://discordpy.readthedocs.io/en/latest/ext/tasks/index.html?highlight=tasks%20loop#discord.ext.tasks.loop
+    ###
+
+    # Rebuild the episode index whenever the podcast_episode collection has changed
+    @tasks.loop(minutes=1)
+    @metrics.watcher("episode_index_refresher")
+    async def episode_index_refresher(self):
+        try:
+            await self.refresh_episode_index()
+
+        except Exception as e:
+            logging.error("Error encountered while running episode_index_refresher: " + str(e))
+            metrics.watcher_failures.inc("episode_index_refresher")
+
+    @episode_index_refresher.before_loop
+    async def wait_until_started(self):
+        await self.bot.wait_until_started()
+
+    # Build the episode index, unless it is already up to date
+    async def refresh_episode_index(self):
+        generation = cache.generation("podcast_episode")
+        if generation == self.episode_index.generation and len(self.episode_index):
+            return
+
+        await db.run(self.build_episode_index, generation)
+        logging.info(f"Episode index built with {len(self.episode_index)} episodes")
+
+    # Runs in the DB executor, as both the query and the build are blocking
+    def build_episode_index(self, generation):
+        entries = [
+            {"title": e.title, "description": e.description, "link": e.link, "published": e.published}
+            for e in PodcastEpisode.objects.only("title", "description", "link", "published")
+        ]
+        self.episode_index.build(entries, generation)
+
     ###
     # Bot Commands
     # https://discordpy.readthedocs.io/en/latest/ext/commands/api.html?highlight=bot%20command#discord.ext.commands.Bot.command
@@ -33,10 +96,8 @@ class Podcast(commands.Cog):
         """
         )
     async def pod_info(self, ctx):
-        # Build and send the reply
-        pod_info = PodcastInfo.objects.first()
-        last_pod = PodcastEpisode.objects.first()
-        embed = utils.embeds.pod_info_embed(pod_info, last_pod)
+        # Build and send the reply, identical requests made at the same time share one lookup and embed
+        embed = await singleflight.do(("podinfo",), self.pod_info_embed)
         await ctx.send(embed=embed)
             
     # Show details on the lates podcast episode
@@ -51,11 +112,52 @@ class Podcast(commands.Cog):
         \tThe episode's duration."""
         )
     async def pod_episode_embed(self, ctx):
-        # Build and send the reply
-        last_pod = PodcastEpisode.objects.first()
-        embed = utils.embeds.pod_episode_embed(last_pod)
+        # Build and send the reply, identical requests made at the same time share one lookup and embed
+        embed = await singleflight.do(("lastpod",), self.last_pod_embed)
         await ctx.send(embed=embed)
 
+    # Search the titles and descriptions of every episode, showing the best matches first
+    # Uses a keyword only argument so that users can search for several words without ""s
+    @commands.command(name="searchpod",
+        aliases=["findpod"],
+        brief="Search the podcast's episodes",
+        help=f"""Search for episodes of the Super J-Cast by words in their title or description.\n
+                Episodes matching more of the words, and rarer words, are shown first, with words in the title counting most.
+                Partial words are fine, so for example "!searchpod kingd" will find episodes mentioning "Kingdom".
+                Up to {EPISODE_SEARCH_RESULTS} episodes are found, shown {EPISODES_PER_PAGE} per page. React with the arrows to see more."""
+        )
+    async def search_pod(self, ctx, *, terms):
+        episodes = self.episode_index.search(terms)
+
+        # Results are already held by the index, so pages are built without loading anything
+        async def load(page_episodes):
+            return page_episodes
+
+        source = ListSource(episodes, load, page_size=EPISODES_PER_PAGE)
+        if not await Paginator(ctx, source, lambda page: utils.embeds.paged_embed(
+            utils.embeds.episode_list_embeds(page.items, f"Episodes matching \"{terms}\"")[0],
+            f"Page {page.number}, {len(episodes)} episode(s) found"
+        )).start():
+            await ctx.send(f"No episodes found matching \"{terms}\"")
+
+    ###
+    # Lookups
+    # Shared by concurrent identical commands through singleflight, so they must not depend on ctx
+    ###
+
+    async def pod_info_embed(self):
+        pod_info, last_pod = await asyncio.gather(
+            cache.get(("podcast_info", "first"), lambda: PodcastInfo.objects.first(), CACHE_TTL),
+            cache.get(("podcast_episode", "first"), lambda: PodcastEpisode.objects.first(), CACHE_TTL)
+        )
+
+        return utils.embeds.pod_info_embed(pod_info, last_pod)
+
+    async def last_pod_embed(self):
+        last_pod = await cache.get(("podcast_episode", "first"), lambda: PodcastEpisode.objects.first(), CACHE_TTL)
+
+        return utils.embeds.pod_episode_embed(last_pod)
+
 
 def setup(bot):
     bot.add_cog(Podcast(bot))
\ No newline at end of file
@@ -4,16 +4,83 @@ Cog for profile commands.
 These commands pull and display wrestler profiles from the DB
 """
 
-from discord.ext import commands
+import asyncio
+import logging
+
+from discord.ext import commands, tasks
 import discord
 
 import utils.embeds
-from database.models import Profile
+from utils import cache
+from utils import db
+from utils import metrics
+from utils import singleflight
+from utils.paginator import Paginator, KeysetSource, ListSource
+from utils.search import ProfileIndex
+from database.models import Appearance, Profile, ProfileBio
+from settings.constants import PROFILE_SEARCH_RESULTS
+
+# Fields used by the profile and bio embeds, so that profile queries only fetch what is displayed
+PROFILE_EMBED_FIELDS = ("name", "link", "render", "attributes")
+
+# Maximum number of shows displayed on each page of !appearances
+APPEARANCES_PER_PAGE = 10
 
 class Profiles(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+        # Searches are answered from an in-memory index of profile names, stored as a bot attribute so other cogs can use it
+        self.profile_index = ProfileIndex(max_results=PROFILE_SEARCH_RESULTS)
+        self.bot.profile_index = self.profile_index
+
+        logging.info("Starting profile_index_refresher")
+        self.profile_index_refresher.start()
+
+    def cog_unload(self):
+        self.profile_index_refresher.cancel()
+
+    # Run once during startup, before logging in
+    async def warm_up(self):
+        await self.refresh_profile_index()
+
+    ###
+    # Background Tasks
+    # https://discordpy.readthedocs.io/en/latest/ext/tasks/index.html?highlight=tasks%20loop#discord.ext.tasks.loop
+    ###
+
+    # Rebuild the profile index whenever the profile collection has changed
+    @tasks.loop(minutes=1)
+    @metrics.watcher("profile_index_refresher")
+    async def profile_index_refresher(self):
+        try:
+            await self.refresh_profile_index()
+
+        except Exception as e:
+            logging.error("Error encountered while running profile_index_refresher: " + str(e))
+            metrics.watcher_failures.inc("profile_index_refresher")
+
+    @profile_index_refresher.before_loop
+    async def wait_until_started(self):
+        await self.bot.wait_until_started()
+
+    # Build the profile index, unless it is already up to date
+    async def refresh_profile_index(self):
+        generation = cache.generation("profile")
+        if generation == self.profile_index.generation and len(self.profile_index):
+            return
+
+        await db.run(self.build_profile_index, generation)
+        logging.info(f"Profile index built with {len(self.profile_index)} profiles")
+
+    # Runs in the DB executor, as both the query and the build are blocking
+    def build_profile_index(self, generation):
+        entries = [
+            (p.name, p.attributes.get("unit"))
+            for p in Profile.objects(removed__ne=True).only("name", "attributes")
+        ]
+        self.profile_index.build(entries, generation)
+
     ###
     # Bot Commands
     # https://discordpy.readthedocs.io/en/latest/ext/commands/api.html?highlight=bot%20command#discord.ext.commands.Bot.command
@@ -25,17 +92,20 @@ class Profiles(commands.Cog):
         aliases=["p"],
         brief="Provide the name of a wrestler to get their profile",
         help="""Search for, and display, a current NJPW wrestler's profile.\n
-                Partial searches are fine, so for example "!profile taka" will find any wrestler with "taka" anywhere in their name."""
+                Partial searches are fine, so for example "!profile taka" will find any wrestler with "taka" anywhere in their name.
+                Searches ignore case and accents, match unit names, and allow for small typos.
+                Matches are shown one at a time, best match first. React with the arrows to see the other matches."""
         )
     async def profile(self, ctx, *, name):
         # Force the searched name to be 3 or more characters - a lower limit can cause spammy replies 
         if len(name) < 3:
             await ctx.send("Please enter at least 3 characters to find a profile")
         else:
-            profiles = Profile.objects(name__icontains=name).exclude("_id", "bio")
-            for p in profiles:
-                embed = utils.embeds.profile_embed(p)
-                await ctx.send(embed=embed)
+            # Matches are displayed in a single paginated message, and each profile is only loaded when its page is shown
+            names = await self.search(name)
+            source = ListSource(names, self.profile_embeds, page_size=1)
+            if not await Paginator(ctx, source, lambda page: self.render_result(page, len(names))).start():
+                await ctx.send(f"No profiles found matching \"{name}\"")
 
     
     # Display the bio that matches the searched name
@@ -45,6 +115,8 @@ class Profiles(commands.Cog):
         brief="Provide the name of a wrestler to get their bio",
         help="""Search for, and display, a current NJPW wrestler's bio.\n
                 Partial searches are fine, so for example "!bio taka" will find any wrestler with "taka" anywhere in their name.
+                Searches ignore case and accents, match unit names, and allow for small typos.
+                Matches are shown one at a time, best match first. React with the arrows to see the other matches.
                 
                 Bios are limited to 2048 characters due to Discord limitations."""
         )
@@ -53,10 +125,93 @@ class Profiles(commands.Cog):
         if len(name) < 3:
             await ctx.send("Please enter at least 3 characters to find a profile")
         else:
-            bios = Profile.objects(name__icontains=name).exclude("_id")
-            for b in bios:
-                embed = utils.embeds.bio_embed(b)
-                await ctx.send(embed=embed)
+            # Matches are displayed in a single paginated message, and each bio is only loaded when its page is shown
+            names = await self.search(name)
+            source = ListSource(names, self.bio_embeds, page_size=1)
+            if not await Paginator(ctx, source, lambda page: self.render_result(page, len(names))).start():
+                await ctx.send(f"No bios found matching \"{name}\"")
+
+    # Display the shows the best matching wrestler has been on, latest first, along with any upcoming shows they're booked on
+    # Uses a keyword only argument so that users can search names with spaces in without ""s
+    @commands.command(name="appearances",
+        aliases=["apps"],
+        brief="Provide the name of a wrestler to see the shows they've been on",
+        help=f"""Search for a current NJPW wrestler, and display the shows they've appeared on, latest first.\n
+                Searches work the same as "!profile", and the best matching wrestler is shown.
+                Upcoming shows they're on the card for are included, and results are hidden behind spoiler tags.
+                Up to {APPEARANCES_PER_PAGE} shows are shown per page. React with the arrows to see more."""
+        )
+    async def appearances(self, ctx, *, name):
+        # Force the searched name to be 3 or more characters - a lower limit can cause spammy replies
+        if len(name) < 3:
+            await ctx.send("Please enter at least 3 characters to find a profile")
+            return
+
+        names = await self.search(name)
+        if not names:
+            await ctx.send(f"No profiles found matching \"{name}\"")
+            return
+
+        # Each page is a single read on the wrestler and time index
+        wrestler = names[0]
+        source = KeysetSource(Appearance, "time", page_size=APPEARANCES_PER_PAGE, descending=True,
+                              filters={"wrestler": wrestler})
+        if not await Paginator(ctx, source, lambda page: utils.embeds.paged_embed(
+            utils.embeds.appearances_embed(wrestler, page.items), f"Page {page.number}"
+        )).start():
+            await ctx.send(f"No appearances found for {wrestler}")
+
+    # Display the single result on a page, numbered out of the total number of matches
+    def render_result(self, page, total):
+        return utils.embeds.paged_embed(page.items[0], f"Result {page.number} of {total}")
+
+    ###
+    # Lookups
+    # Shared by concurrent identical commands through singleflight, so they must not depend on ctx
+    ###
+
+    # Return the names of the best matching profiles, best first
+    async def search(self, name):
+        if len(self.profile_index):
+            return self.profile_index.search(name)
+
+        # Fall back to a DB search if the index hasn't been built yet
+        return await db.run(lambda: [
+            p.name for p in Profile.objects(name__icontains=name).only("name")[:PROFILE_SEARCH_RESULTS]
+        ])
+
+    # Build the embeds for a page of profile names, skipping any which no longer exist
+    # Identical lookups made at the same time share one load and embed
+    async def profile_embeds(self, names):
+        embeds = await asyncio.gather(*[singleflight.do(("profile", n), lambda n=n: self.profile_embed(n)) for n in names])
+        return [e for e in embeds if e]
+
+    async def bio_embeds(self, names):
+        embeds = await asyncio.gather(*[singleflight.do(("bio", n), lambda n=n: self.bio_embed(n)) for n in names])
+        return [e for e in embeds if e]
+
+    # Fetch a profile by name, which is indexed, with only the fields the profile embed needs
+    async def profile_embed(self, name):
+        profile = await db.run(lambda: Profile.objects(name=name).only(*PROFILE_EMBED_FIELDS).first())
+        return utils.embeds.profile_embed(profile) if profile else None
+
+    # Load a single profile and its bio, returning None if either doesn't exist
+    async def bio_embed(self, name):
+        profile, bio = await asyncio.gather(
+            db.run(lambda: Profile.objects(name=name).only(*PROFILE_EMBED_FIELDS).first()),
+            db.run(lambda: ProfileBio.objects(name=name).first())
+        )
+
+        if bio:
+            text = bio.bio
+        else:
+            # Fall back to bios which haven't yet been moved out of the profile collection by the scraper
+            text = getattr(await db.run(lambda: Profile.objects(name=name).only("bio").first()), "bio", None)
+
+        if not profile or not text:
+            return None
+
+        return utils.embeds.bio_embed(profile, text)
 
 def setup(bot):
     bot.add_cog(Profiles(bot))
\ No newline at end of file
@@ -4,20 +4,33 @@ Cog for show related commands.
 These commands pull and display info related to previous and upcoming shows
 """
 
+import asyncio
 from datetime import datetime, timedelta
 
 import discord
 from discord.ext import commands
 
 import utils.embeds
+from utils import cache
+from utils import singleflight
+from utils.paginator import Paginator, KeysetSource
 from database.models import (
-    SpoilerMode, ScheduleShow, ResultShow
+    SpoilerMode, ScheduleShow, ResultShow, MatchResult
 )
+from settings.constants import CACHE_TTL
+
+# Maximum number of shows displayed on each page of !nextshows and !lastshows
+SHOWS_PER_PAGE = 5
 
 class Shows(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    # Run once during startup, before logging in
+    # Fills the cache for the most used lookups, the embeds themselves need channels which aren't available yet
+    async def warm_up(self):
+        await asyncio.gather(self.next_shows(1), self.spoiler_modes())
+
     ###
     # Bot Commands
     # https://discordpy.readthedocs.io/en/latest/ext/commands/api.html?highlight=bot%20command#discord.ext.commands.Bot.command
@@ -32,7 +45,8 @@ class Shows(commands.Cog):
         For each show, displays the following information:
         \tDate of the show, with door and bell times in JST.
         \tThe city in which the show takes place.
-        \tThe venue at which the show takes place.""",
+        \tThe venue at which the show takes place.
+        When more than one show is requested, up to 5 shows are shown per page. React with the arrows to see more.""",
         usage="[number_of_shows] (defaults: \"nextshows/next\"=3 \"nextshow\"=1)"
         )
     async def next_shows(self, ctx, number_of_shows=1):
@@ -40,12 +54,19 @@ class Shows(commands.Cog):
         if ctx.invoked_with == "nextshow":
             number_of_shows = 1
 
-        # DB query for the requested number of shows
-        next_shows = ScheduleShow.objects[:number_of_shows]
-        
-        # build and send the reply
-        embed = utils.embeds.schedule_shows_embed(next_shows, number_of_shows)
-        await ctx.send(embed=embed)
+        if number_of_shows <= 1:
+            # Identical requests made at the same time share one lookup and embed
+            embed = await singleflight.do(("nextshows", 1), lambda: self.next_shows_embed(1))
+            await ctx.send(embed=embed)
+
+        else:
+            # Multiple shows are displayed in a single paginated message
+            source = KeysetSource(ScheduleShow, "time", page_size=min(number_of_shows, SHOWS_PER_PAGE),
+                                  limit=number_of_shows)
+            if not await Paginator(ctx, source, lambda page: utils.embeds.paged_embed(
+                utils.embeds.schedule_shows_embed(page.items, len(page.items)), f"Page {page.number}"
+            )).start():
+                await ctx.send("No upcoming shows")
 
     # Displays info on previous shows - takes the number of shows to display as an argument
     # Info is scraped from the NJPW website and stored in the bot.last_shows attribute
@@ -56,7 +77,9 @@ class Shows(commands.Cog):
         For each show, displays the following information:
         \tDate of the show, with door and bell times in JST.
         \tThe city in which the show took place.
-        \tThe venue at which the show took place.""",
+        \tThe venue at which the show took place.
+        \tThe result of each match, hidden behind spoiler tags.
+        When more than one show is requested, up to 5 shows are shown per page. React with the arrows to see more.""",
         usage="[number_of_shows] (defaults: \"lastshows/last\"=3 \"lastshow\"=1)"
         )
     async def last_shows(self, ctx, number_of_shows=1):
@@ -64,12 +87,25 @@ class Shows(commands.Cog):
         if ctx.invoked_with == "lastshow":
             number_of_shows = 1
         
-        # DB query for the requested number of shows
-        last_shows = ResultShow.objects[:number_of_shows]
-        
-        # build and send the reply
-        embed = utils.embeds.result_shows_embed(last_shows, number_of_shows)
-        await ctx.send(embed=embed)
+        if number_of_shows <= 1:
+            # Identical requests made at the same time share one lookup and embed
+            embed = await singleflight.do(("lastshows", 1), lambda: self.last_shows_embed(1))
+            await ctx.send(embed=embed)
+
+        else:
+            # Multiple shows are displayed in a single paginated message
+            source = KeysetSource(ResultShow, "time", page_size=min(number_of_shows, SHOWS_PER_PAGE), descending=True,
+                                  limit=number_of_shows)
+
+            # Match results are loaded for each page as it's displayed
+            async def render(page):
+                matches = await self.match_results(page.items)
+                return utils.embeds.paged_embed(
+                    utils.embeds.result_shows_embed(page.items, len(page.items), matches), f"Page {page.number}"
+                )
+
+            if not await Paginator(ctx, source, render).start():
+                await ctx.send("No previous shows")
 
     # Displays whether spoiler mode is currently set or not
     @commands.command(name="spoiler", 
@@ -77,19 +113,73 @@ class Shows(commands.Cog):
         help="""Shows whether spoiler-zone mode is currently ON or OFF."""
         )
     async def spoiler(self, ctx):
-        njpw_spoiler = SpoilerMode.objects(mode="njpw")
+        for message in await singleflight.do(("spoiler",), self.spoiler_messages):
+            await ctx.send(message)
+
+    ###
+    # Lookups
+    # Shared by concurrent identical commands through singleflight, so they must not depend on ctx
+    ###
+
+    # DB query for the requested number of upcoming shows, and build the reply
+    async def next_shows(self, number_of_shows):
+        return await cache.get(("schedule_show", "next", number_of_shows),
+                               lambda: list(ScheduleShow.objects[:number_of_shows]), CACHE_TTL)
+
+    async def next_shows_embed(self, number_of_shows):
+        next_shows = await self.next_shows(number_of_shows)
+
+        return utils.embeds.schedule_shows_embed(next_shows, number_of_shows)
+
+    # DB query for the requested number of previous shows, and build the reply
+    async def last_shows_embed(self, number_of_shows):
+        last_shows = await cache.get(("result_show", "last", number_of_shows),
+                                     lambda: list(ResultShow.objects[:number_of_shows]), CACHE_TTL)
+        matches = await self.match_results(last_shows)
+
+        return utils.embeds.result_shows_embed(last_shows, number_of_shows, matches)
+
+    # DB query for the match results of the given shows, as {card url: [MatchResult]} in card order
+    # A single indexed read on the card, covering every show
+    async def match_results(self, shows):
+        cards = tuple(s.card for s in shows if s.card)
+        if not cards:
+            return {}
+
+        def load():
+            matches = {}
+            for match in MatchResult.objects(card__in=cards).order_by("card", "number"):
+                matches.setdefault(match.card, []).append(match)
+            return matches
+
+        return await cache.get(("match_result", "cards", cards), load, CACHE_TTL)
+
+    # DB query for the current NJPW and non-NJPW spoiler modes
+    async def spoiler_modes(self):
+        return await asyncio.gather(
+            cache.get(("spoiler_mode", "njpw"), lambda: list(SpoilerMode.objects(mode="njpw")), CACHE_TTL),
+            cache.get(("spoiler_mode", "non-njpw"), lambda: list(SpoilerMode.objects(mode="non-njpw")), CACHE_TTL)
+        )
+
+    # Build the list of messages describing the state of each type of spoiler mode
+    async def spoiler_messages(self):
+        njpw_spoiler, non_njpw_spoiler = await self.spoiler_modes()
+
+        messages = []
+
         if njpw_spoiler:
             for s in njpw_spoiler:
-                await ctx.send(f"NJPW _#spoiler-zone_ mode is ON for **{s.title}**, keep show chat in {self.bot.njpw_spoiler_channel.mention} (ends in {':'.join(str(s.ends_at - datetime.now()).split(':')[:2])})")
+                messages.append(f"NJPW _#spoiler-zone_ mode is ON for **{s.title}**, keep show chat in {self.bot.njpw_spoiler_channel.mention} (ends in {':'.join(str(s.ends_at - datetime.now()).split(':')[:2])})")
         else:
-            await ctx.send("NJPW _#spoiler-zone_ mode is OFF")
+            messages.append("NJPW _#spoiler-zone_ mode is OFF")
 
-        non_njpw_spoiler = SpoilerMode.objects(mode="non-njpw")
         if non_njpw_spoiler:
             for s in non_njpw_spoiler:
-                await ctx.send(f"Non-NJPW _#spoiler-zone_ mode is ON for **{s.title}**, keep show chat in {self.bot.non_njpw_spoiler_channel.mention} (ends in {':'.join(str(s.ends_at - datetime.now()).split(':')[:2])})")
+                messages.append(f"Non-NJPW _#spoiler-zone_ mode is ON for **{s.title}**, keep show chat in {self.bot.non_njpw_spoiler_channel.mention} (ends in {':'.join(str(s.ends_at - datetime.now()).split(':')[:2])})")
         else:
-            await ctx.send("Non-NJPW _#spoiler-zone_ mode is OFF")
+            messages.append("Non-NJPW _#spoiler-zone_ mode is OFF")
+
+        return messages
 
 
 def setup(bot):
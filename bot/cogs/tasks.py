@@ -2,22 +2,30 @@
 Cog containing background loop tasks
 
 Tasks are started once the cog is loaded and can be restarted by reloading the cog
+Each task's first run waits until the bot has finished starting up
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
 
 from discord.ext import commands, tasks
 
 import utils.embeds
+from utils import cache
+from utils import db
+from utils import metrics
+from utils import outbox
 from database.models import (
-    PodcastEpisode, ScheduleShow, ResultShow, NonNjpwShow, SpoilerMode, Profile
+    PodcastEpisode, ScheduleShow, ResultShow, NonNjpwShow, SpoilerMode, Profile, ProfileBio
 )
 
 
 class Tasks(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # watcher name: task waiting on that watcher's announcement to be sent
+        self.announcing = {}
 
         # Start background task loops
         logging.info("Starting new_podcast_watcher")
@@ -30,6 +38,32 @@ class Tasks(commands.Cog):
         self.removed_profile_watcher.start()
         logging.info("Starting spoiler_mode_watcher")
         self.spoiler_mode_watcher.start()
+        logging.info("Starting cache_invalidation_watcher")
+        self.cache_invalidation_watcher.start()
+
+    # Run update (a coroutine function) once every queued message has been sent, without holding up the watcher
+    # If any send fails the update is skipped, so the items are still new and are announced again on a later run
+    def after_sent(self, name, futures, update):
+        async def wait():
+            try:
+                await asyncio.gather(*futures)
+            except Exception as e:
+                logging.error(f"Announcement from {name} wasn't sent, it will be retried: " + str(e))
+                metrics.watcher_failures.inc(name)
+                return
+
+            try:
+                await update()
+            except Exception as e:
+                logging.error(f"Error encountered while running {name}: " + str(e))
+                metrics.watcher_failures.inc(name)
+
+        self.announcing[name] = asyncio.ensure_future(wait())
+
+    # Whether a watcher's last announcement is still waiting to be sent, in which case its items aren't announced twice
+    def is_announcing(self, name):
+        task = self.announcing.get(name)
+        return task is not None and not task.done()
 
     ###
     # Background Tasks
@@ -39,100 +73,132 @@ class Tasks(commands.Cog):
 
     # Frequently look for new podcasts episodes in the DB
     @tasks.loop(minutes=5)
+    @metrics.watcher("new_podcast_watcher")
     async def new_podcast_watcher(self):
 
         try:
             logging.debug("Running new_podcast_watcher")
+            if self.is_announcing("new_podcast_watcher"):
+                return
 
             # DB query to return podcast episodes tagged as new
-            new_podcasts = PodcastEpisode.objects(new=True)
+            new_podcasts = await db.run(lambda: list(PodcastEpisode.objects(new=True)))
 
             if new_podcasts:
                 # Loop through results on the remote chance that more than one episode was found
+                sent = []
                 for p in new_podcasts:
                     logging.info("New podcast episode found: " + p.title)
-                    await self.bot.general_channel.send(content="@here New Pod!", 
-                                    embed=utils.embeds.pod_episode_embed(p))
-                    p.update(new=False)
+                    sent.append(self.bot.outbox.send(self.bot.general_channel, content="@here New Pod!",
+                                                     embed=utils.embeds.pod_episode_embed(p)))
+                ids = [p.id for p in new_podcasts]
+                self.after_sent("new_podcast_watcher", sent,
+                                lambda: db.run(lambda: PodcastEpisode.objects(id__in=ids).update(new=False)))
 
         except Exception as e:
             logging.error("Error encountered while running new_podcast_watcher: " + str(e))
+            metrics.watcher_failures.inc("new_podcast_watcher")
 
     # Alert the discord to shows added to the schedule on njpw1972.com
     @tasks.loop(minutes=30)
+    @metrics.watcher("new_show_watcher")
     async def new_show_watcher(self):
 
         try:
             logging.debug("Running new_show_watcher")
+            if self.is_announcing("new_show_watcher"):
+                return
 
             # DB query to return podcast episodes tagged as new
-            new_shows = ScheduleShow.objects(new=True)
+            new_shows = await db.run(lambda: list(ScheduleShow.objects(new=True)))
 
             if new_shows:
                 for s in new_shows:
                     logging.info("New scheduled show found: " + s.name)
-                try:
-                    await self.bot.general_channel.send(content="New show(s) added to the schedule:",
-                                    embed=utils.embeds.new_shows_embed(new_shows))
-                except Exception:
-                    await self.bot.general_channel.send(content="New show(s) added to the schedule:",
-                                    embed=utils.embeds.new_shows_embed(new_shows[0:2]))
-                new_shows.update(new=False)
+                # Shows are packed into as few embeds as Discord's limits allow, with the heading on the first message
+                sent = []
+                for i, embed in enumerate(utils.embeds.new_shows_embeds(new_shows)):
+                    sent.append(self.bot.outbox.send(self.bot.general_channel,
+                                                     content="New show(s) added to the schedule:" if i == 0 else None,
+                                                     embed=embed, priority=outbox.BULK))
+                # Only mark the shows that were announced, in case more were added in the meantime
+                ids = [s.id for s in new_shows]
+                self.after_sent("new_show_watcher", sent,
+                                lambda: db.run(lambda: ScheduleShow.objects(id__in=ids).update(new=False)))
 
         except Exception as e:
             logging.error("Error encountered while running new_show_watcher: " + str(e))
+            metrics.watcher_failures.inc("new_show_watcher")
 
     # Alert the discord to wrestler profiles added to on njpw1972.com
     @tasks.loop(minutes=30)
+    @metrics.watcher("new_profile_watcher")
     async def new_profile_watcher(self):
         try:
             logging.debug("Running new_profile_watcher")
+            if self.is_announcing("new_profile_watcher"):
+                return
 
             # DB query to return podcast episodes tagged as new
-            new_profiles = Profile.objects(new=True)
+            # Only the fields needed for the announcement are fetched
+            new_profiles = await db.run(lambda: list(Profile.objects(new=True).only("name", "link", "attributes")))
 
             if new_profiles:
-                await self.bot.general_channel.send("New Profile(s) Added: ")
                 for p in new_profiles:
                     logging.info(f"New profile found: {p.name}")
-                    await self.bot.general_channel.send(embed=utils.embeds.profile_embed(p))
-                new_profiles.update(new=False)
+                sent = [self.bot.outbox.send(self.bot.general_channel, embed=embed, priority=outbox.BULK)
+                        for embed in utils.embeds.profile_list_embeds(new_profiles, "New Profile(s) Added")]
+                ids = [p.id for p in new_profiles]
+                self.after_sent("new_profile_watcher", sent,
+                                lambda: db.run(lambda: Profile.objects(id__in=ids).update(new=False)))
 
         except Exception as e:
             logging.error("Error encountered while running new_profile_watcher: " + str(e))
+            metrics.watcher_failures.inc("new_profile_watcher")
 
     # Alert the discord to wrestler profiles removed, and delete them from the DB
     @tasks.loop(minutes=31)
+    @metrics.watcher("removed_profile_watcher")
     async def removed_profile_watcher(self):
         try:
             logging.debug("Running removed_profile_watcher")
+            if self.is_announcing("removed_profile_watcher"):
+                return
 
             # DB query to return podcast episodes tagged as removed
-            removed_profiles = Profile.objects(removed=True)
+            removed_profiles = await db.run(lambda: list(Profile.objects(removed=True).only("name", "link", "attributes")))
 
             if removed_profiles:
-                await self.bot.general_channel.send("Profile(s) Removed: ")
                 for p in removed_profiles:
                     logging.info(f"Removed profile found: {p.name}")
-                    await self.bot.general_channel.send(embed=utils.embeds.profile_embed(p))
-                    p.delete()
+                sent = [self.bot.outbox.send(self.bot.general_channel, embed=embed, priority=outbox.BULK)
+                        for embed in utils.embeds.profile_list_embeds(removed_profiles, "Profile(s) Removed")]
+
+                async def delete():
+                    await db.run(lambda: Profile.objects(id__in=[p.id for p in removed_profiles]).delete())
+                    await db.run(lambda: ProfileBio.objects(name__in=[p.name for p in removed_profiles]).delete())
+                    cache.invalidate("profile")
+
+                self.after_sent("removed_profile_watcher", sent, delete)
 
         except Exception as e:
             logging.error("Error encountered while running removed_profile_watcher: " + str(e))
+            metrics.watcher_failures.inc("removed_profile_watcher")
 
     # Check for shows starting soon and set spoiler mode
     # Also check for spoiler modes which have ended
     @tasks.loop(minutes=3.5)
+    @metrics.watcher("spoiler_mode_watcher")
     async def spoiler_mode_watcher(self):
         try:
             logging.debug("Running spoiler_mode_watcher")
 
             # DB query to return njpw shows which start in the next 5 minutes and continue if any exist
-            starting_shows = ScheduleShow.objects(time__lte=datetime.now() + timedelta(minutes=5))
+            starting_shows = await db.run(lambda: list(ScheduleShow.objects(time__lte=datetime.now() + timedelta(minutes=5))))
             if starting_shows:
                 for s in starting_shows:
                     # Check that spoiler mode hasn't already been triggered for that show and that the show is live
-                    if not SpoilerMode.objects(title=s.name) and s.live_show:
+                    if s.live_show and not await db.run(lambda: SpoilerMode.objects(title=s.name).first()):
 
                         # Build spoiler_mode document
                         spoiler_mode = SpoilerMode(
@@ -143,24 +209,26 @@ class Tasks(commands.Cog):
                         )
 
                         # Save the document to the DB
-                        spoiler_mode.save()
+                        await db.run(spoiler_mode.save)
+                        cache.invalidate("spoiler_mode")
 
                         # Notify @here of the starting show and include the embed which lists the end time
-                        await self.bot.general_channel.send(
+                        self.bot.outbox.send(self.bot.general_channel,
                             content=f"@here **{spoiler_mode.title}** starting soon. Head to {self.bot.njpw_spoiler_channel.mention} for spoiler chat.",
-                            embed=utils.embeds.spoiler_mode_embed(spoiler_mode)
+                            embed=utils.embeds.spoiler_mode_embed(spoiler_mode),
+                            priority=outbox.HIGH
                         )
 
-                        await self.bot.njpw_spoiler_channel.edit(topic=spoiler_mode.title)
+                        self.bot.outbox.edit_topic(self.bot.njpw_spoiler_channel, spoiler_mode.title)
                         
                         logging.info(f"NJPW #spoiler-zone time started for {spoiler_mode.title}, ends in {s.spoiler_hours}")
 
             # DB query to return non-njpw shows which start in the next 5 minutes and continue if any exist
-            non_njpw_shows = NonNjpwShow.objects(time__lte=datetime.now() + timedelta(minutes=5))
+            non_njpw_shows = await db.run(lambda: list(NonNjpwShow.objects(time__lte=datetime.now() + timedelta(minutes=5))))
             if non_njpw_shows:
                 for s in non_njpw_shows:
                     # Check that spoiler mode hasn't already been triggered for that show
-                    if not SpoilerMode.objects(title=s.name):
+                    if not await db.run(lambda: SpoilerMode.objects(title=s.name).first()):
 
                         # Build spoiler_mode document
                         spoiler_mode = SpoilerMode(
@@ -170,49 +238,80 @@ class Tasks(commands.Cog):
                         )
 
                         # Save the document to the DB
-                        spoiler_mode.save()
+                        await db.run(spoiler_mode.save)
+                        cache.invalidate("spoiler_mode")
 
                         # Notify @here, in the non-njpw chat channel of the starting show and include the embed which lists the end time
-                        await self.bot.non_njpw_channel.send(
+                        self.bot.outbox.send(self.bot.non_njpw_channel,
                             content=f"@here **{spoiler_mode.title}** starting soon. Head to {self.bot.non_njpw_spoiler_channel.mention} for spoiler chat",
-                            embed=utils.embeds.spoiler_mode_embed(spoiler_mode)
+                            embed=utils.embeds.spoiler_mode_embed(spoiler_mode),
+                            priority=outbox.HIGH
                         )
 
-                        await self.bot.non_njpw_spoiler_channel.edit(topic=spoiler_mode.title)
+                        self.bot.outbox.edit_topic(self.bot.non_njpw_spoiler_channel, spoiler_mode.title)
 
                         logging.info(f"Non NJPW #spoiler-zone time started for **{spoiler_mode.title}**, ends in {s.spoiler_hours} hours")
 
             # DB query to find spoiler_mode events which have now ended
-            ending_shows = SpoilerMode.objects(ends_at__lt=datetime.now())
+            ending_shows = await db.run(lambda: list(SpoilerMode.objects(ends_at__lt=datetime.now())))
             if ending_shows:
                 for s in ending_shows:          
                     # For ended spoiler modes, send notifications to the relevant channels
                     if s.mode == "njpw":
-                        if SpoilerMode.objects(mode=s.mode).count() < 2:
-                            await self.bot.general_channel.send(
+                        if await db.run(lambda: SpoilerMode.objects(mode=s.mode).count()) < 2:
+                            next_show = await db.run(lambda: list(ScheduleShow.objects(time__gt=datetime.now())[:1]))
+                            self.bot.outbox.send(self.bot.general_channel,
                                 content=f"@here **{s.title}** _#spoiler-zone_ time has ended. Spoil away.\n\nNext show:",
-                                embed=utils.embeds.schedule_shows_embed(ScheduleShow.objects(time__gt=datetime.now())[:1], 1)
+                                embed=utils.embeds.schedule_shows_embed(next_show, 1),
+                                priority=outbox.HIGH
                             )
                         else:
-                            await self.bot.general_channel.send(
-                                content=f"@here **{s.title}** _#spoiler-zone_ time has ended. Spoil away.\nOngoing spoiler embargo:"
+                            self.bot.outbox.send(self.bot.general_channel,
+                                content=f"@here **{s.title}** _#spoiler-zone_ time has ended. Spoil away.\nOngoing spoiler embargo:",
+                                priority=outbox.HIGH
                             )
-                            for i in SpoilerMode.objects(title__ne=s.title):
-                                await self.bot.general_channel.send(
-                                    embed=utils.embeds.spoiler_mode_embed(i)
+                            for i in await db.run(lambda: list(SpoilerMode.objects(title__ne=s.title))):
+                                self.bot.outbox.send(self.bot.general_channel,
+                                    embed=utils.embeds.spoiler_mode_embed(i),
+                                    priority=outbox.HIGH
                                 )
                     elif s.mode == "non_njpw":
-                        await self.bot.non_njpw_channel.send(
-                            f"@here **{s.title}** _#spoiler-zone_ time has ended. Spoil away."
+                        self.bot.outbox.send(self.bot.non_njpw_channel,
+                            f"@here **{s.title}** _#spoiler-zone_ time has ended. Spoil away.",
+                            priority=outbox.HIGH
                         )
 
                     # Remove the spoiler mode document from the DB
-                    s.delete()
+                    await db.run(s.delete)
+                    cache.invalidate("spoiler_mode")
 
                     logging.info(f"{s.mode} spoiler-zone time ended for {s.title}")
         
         except Exception as e:
             logging.error("Error encountered while running spoiler_mode_watcher: " + str(e))
+            metrics.watcher_failures.inc("spoiler_mode_watcher")
+
+    # Drop cached query results for collections the scraper has written to since the last check
+    @tasks.loop(seconds=30)
+    @metrics.watcher("cache_invalidation_watcher")
+    async def cache_invalidation_watcher(self):
+        try:
+            await cache.poll_versions()
+
+        except Exception as e:
+            logging.error("Error encountered while running cache_invalidation_watcher: " + str(e))
+            metrics.watcher_failures.inc("cache_invalidation_watcher")
+
+    # Watchers are started when the cog is loaded, but wait for the bot to finish starting up before their first run,
+    # as they send to channels which are only set once the bot has logged in
+    @new_podcast_watcher.before_loop
+    @new_show_watcher.before_loop
+    @new_profile_watcher.before_loop
+    @removed_profile_watcher.before_loop
+    @spoiler_mode_watcher.before_loop
+    @cache_invalidation_watcher.before_loop
+    async def wait_until_started(self):
+        await self.bot.wait_until_started()
 
 def setup(bot):
     bot.add_cog(Tasks(bot))
\ No newline at end of file
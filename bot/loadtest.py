@@ -0,0 +1,328 @@
+"""
+Load test harness for the bot's cogs
+
+Drives the real cogs with synthetic message and command streams, without connecting to Discord. Channels, members,
+messages and command contexts are replaced by stand-ins which record sends instead of calling the API, and the DB is
+either an in-memory mongomock stand-in (the default, needs the mongomock package) or a local MongoDB.
+
+Messages are passed to every on_message listener, commands are parsed and invoked through the bot as they would be
+from a gateway event. Both are sent at a fixed rate for each stage (open loop), so when the bot can't keep up, handling
+latency grows instead of the send rate falling. For each stage, reports throughput, handling latency percentiles and
+event loop lag, along with the worst blocking callbacks named by the lag monitor.
+
+Usage (from the repo root):
+    python bot/loadtest.py --message-rates 50 200 1000 --command-rates 5 20 50 --duration 20
+    python bot/loadtest.py --db mongodb://localhost/superjbot_loadtest --commands "!nextshows 10" "!profile okada"
+
+Run before each release and compare with the previous release's numbers.
+"""
+
+import os
+import sys
+
+# The stand-in guild and channels don't need real IDs, constants are only filled in when not set
+for name in ("DISCORD_TOKEN", "OWNER_ID", "GUILD_ID", "GENERAL_CHANNEL", "NON_NJPW_CHANNEL", "NEW_MEMBER_CHANNEL",
+             "RULES_CHANNEL", "NEW_POD_CHANNEL", "NJPW_SPOILER_CHANNEL", "NON_NJPW_SPOILER_CHANNEL", "AEW_CHANNEL"):
+    os.environ.setdefault(name, "1")
+
+# Paginated replies would otherwise wait for reactions that never come
+os.environ.setdefault("PAGINATOR_TIMEOUT", "0")
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import logging
+import random
+import statistics
+import time
+
+import discord
+from discord.ext import commands
+from mongoengine import connect
+
+from utils.lag import LagMonitor
+from utils.members import MemberCache
+from utils.outbox import Outbox
+from utils.startup import SuperJBot
+from database.models import KennyAlarm, PodcastEpisode, PodcastInfo, Profile, ProfileBio, ResultShow, ScheduleShow
+
+# Cogs driven by the harness, Tasks and Admin only run background loops and admin commands
+COGS = ["listeners", "meta", "podcast", "profiles", "shows"]
+
+DEFAULT_COMMANDS = ["!nextshow", "!nextshows 10", "!lastshow", "!spoiler", "!profile okada", "!profile taka",
+                    "!bio naito", "!pod", "!lastpod", "!gamer"]
+
+# Chat messages, some of which trigger the Kenny alarm
+DEFAULT_MESSAGES = ["great show last night", "who's in the G1 this year?", "that finish was incredible",
+                    "kenny would have loved that", "anyone watching on njpw world?", "what time is bell tomorrow?"]
+
+###
+# Stand-ins for discord.py objects
+###
+
+ids = itertools.count(1000)
+
+class FakeUser():
+    def __init__(self, name, bot=False):
+        self.id = next(ids)
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+class FakeChannel():
+    def __init__(self, name, api_latency):
+        self.id = next(ids)
+        self.name = name
+        self.category = None
+        self.mention = f"<#{self.id}>"
+        self.api_latency = api_latency
+        self.sent = 0
+
+    def __str__(self):
+        return self.name
+
+    # Sleeps for the simulated API round trip, then returns a stand-in for the sent message
+    async def send(self, content=None, *, embed=None, **kwargs):
+        await asyncio.sleep(self.api_latency)
+        self.sent += 1
+        return FakeMessage(content or "", bot_user, self)
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.api_latency)
+
+class FakeMessage():
+    def __init__(self, content, author, channel):
+        self.id = next(ids)
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = None
+        self.created_at = datetime.datetime.utcnow()
+        self.jump_url = f"https://discord.com/channels/1/{channel.id}/{self.id}"
+        self.mentions = []
+        self.role_mentions = []
+        self.channel_mentions = []
+        self.mention_everyone = False
+        self.reactions = []
+
+    async def add_reaction(self, emoji):
+        await asyncio.sleep(self.channel.api_latency)
+        self.reactions.append(emoji)
+
+    async def remove_reaction(self, emoji, member):
+        pass
+
+    async def clear_reactions(self):
+        self.reactions = []
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.channel.api_latency)
+
+# Replies go to the stand-in channel instead of through the HTTP client
+class LoadTestContext(commands.Context):
+    async def send(self, content=None, *, embed=None, **kwargs):
+        return await self.channel.send(content, embed=embed)
+
+bot_user = FakeUser("superjbot", bot=True)
+
+###
+# Setup
+###
+
+# Create the bot with the cogs loaded and stand-in channels, without logging in
+async def create_bot(api_latency):
+    intents = discord.Intents.default()
+    intents.members = True
+    bot = SuperJBot(command_prefix="!", intents=intents)
+
+    bot._connection.user = bot_user
+    bot.lag_monitor = LagMonitor()
+    bot.outbox = Outbox()
+    bot.members = MemberCache(bot)
+    bot.owner = FakeUser("owner")
+
+    for name in ("general_channel", "new_pod_channel", "non_njpw_channel", "new_member_channel", "rules_channel",
+                 "njpw_spoiler_channel", "non_njpw_spoiler_channel", "aew_channel"):
+        setattr(bot, name, FakeChannel(name, api_latency))
+
+    # Loops wait for startup to finish before their first run, it is never finished here so they stay idle
+    for cog in COGS:
+        bot.load_extension(f"cogs.{cog}")
+
+    bot.lag_monitor.start()
+    await bot.warm_up()
+
+    return bot
+
+# Add a small dataset when the DB is empty, so that commands have something to find
+def seed(profiles, seed_value=0):
+    if Profile.objects.count():
+        return
+
+    rng = random.Random(seed_value)
+    first = ["Kazuchika", "Tetsuya", "Hiroshi", "Shingo", "Hiromu", "Will", "Zack", "Jay", "Kota", "Taichi", "Yota"]
+    last = ["Okada", "Naito", "Tanahashi", "Takagi", "Takahashi", "Ospreay", "Sabre", "White", "Ibushi", "Tsuji"]
+    units = ["CHAOS", "Los Ingobernables de Japon", "Suzuki-gun", "BULLET CLUB", "United Empire", "Just 5 Guys"]
+
+    names = sorted({f"{rng.choice(first)} {rng.choice(last)} {i}" if i else "Kazuchika Okada" for i in range(profiles)})
+    Profile.objects.insert([
+        Profile(name=n, link=f"https://www.njpw1972.com/profile/{i}", attributes={"unit": rng.choice(units)})
+        for i, n in enumerate(names)
+    ], load_bulk=False)
+    ProfileBio.objects.insert([ProfileBio(name=n, bio=f"{n} bio. " * 200) for n in names], load_bulk=False)
+
+    now = datetime.datetime.now()
+    ScheduleShow.objects.insert([
+        ScheduleShow(name=f"Road to Show {i}", time=now + datetime.timedelta(days=i), date=now + datetime.timedelta(days=i),
+                     city="Tokyo", venue="Korakuen Hall", new=False)
+        for i in range(1, 31)
+    ], load_bulk=False)
+    ResultShow.objects.insert([
+        ResultShow(name=f"Past Show {i}", time=now - datetime.timedelta(days=i), date=now - datetime.timedelta(days=i),
+                   city="Osaka", venue="Edion Arena")
+        for i in range(1, 31)
+    ], load_bulk=False)
+
+    PodcastInfo(title="Super J-Cast", description="A podcast about NJPW", url="https://redcircle.com/shows/super-j-cast/").save()
+    PodcastEpisode.objects.insert([
+        PodcastEpisode(title=f"Episode {i}", link=f"https://redcircle.com/episodes/{i}",
+                       published=now.date() - datetime.timedelta(days=7 * i), duration="01:00:00", new=False)
+        for i in range(1, 51)
+    ], load_bulk=False)
+
+    KennyAlarm(trigger_terms=["kenny", "omega"], whitelist_channels=[], record_days=0).save()
+
+###
+# Load generation
+###
+
+# Counters and latencies for one stream in one stage
+class StreamStats():
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.sent = 0
+
+    def report(self, name, elapsed):
+        if not self.latencies:
+            return f"{name:<10}{self.sent:>8} sent, nothing completed"
+
+        latencies = sorted(self.latencies)
+        pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+        return (f"{name:<10}{self.sent:>8}{len(latencies) / elapsed:>10.1f}{pick(50):>9.1f}{pick(90):>9.1f}"
+                f"{pick(99):>9.1f}{latencies[-1] * 1000:>9.1f}{statistics.mean(latencies) * 1000:>9.1f}{self.errors:>8}")
+
+# Call handle(item) rate times per second for duration seconds, without waiting for earlier calls to finish
+# Latency is measured from when each call was due, so time spent waiting to start counts
+async def drive(rate, duration, items, handle, stats):
+    if not rate:
+        return
+
+    loop = asyncio.get_event_loop()
+    interval = 1 / rate
+    start = loop.time()
+    pending = []
+
+    async def timed(item, due):
+        try:
+            if await handle(item) is False:
+                stats.errors += 1
+        except Exception:
+            stats.errors += 1
+        finally:
+            stats.latencies.append(loop.time() - due)
+
+    for n in itertools.count():
+        due = start + n * interval
+        if due - start >= duration:
+            break
+
+        now = loop.time()
+        if due > now:
+            await asyncio.sleep(due - now)
+
+        stats.sent += 1
+        pending.append(asyncio.ensure_future(timed(next(items), due)))
+
+    await asyncio.gather(*pending)
+
+# Pass a message to every on_message listener, as the bot would for a gateway MESSAGE_CREATE
+async def handle_message(bot, message):
+    await asyncio.gather(*[listener(message) for listener in bot.extra_events.get("on_message", [])])
+
+# Parse and invoke a command, as Bot.process_commands would
+# Returns False if the command failed
+async def handle_command(bot, message):
+    ctx = await bot.get_context(message, cls=LoadTestContext)
+    await bot.invoke(ctx)
+
+    return not ctx.command_failed
+
+async def run(args):
+    logging.basicConfig(level=logging.WARNING)
+    connect(host=args.db)
+    if not args.no_seed:
+        seed(args.profiles)
+
+    bot = await create_bot(args.api_latency / 1000)
+    channel = FakeChannel("load-test", args.api_latency / 1000)
+    users = [FakeUser(f"user{i}") for i in range(args.users)]
+
+    messages = (FakeMessage(text, random.choice(users), channel) for text in itertools.cycle(args.messages))
+    command_messages = (FakeMessage(text, random.choice(users), channel) for text in itertools.cycle(args.commands))
+
+    print(f"{'stream':<10}{'sent':>8}{'per sec':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'mean ms':>9}{'errors':>8}")
+
+    for message_rate, command_rate in itertools.zip_longest(args.message_rates, args.command_rates, fillvalue=0):
+        print(f"-- {message_rate} messages/s, {command_rate} commands/s for {args.duration}s")
+        bot.lag_monitor.samples.clear()
+
+        message_stats = StreamStats()
+        command_stats = StreamStats()
+        start = time.perf_counter()
+        await asyncio.gather(
+            drive(message_rate, args.duration, messages, lambda m: handle_message(bot, m), message_stats),
+            drive(command_rate, args.duration, command_messages, lambda m: handle_command(bot, m), command_stats)
+        )
+        elapsed = time.perf_counter() - start
+
+        if message_rate:
+            print(message_stats.report("messages", elapsed))
+        if command_rate:
+            print(command_stats.report("commands", elapsed))
+
+        lag = bot.lag_monitor.summary()
+        print(f"event loop lag: {lag['mean']:.1f}ms mean, {lag['window_max']:.1f}ms max")
+
+    offenders = bot.lag_monitor.worst_offenders()
+    if offenders:
+        print("Worst blocking callbacks:")
+        for o in offenders:
+            print(f"  {o.name}: {o.count} blocks, {o.worst * 1000:.0f}ms worst")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bot's cogs with synthetic messages and commands")
+    parser.add_argument("--db", default="mongomock://localhost/superjbot_loadtest",
+                        help="MongoDB URL, defaults to an in-memory mongomock DB")
+    parser.add_argument("--no-seed", action="store_true", help="don't add sample data to an empty DB")
+    parser.add_argument("--profiles", type=int, default=500, help="number of profiles added to an empty DB (default 500)")
+    parser.add_argument("--message-rates", type=float, nargs="*", default=[50, 200, 1000],
+                        help="messages per second for each stage (default 50 200 1000)")
+    parser.add_argument("--command-rates", type=float, nargs="*", default=[5, 20, 50],
+                        help="commands per second for each stage (default 5 20 50)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds each stage runs for (default 10)")
+    parser.add_argument("--api-latency", type=float, default=50, help="simulated Discord API latency in ms (default 50)")
+    parser.add_argument("--users", type=int, default=200, help="number of distinct message authors (default 200)")
+    parser.add_argument("--messages", nargs="*", default=DEFAULT_MESSAGES, help="message texts, sent in turn")
+    parser.add_argument("--commands", nargs="*", default=DEFAULT_COMMANDS, help="commands, sent in turn")
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -42,4 +42,52 @@ NJPW_SPOILER_CHANNEL = int(os.environ["NJPW_SPOILER_CHANNEL"])
 NON_NJPW_SPOILER_CHANNEL = int(os.environ["NON_NJPW_SPOILER_CHANNEL"])
 
 # ID of the AEW Channel
-AEW_CHANNEL = int(os.environ["AEW_CHANNEL"])
\ No newline at end of file
+AEW_CHANNEL = int(os.environ["AEW_CHANNEL"])
+
+###
+# Performance Tuning
+###
+
+# Number of threads used to run DB queries off the event loop
+DB_WORKERS = int(os.environ.get("DB_WORKERS", 4))
+
+# Seconds before cached query results expire, scraper writes also invalidate the cache
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 900))
+
+# Maximum number of profiles returned by a single !profile or !bio search, results are paged through one at a time
+PROFILE_SEARCH_RESULTS = int(os.environ.get("PROFILE_SEARCH_RESULTS", 25))
+
+# Maximum number of episodes returned by a single !searchpod search, results are paged through 5 at a time
+EPISODE_SEARCH_RESULTS = int(os.environ.get("EPISODE_SEARCH_RESULTS", 25))
+
+# Seconds a paginated result view responds to reactions before it stops
+PAGINATOR_TIMEOUT = int(os.environ.get("PAGINATOR_TIMEOUT", 120))
+
+# Seconds the event loop can be blocked for before the lag monitor logs what was running
+LAG_THRESHOLD = float(os.environ.get("LAG_THRESHOLD", 0.25))
+
+###
+# Permissions
+###
+
+# Comma separated names or IDs of roles allowed to use admin commands
+# If not set, any role above @everyone is treated as an admin role
+ADMIN_ROLES = [r.strip() for r in os.environ.get("ADMIN_ROLES", "").split(",") if r.strip()]
+
+###
+# Member Cache
+###
+
+# "full" chunks and caches every guild member at startup
+# "lazy" skips chunking, members are fetched when needed and kept in a bounded LRU cache
+MEMBER_CACHE = os.environ.get("MEMBER_CACHE", "full")
+
+# Maximum number of members kept in the LRU cache when MEMBER_CACHE is "lazy"
+MEMBER_LRU_SIZE = int(os.environ.get("MEMBER_LRU_SIZE", 1000))
+
+###
+# Metrics
+###
+
+# Port for the Prometheus metrics endpoint, served on 127.0.0.1 only. Not served if not set
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
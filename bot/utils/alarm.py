@@ -0,0 +1,101 @@
+"""
+In-memory state of the Kenny alarm
+
+The KennyAlarm document is read into memory once and kept up to date by periodic refreshes, so the
+on_message listener and !gamer never need to query the DB.
+
+Triggers update the in-memory copy and mark it as dirty. Dirty state is written back by flush(),
+so a burst of triggers within a flush interval results in a single DB write.
+"""
+
+import logging
+from datetime import datetime
+
+from database.models import KennyAlarm
+
+class KennyAlarmState():
+    def __init__(self):
+        # Config fields, always taken from the DB document
+        self.trigger_terms = []
+        self.whitelist_channels = []
+
+        # Mention fields, changed in memory by triggers and persisted on flush
+        self.last_mention_time = None
+        self.last_mention_user = None
+        self.last_mention_message = None
+        self.last_mention_link = None
+        self.record_days = 0
+
+        # Set when the in-memory mention fields differ from the DB document
+        self.dirty = False
+        self.loaded = False
+
+    # Pull the KennyAlarm document from the DB and copy it into memory
+    # Mention fields are only overwritten when there are no unflushed local changes
+    def refresh(self):
+        alarm_obj = KennyAlarm.objects.first()
+        if not alarm_obj:
+            logging.warning("No kenny_alarm document found in DB")
+            return
+
+        trigger_terms = list(alarm_obj.trigger_terms or [])
+        whitelist_channels = list(getattr(alarm_obj, "whitelist_channels", None) or [])
+
+        if trigger_terms != self.trigger_terms:
+            logging.info(f"Current kenny alarm trigger terms: {trigger_terms}")
+        if whitelist_channels != self.whitelist_channels:
+            logging.info(f"Current kenny alarm whitelisted channels: {whitelist_channels}")
+
+        self.trigger_terms = trigger_terms
+        self.whitelist_channels = whitelist_channels
+
+        if not self.dirty:
+            self.last_mention_time = alarm_obj.last_mention_time
+            self.last_mention_user = alarm_obj.last_mention_user
+            self.last_mention_message = alarm_obj.last_mention_message
+            self.last_mention_link = alarm_obj.last_mention_link
+            self.record_days = alarm_obj.record_days or 0
+
+        self.loaded = True
+
+    # Check whether a message should trigger the alarm
+    def matches(self, message):
+        content = message.content.lower()
+        return (any(x in content for x in self.trigger_terms)
+                and message.channel.id not in self.whitelist_channels)
+
+    # Record a triggering message in memory
+    # The change is persisted on the next flush
+    def trigger(self, message):
+        # Calculate time since last breach and update the record if the ending timespan is the longest ever
+        if self.last_mention_time:
+            days_between_breaches = (datetime.now() - self.last_mention_time).days
+            if days_between_breaches > self.record_days:
+                self.record_days = days_between_breaches
+
+        self.last_mention_time = message.created_at
+        self.last_mention_user = message.author.display_name
+        self.last_mention_message = message.content
+        self.last_mention_link = message.jump_url
+        self.dirty = True
+
+    # Write any unflushed changes to the kenny_alarm document
+    def flush(self):
+        if not self.dirty:
+            return
+
+        # Clear the flag first so that triggers arriving during the write are flushed next time
+        self.dirty = False
+        try:
+            KennyAlarm.objects.first().update(
+                last_mention_time=self.last_mention_time,
+                last_mention_user=self.last_mention_user,
+                last_mention_message=self.last_mention_message,
+                last_mention_link=self.last_mention_link,
+                record_days=self.record_days
+            )
+            logging.debug("Flushed kenny alarm state to DB")
+
+        except Exception:
+            self.dirty = True
+            raise
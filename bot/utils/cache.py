@@ -0,0 +1,115 @@
+"""
+In-process read-through cache for read-mostly queries
+
+Entries are keyed by query shape, a tuple where the first item is the name of the collection the data comes from,
+ie ("schedule_show", "next", 3). Each entry expires after its TTL, and all entries for a collection can be dropped at
+once with invalidate() when that collection is written to.
+
+Writes made by the scraper are picked up through the collection_version collection, which the scraper bumps after
+each write and the bot polls (see Tasks.cache_invalidation_watcher).
+
+Usage:
+    shows = await cache.get(("schedule_show", "next", 3), lambda: list(ScheduleShow.objects[:3]), ttl=3600)
+"""
+
+import logging
+import time
+from collections import Counter
+
+from utils import db
+from database.models import CollectionVersion
+
+# key: (expires_at, value)
+entries = {}
+
+# Upper bound on cached entries, as some keys include user input (ie the number of shows requested)
+MAX_ENTRIES = 512
+
+# Counters per collection, displayed by !cachestats
+hits = Counter()
+misses = Counter()
+invalidations = Counter()
+
+# Last seen collection_version per collection, None until the first poll
+versions = None
+
+# Return the cached value for key, or run the blocking loader off the event loop and cache its result
+async def get(key, loader, ttl):
+    namespace = key[0]
+
+    entry = entries.get(key)
+    if entry and entry[0] > time.monotonic():
+        hits[namespace] += 1
+        return entry[1]
+
+    misses[namespace] += 1
+    loaded_at = generation(namespace)
+    value = await db.run(loader)
+
+    # If the collection was invalidated while loading, the value may be stale, so it is returned but not cached
+    if generation(namespace) != loaded_at:
+        return value
+
+    if len(entries) >= MAX_ENTRIES:
+        _evict()
+    entries[key] = (time.monotonic() + ttl, value)
+
+    return value
+
+# Remove expired entries, then the entries closest to expiry until there is room for one more
+def _evict():
+    now = time.monotonic()
+    for key in [k for k, v in entries.items() if v[0] <= now]:
+        del entries[key]
+
+    overflow = max(0, len(entries) - MAX_ENTRIES + 1)
+    for key in sorted(entries, key=lambda k: entries[k][0])[:overflow]:
+        del entries[key]
+
+# Drop every cached entry for the given collection(s)
+def invalidate(*namespaces):
+    for key in [k for k in entries if k[0] in namespaces]:
+        del entries[key]
+
+    for namespace in namespaces:
+        invalidations[namespace] += 1
+        logging.debug(f"Cache invalidated for {namespace}")
+
+# Compare collection versions pulled from the DB with the last seen versions, invalidating any that changed
+# The first set of versions seen is only recorded, as there is nothing cached from before it
+def apply_versions(new_versions):
+    global versions
+
+    if versions is None:
+        changed = []
+    else:
+        changed = [k for k, v in new_versions.items() if versions.get(k) != v]
+    versions = dict(new_versions)
+
+    if changed:
+        logging.info(f"Collections updated by scraper, invalidating cache: {changed}")
+        invalidate(*changed)
+
+    return changed
+
+# Read the current collection versions from the DB and apply them, returning the collections which changed
+async def poll_versions():
+    new_versions = await db.run(lambda: {v.name: v.version for v in CollectionVersion.objects})
+    return apply_versions(new_versions)
+
+# Return a value which changes whenever the collection is known to have been written to, by the scraper or the bot
+# Used by in-memory indexes to decide when to rebuild
+def generation(namespace):
+    return (versions.get(namespace) if versions else None, invalidations[namespace])
+
+# Return a list of lines summarising hits and misses per collection
+def summary():
+    lines = []
+    for namespace in sorted(set(hits) | set(misses)):
+        total = hits[namespace] + misses[namespace]
+        rate = hits[namespace] / total * 100 if total else 0
+        cached = len([k for k in entries if k[0] == namespace])
+        lines.append(f"{namespace}: {hits[namespace]} hits, {misses[namespace]} misses ({rate:.0f}% hit rate), "
+                     f"{cached} cached, {invalidations[namespace]} invalidations")
+
+    return lines
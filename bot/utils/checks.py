@@ -3,10 +3,46 @@ Custom commands.check functions
 
 Defines custom checks to be passed to @commands.check()
 """
-from settings.constants import GUILD_ID
+import logging
 
-# Checks that the author of the invoked command is in a user group higher than @everyone
-def is_admin(ctx):
-    guild = ctx.bot.get_guild(GUILD_ID)
-    author = guild.get_member(ctx.author.id)
-    return any(role > guild.default_role for role in author.roles)
\ No newline at end of file
+import discord
+
+from settings.constants import GUILD_ID, ADMIN_ROLES
+
+# Cached result of the admin check for each member ID
+# Entries are dropped by the Listeners cog when a member's roles, or the guild's roles, change
+admin_cache = {}
+
+# Checks that the author of the invoked command has an admin role
+# The result is cached per member, so after the first command this is a single dict lookup
+async def is_admin(ctx):
+    cached = admin_cache.get(ctx.author.id)
+    if cached is not None:
+        return cached
+
+    # In the guild the author is already a Member, in DMs the member is looked up, as it may not be in the member cache
+    member = ctx.author
+    if not isinstance(member, discord.Member) or member.guild.id != GUILD_ID:
+        member = await ctx.bot.members.get(ctx.author.id)
+        if not member:
+            admin_cache[ctx.author.id] = False
+            return False
+
+    admin_cache[member.id] = member_is_admin(member)
+    return admin_cache[member.id]
+
+# If ADMIN_ROLES is configured, any of those roles makes a member an admin, matched by role ID or name
+# Otherwise, any role in a user group higher than @everyone does
+def member_is_admin(member):
+    if ADMIN_ROLES:
+        return any(str(role.id) in ADMIN_ROLES or role.name in ADMIN_ROLES for role in member.roles)
+
+    return any(role > member.guild.default_role for role in member.roles)
+
+# Drop the cached admin check for a member, or for every member if no ID is given
+def invalidate(member_id=None):
+    if member_id is None:
+        admin_cache.clear()
+        logging.debug("Admin check cache cleared")
+    else:
+        admin_cache.pop(member_id, None)
@@ -0,0 +1,71 @@
+"""
+Off-loop DB access
+
+mongoengine is synchronous, so a query run directly inside a coroutine blocks the event loop for the
+full round trip, delaying gateway heartbeats and every other command.
+
+Queries are instead run in a bounded thread pool and awaited. QuerySets are lazy, so the callable passed
+to run() should evaluate the query fully (ie list(), .first(), .count()) before returning.
+
+Usage:
+    shows = await db.run(lambda: list(ScheduleShow.objects[:3]))
+    await db.run(show.update, new=False)
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from settings.constants import DB_WORKERS
+
+executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+# Simple counters, displayed by !ping
+stats = {
+    "queries": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "total_time": 0.0
+}
+
+# Run a blocking DB call in the executor and return its result
+# Stats are only updated here, on the event loop, so they don't need a lock
+async def run(func, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    call = functools.partial(_timed, func, *args, **kwargs)
+
+    stats["in_flight"] += 1
+    try:
+        result, error, elapsed = await loop.run_in_executor(executor, call)
+    finally:
+        stats["in_flight"] -= 1
+
+    stats["queries"] += 1
+    stats["total_time"] += elapsed
+    if error:
+        stats["errors"] += 1
+        raise error
+
+    return result
+
+# Runs in the executor thread, timing the call
+# Returns (result, exception raised or None, seconds taken), for run() to add to the stats
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = error = None
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        error = e
+
+    elapsed = time.perf_counter() - start
+    logging.debug(f"DB call {getattr(func, '__name__', func)} took {elapsed * 1000:.1f}ms")
+
+    return result, error, elapsed
+
+# Return a one line summary of the DB stats
+def summary():
+    mean = stats["total_time"] / stats["queries"] * 1000 if stats["queries"] else 0
+    return f"{stats['queries']} queries, {mean:.1f}ms mean, {stats['in_flight']} in flight, {stats['errors']} errors"
@@ -140,7 +140,8 @@ def schedule_shows_embed(shows, number_of_shows):
 
 # Build an embed with info on past shows
 # The number of shows to display declared in an argument
-def result_shows_embed(shows, number_of_shows):
+# matches is {card url: [MatchResult]}, results are listed under each show with any stored, hidden behind spoiler tags
+def result_shows_embed(shows, number_of_shows, matches=None):
     # Build the title and intro section of the embed depending on the types, and number, of shows
     embed = Embed(
         title="Previous NJPW Shows",
@@ -148,11 +149,20 @@ def result_shows_embed(shows, number_of_shows):
         description=f"Here's the previous {number_of_shows} show(s)!"
     )
 
+    # Results are shared out between the shows to keep within the total embed limit
+    value_limit = min(EMBED_LIMITS["field_value"], (EMBED_LIMITS["total"] - 500) // max(len(shows), 1))
+
     for show in shows:
+        value = f"{show.time.strftime(datefmt)}\nCity: {show.city}\nVenue: {show.venue}"
+
+        # Matches without a result (ie a card scraped before the show) have nothing to hide behind spoiler tags
+        show_matches = [m for m in (matches or {}).get(show.card, []) if m.result]
+        if show_matches:
+            value += "\n" + match_results_str(show_matches, value_limit - len(value) - 1)
 
         embed.add_field(
             name=show["name"],
-            value=f"{show.time.strftime(datefmt)}\nCity: {show.city}\nVenue: {show.venue}",
+            value=value,
             inline=False
         )
     
@@ -161,23 +171,34 @@ def result_shows_embed(shows, number_of_shows):
 
     return embed
 
-# Build an embed with info on shows added to the schedule
-def new_shows_embed(shows):
-    embed = Embed()
+# One spoiler tagged line per match, as many as fit in limit characters, with a count of any left out
+def match_results_str(matches, limit):
+    lines = []
+    length = 0
+    for i, match in enumerate(matches):
+        line = f"||{match.result}||"
+        more = f"...and {len(matches) - i} more"
 
-    for show in shows:
+        # Room is kept for the count of matches left out, unless this is the last match
+        reserve = 0 if i == len(matches) - 1 else len(more) + 1
+        if length + len(line) + reserve > limit:
+            lines.append(more)
+            break
 
-        embed.add_field(
-            name=show["name"],
-            value=f"City: {show.city}\nVenue: {show.venue}\n" + zone_times_str(show.time),
-            inline=False
-        )
+        lines.append(line)
+        length += len(line) + 1
 
-    embed.set_thumbnail(
-        url=shows[0]["thumb"]
-    )
+    return "\n".join(lines)
 
-    return embed
+# Build embeds listing shows added to the schedule
+# Shows are packed across as few embeds as possible, see pack_fields
+def new_shows_embeds(shows):
+    fields = [
+        (show["name"], f"City: {show.city}\nVenue: {show.venue}\n" + zone_times_str(show.time))
+        for show in shows
+    ]
+
+    return pack_fields(fields, thumbnail=shows[0]["thumb"])
 
 # Build an embed with show title and end times for the start of a spoiler mode
 def spoiler_mode_embed(spoiler_mode):
@@ -225,9 +246,9 @@ def profile_embed(profile):
 
     return embed
 
-# Build an embed with a wrestler's bio using a provided dict
+# Build an embed with a wrestler's bio using a provided dict and the bio text, which is stored separately
 # Bio info is pulled from njpw1972.com/profile
-def bio_embed(profile):
+def bio_embed(profile, bio):
 
     try:
         if "unit" in profile["attributes"] and profile["attributes"]["unit"] in colours:
@@ -245,20 +266,131 @@ def bio_embed(profile):
         title=profile["name"],
         url=profile["link"],
         color=colour,
-        description=profile["bio"][:2040] + "..."
+        description=bio[:2040] + "..."
     )
 
     embed.set_thumbnail(
         url=profile["render"]
     )
 
-    if len(profile["bio"]) > 2048:
+    if len(bio) > 2048:
         embed.set_footer(
             text="Bio truncated due to Discord Embed limits, see the full profile by visiting njpw1972.com"
         )
 
     return embed
 
+# Build embeds listing wrestler profiles, ie for new or removed profile announcements
+# Each profile is a single field so that many can be packed into one embed
+def profile_list_embeds(profiles, title):
+    fields = []
+    for p in profiles:
+        unit = p["attributes"].get("unit")
+        fields.append((p["name"], (f"Unit: {unit}\n" if unit else "") + p["link"]))
+
+    return pack_fields(fields, title=title, url="https://www.njpw1972.com/profiles/")
+
+# Build embeds listing podcast episodes
+def episode_list_embeds(episodes, title):
+    fields = [
+        (e["title"], e["published"].strftime(datefmt) + "\n" + e["link"])
+        for e in episodes
+    ]
+
+    return pack_fields(fields, title=title, url="https://redcircle.com/shows/super-j-cast/")
+
+# Build an embed listing the shows a wrestler has been, or is booked, on, with results hidden behind spoiler tags
+def appearances_embed(wrestler, appearances):
+    fields = []
+    for a in appearances:
+        value = f"{a.time.strftime(datefmt)}\nCity: {a.city}\nVenue: {a.venue}"
+        if a.scheduled:
+            value += "\nUpcoming"
+        elif a.result:
+            value += f"\n||{a.result.capitalize()}||"
+
+        fields.append((a.show, value))
+
+    return pack_fields(fields, title=f"Appearances: {wrestler}", url="https://www.njpw1972.com/result")[0]
+
+# Return a copy of an embed with page details added to the footer, keeping any existing footer text
+# A copy is used as the same embed can be shared by several views
+def paged_embed(embed, text):
+    embed = embed.copy()
+    footer = embed.footer.text
+    embed.set_footer(text=f"{footer}\n{text}" if footer else text)
+
+    return embed
+
+# Discord embed limits
+# https://discord.com/developers/docs/resources/channel#embed-limits
+EMBED_LIMITS = {
+    "title": 256,
+    "description": 4096,
+    "fields": 25,
+    "field_name": 256,
+    "field_value": 1024,
+    "footer": 2048,
+    "author": 256,
+    "total": 6000
+}
+
+# Discord's limit on the length of a message's content
+MESSAGE_LIMIT = 2000
+
+# Count the characters of an embed which make up Discord's total limit
+def embed_length(embed):
+    data = embed.to_dict()
+
+    length = len(data.get("title", "")) + len(data.get("description", ""))
+    length += sum(len(f["name"]) + len(f["value"]) for f in data.get("fields", []))
+    length += len(data.get("footer", {}).get("text", "")) + len(data.get("author", {}).get("name", ""))
+
+    return length
+
+# Cut text down to the given limit, marking that it has been truncated
+def truncate(text, limit):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+# Pack a list of (name, value) fields into as few embeds as possible without exceeding any of Discord's limits
+# Fields are kept in order and are never dropped, over-long names and values are truncated to fit
+# The title, url, description and thumbnail are only set on the first embed, later embeds are marked as continued
+def pack_fields(fields, title=None, url=None, description=None, thumbnail=None):
+    fields = [
+        (truncate(name, EMBED_LIMITS["field_name"]) or "-", truncate(value, EMBED_LIMITS["field_value"]) or "-")
+        for name, value in fields
+    ]
+
+    embeds = []
+
+    def new_embed():
+        if not embeds:
+            embed = Embed(
+                title=truncate(title, EMBED_LIMITS["title"]) if title else Embed.Empty,
+                url=url or Embed.Empty,
+                description=truncate(description, EMBED_LIMITS["description"]) if description else Embed.Empty
+            )
+            if thumbnail:
+                embed.set_thumbnail(url=thumbnail)
+        else:
+            embed = Embed(
+                title=truncate(f"{title} (continued)", EMBED_LIMITS["title"]) if title else Embed.Empty
+            )
+
+        embeds.append(embed)
+        return embed
+
+    embed = new_embed()
+    for name, value in fields:
+        if (len(embed.fields) >= EMBED_LIMITS["fields"]
+                or embed_length(embed) + len(name) + len(value) > EMBED_LIMITS["total"]):
+            embed = new_embed()
+
+        embed.add_field(name=name, value=value, inline=False)
+
+    return embeds
+
 # Faction specific Discord colour codes
 colours = {
         "Suzuki gun": 12745742,
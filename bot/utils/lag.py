@@ -0,0 +1,158 @@
+"""
+Event loop lag monitor
+
+A background task sleeps for a fixed interval and measures how late it wakes up. Anything that blocks the
+event loop (sync DB calls, CPU heavy work) shows up as lag, so this gives a direct measure of how
+responsive the bot is to gateway events and commands.
+
+A watchdog thread names the cause. When the monitor task is overdue by more than the threshold, the loop is blocked, so
+the watchdog samples the stack of the loop's thread and works out what was running (a command, listener or tasks.loop
+and the cog function it was in). Once the loop recovers, the block is logged with its duration and the stack sample, and
+added to the worst offenders shown by !lag.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque, namedtuple
+
+# Frames from discord.py which show what kind of callback was running, as (end of file path, function name)
+CALLBACK_KINDS = [
+    ("loop", os.path.join("ext", "tasks", "__init__.py"), "_loop"),
+    ("command", os.path.join("ext", "commands", "core.py"), "wrapped"),
+    ("listener", os.path.join("discord", "client.py"), "_run_event"),
+]
+
+# Root of the bot package, frames from here are used to name what was running
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Number of frames kept in each stack sample
+STACK_DEPTH = 8
+
+# Totals for each named cause of blocking, worst is the longest single block
+Offender = namedtuple("Offender", ["name", "count", "total", "worst", "stack"])
+
+class LagMonitor():
+    def __init__(self, interval=0.5, window=240, threshold=0.25):
+        self.interval = interval
+        # Most recent lag samples in seconds, covering interval * window seconds
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.task = None
+
+        # Blocks longer than this, in seconds, are sampled and logged
+        self.threshold = threshold
+        self.watchdog = None
+        self.loop_thread = None
+        # Time the monitor task is next expected to wake, set by the task and read by the watchdog
+        self.due = None
+        # (name, stack) sampled by the watchdog during the current block, taken by the task once it wakes
+        self.sample = None
+        # name: Offender
+        self.offenders = {}
+
+    # Start the monitor on the running event loop, if it isn't already running
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.task = asyncio.ensure_future(self._run())
+
+        self.loop_thread = threading.get_ident()
+        if not self.watchdog:
+            self.watchdog = threading.Thread(target=self._watch, name="lag-watchdog", daemon=True)
+            self.watchdog.start()
+
+        logging.info("Started event loop lag monitor")
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            self.due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+            sample, self.sample = self.sample, None
+            if sample and lag >= self.threshold:
+                self._record(sample, lag)
+
+    # Runs in the watchdog thread, sampling the loop thread's stack once per block
+    def _watch(self):
+        blocked = False
+        while True:
+            time.sleep(self.threshold / 2)
+
+            if self.due is None or not self.task or self.task.done():
+                continue
+
+            overdue = time.monotonic() - self.due
+            if overdue < self.threshold:
+                blocked = False
+            elif not blocked:
+                blocked = True
+                frame = sys._current_frames().get(self.loop_thread)
+                if frame:
+                    self.sample = describe(frame)
+
+    # Log a block once the loop has recovered, and add it to the offenders
+    def _record(self, sample, lag):
+        name, stack = sample
+        logging.warning(f"Event loop blocked for {lag * 1000:.0f}ms by {name}\n" + "".join(stack))
+
+        offender = self.offenders.get(name)
+        if offender:
+            self.offenders[name] = Offender(name, offender.count + 1, offender.total + lag, max(offender.worst, lag),
+                                            stack if lag > offender.worst else offender.stack)
+        else:
+            self.offenders[name] = Offender(name, 1, lag, lag, stack)
+
+    # Return current, mean and max lag over the sample window, and max lag since start, all in ms
+    def summary(self):
+        if not self.samples:
+            return {"current": 0.0, "mean": 0.0, "window_max": 0.0, "max": 0.0}
+
+        return {
+            "current": self.samples[-1] * 1000,
+            "mean": sum(self.samples) / len(self.samples) * 1000,
+            "window_max": max(self.samples) * 1000,
+            "max": self.max_lag * 1000
+        }
+
+    # Return the offenders which have blocked the loop for longest in a single block, worst first
+    def worst_offenders(self, limit=5):
+        return sorted(self.offenders.values(), key=lambda o: o.worst, reverse=True)[:limit]
+
+# Name what a stack was running and return (name, formatted innermost frames)
+# ie ("loop cogs/tasks.py:new_show_watcher", [...])
+def describe(frame):
+    stack = traceback.extract_stack(frame)
+
+    kind = "callback"
+    for frame_summary in stack:
+        for callback_kind, path, function in CALLBACK_KINDS:
+            if frame_summary.name == function and frame_summary.filename.endswith(path):
+                kind = callback_kind
+
+    # The outermost frame in a cog is the command, listener or loop itself, otherwise use the innermost bot frame
+    own = [f for f in stack if f.filename.startswith(BOT_DIR)]
+    cogs = [f for f in own if f.filename.startswith(os.path.join(BOT_DIR, "cogs"))]
+    if cogs:
+        where = cogs[0]
+    elif own:
+        where = own[-1]
+    else:
+        where = stack[-1]
+
+    location = os.path.relpath(where.filename, BOT_DIR) if where.filename.startswith(BOT_DIR) else where.filename
+    return f"{kind} {location}:{where.name}", traceback.format_list(stack[-STACK_DEPTH:])
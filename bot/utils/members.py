@@ -0,0 +1,55 @@
+"""
+Bounded, on-demand member cache
+
+With MEMBER_CACHE=lazy, discord.py doesn't chunk or cache guild members, so members are fetched from the API when
+they're needed and kept in a small LRU cache instead. Members in discord.py's own cache are used when available.
+"""
+
+import logging
+from collections import OrderedDict
+
+import discord
+
+from settings.constants import GUILD_ID
+
+class MemberCache():
+    def __init__(self, bot, maxsize=1000):
+        self.bot = bot
+        self.maxsize = maxsize
+        # member id: Member, most recently used last
+        self.members = OrderedDict()
+
+    def __len__(self):
+        return len(self.members)
+
+    # Return the guild member with the given ID, fetching it if it isn't cached, or None if they aren't in the guild
+    async def get(self, member_id):
+        guild = self.bot.get_guild(GUILD_ID)
+
+        member = guild.get_member(member_id)
+        if member:
+            return member
+
+        if member_id in self.members:
+            self.members.move_to_end(member_id)
+            return self.members[member_id]
+
+        try:
+            member = await guild.fetch_member(member_id)
+        except discord.NotFound:
+            return None
+
+        self.put(member)
+        return member
+
+    def put(self, member):
+        self.members[member.id] = member
+        self.members.move_to_end(member.id)
+
+        while len(self.members) > self.maxsize:
+            self.members.popitem(last=False)
+
+    # Drop a member, ie when their roles change or they leave, so they are fetched again next time
+    def discard(self, member_id):
+        if self.members.pop(member_id, None):
+            logging.debug(f"Dropped member {member_id} from member cache")
@@ -0,0 +1,196 @@
+"""
+Prometheus metrics for bot internals
+
+When METRICS_PORT is set, an HTTP endpoint is served on 127.0.0.1:METRICS_PORT/metrics in the Prometheus text format.
+Nothing is exposed beyond localhost, operators can scrape it from the host or through an SSH tunnel.
+
+Metrics are recorded as the bot runs:
+    - Command counts and latency, by command and outcome (see the Listeners cog)
+    - Watcher tick durations and failures, by watcher (see watcher())
+    - DB command latency, by collection and operation (see MongoListener, which sees every query made by mongoengine)
+
+Others are read from existing stats when the endpoint is scraped: gateway latency, event loop lag, outbox depth and
+rate limit waits, cache hits and misses and DB executor counters.
+
+Recording is cheap and always on, so the numbers are there as soon as the endpoint is enabled.
+"""
+
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from pymongo import monitoring
+
+from utils import cache
+from utils import db
+
+# Latency buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every metric which is recorded as the bot runs, in the order they're rendered
+registry = []
+
+class Counter():
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # label values: count
+        self.values = defaultdict(float)
+        # Incremented from DB threads as well as the event loop
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = sorted(self.values.items())
+
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+
+        return lines
+
+class Histogram():
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values: [count per bucket..., count, sum]
+        self.values = {}
+        # Observed from DB threads as well as the event loop
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, seconds, *label_values):
+        with self.lock:
+            value = self.values.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    value[i] += 1
+            value[-2] += 1
+            value[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            values = sorted((k, list(v)) for k, v in self.values.items())
+
+        for label_values, value in values:
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (bound,))} {value[i]}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + ('+Inf',))} {value[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {value[-2]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {value[-1]}")
+
+        return lines
+
+def _labels(names, values):
+    if not names:
+        return ""
+
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f"{name}=\"{value}\"")
+
+    return "{" + ",".join(pairs) + "}"
+
+command_latency = Histogram("superjbot_command_duration_seconds", "Time taken to run commands", ("command", "outcome"))
+watcher_latency = Histogram("superjbot_watcher_tick_duration_seconds", "Time taken by each watcher tick", ("watcher",))
+watcher_failures = Counter("superjbot_watcher_failures_total", "Watcher ticks which raised an error", ("watcher",))
+db_latency = Histogram("superjbot_db_command_duration_seconds", "Time taken by DB commands", ("collection", "operation"))
+db_failures = Counter("superjbot_db_command_failures_total", "DB commands which failed", ("collection", "operation"))
+
+# Decorator timing each tick of a tasks.loop, placed between @tasks.loop and the coroutine
+# Watchers catch and log their own errors, so they report failures with watcher_failures.inc(name)
+def watcher(name):
+    def decorator(coro):
+        @functools.wraps(coro)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await coro(*args, **kwargs)
+            except Exception:
+                watcher_failures.inc(name)
+                raise
+            finally:
+                watcher_latency.observe(time.perf_counter() - start, name)
+
+        return wrapper
+
+    return decorator
+
+# Times every command sent to MongoDB, by collection
+# Registered with pymongo before connecting, callbacks run in whichever thread made the query
+class MongoListener(monitoring.CommandListener):
+    def __init__(self):
+        # request id: collection, so the collection is known when the command finishes
+        self.collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self.collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self.collections.pop(event.request_id, "")
+        db_latency.observe(event.duration_micros / 1000000, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self.collections.pop(event.request_id, "")
+        db_latency.observe(event.duration_micros / 1000000, collection, event.command_name)
+        db_failures.inc(collection, event.command_name)
+
+# Metrics read from existing stats at scrape time
+def _gauges(bot):
+    gauges = [
+        ("superjbot_gateway_latency_seconds", "Discord gateway heartbeat latency", {(): bot.latency}),
+        ("superjbot_event_loop_lag_seconds", "Most recent event loop lag sample", {(): bot.lag_monitor.summary()["current"] / 1000}),
+        ("superjbot_outbox_depth", "Messages and topic edits waiting to be sent", {(): bot.outbox.depth()}),
+        ("superjbot_outbox_rate_limit_waits_total", "Times the outbox waited for rate limit budget", {(): bot.outbox.stats["rate_limit_waits"]}),
+        ("superjbot_outbox_rate_limit_wait_seconds_total", "Time the outbox spent waiting for rate limit budget", {(): bot.outbox.stats["rate_limit_wait_time"]}),
+        ("superjbot_outbox_failures_total", "Messages which couldn't be sent", {(): bot.outbox.stats["failed"]}),
+        ("superjbot_db_in_flight", "DB calls waiting on or running in the DB executor", {(): db.stats["in_flight"]}),
+        ("superjbot_cache_hits_total", "Cache hits by collection", {(k,): v for k, v in cache.hits.items()}),
+        ("superjbot_cache_misses_total", "Cache misses by collection", {(k,): v for k, v in cache.misses.items()}),
+    ]
+
+    lines = []
+    for name, help, values in gauges:
+        kind = "counter" if name.endswith("_total") else "gauge"
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{name}{_labels(('collection',) if label_values else (), label_values)} {value}")
+
+    return lines
+
+# Return every metric in the Prometheus text format
+def render(bot):
+    lines = _gauges(bot)
+    for metric in registry:
+        lines += metric.render()
+
+    return "\n".join(lines) + "\n"
+
+# Serve /metrics on localhost, returning the runner so that it can be cleaned up on close
+async def start_server(bot, port):
+    async def handle(request):
+        return web.Response(text=render(bot), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    logging.info(f"Serving metrics on 127.0.0.1:{port}/metrics")
+
+    return runner
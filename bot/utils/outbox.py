@@ -0,0 +1,199 @@
+"""
+Rate-limit aware outbound message queue
+
+Notifications sent by watchers and listeners are queued here instead of being sent inline, so the code that
+produces them never waits on Discord. Each channel has its own queue and worker, which:
+    - Paces sends to stay inside Discord's per-channel message budget
+    - Sends higher priority messages (ie @here spoiler alerts) ahead of bulk announcements
+    - Retries sends which fail with a 429 or a server error
+    - Coalesces topic edits, so only the most recent pending topic is applied
+
+Topic edits have a much smaller budget than messages, so they are handled by a separate worker and never hold up
+messages.
+
+Usage:
+    bot.outbox.send(channel, content="@here ...", embed=embed, priority=outbox.HIGH)
+    bot.outbox.edit_topic(channel, "Show Name")
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+import discord
+
+# Message priorities, lower values are sent first
+HIGH = 0
+NORMAL = 1
+BULK = 2
+
+# Discord's per-channel budgets as (number of requests, per seconds)
+MESSAGE_BUDGET = (5, 5)
+TOPIC_BUDGET = (2, 600)
+
+# Number of attempts made for each message before it is dropped
+MAX_ATTEMPTS = 4
+
+class Outbox():
+    def __init__(self):
+        # channel id: ChannelQueue
+        self.channels = {}
+
+        # Counters, displayed by !outbox
+        self.stats = {
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "topics_coalesced": 0,
+            "rate_limit_waits": 0,
+            "rate_limit_wait_time": 0.0
+        }
+
+    def _channel_queue(self, channel):
+        if channel.id not in self.channels:
+            self.channels[channel.id] = ChannelQueue(self, channel)
+
+        return self.channels[channel.id]
+
+    # Queue a message for the channel, returning a future which resolves to the sent message
+    # Callers don't need to await the future, failures are logged by the worker
+    def send(self, channel, content=None, embed=None, priority=NORMAL):
+        return self._channel_queue(channel).put(content, embed, priority)
+
+    # Set the topic of the channel, replacing any topic edit that hasn't been applied yet
+    def edit_topic(self, channel, topic):
+        self._channel_queue(channel).set_topic(topic)
+
+    # Total number of messages and topic edits waiting to be sent
+    def depth(self):
+        return sum(q.depth() for q in self.channels.values())
+
+    # Wait until every queue is empty, or the timeout is reached
+    async def drain(self, timeout=10):
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*[q.queue.join() for q in self.channels.values()]),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            logging.warning(f"Outbox not drained after {timeout}s, {self.depth()} items dropped")
+
+    # Return a list of lines summarising queue depths and counters
+    def summary(self):
+        lines = [f"{k.replace('_', ' ')}: {round(v, 1)}" for k, v in self.stats.items()]
+        for q in self.channels.values():
+            if q.depth():
+                lines.append(f"#{q.channel}: {q.depth()} queued")
+
+        return lines
+
+    # Record time spent waiting for rate-limit budget
+    def _record_wait(self, seconds):
+        self.stats["rate_limit_waits"] += 1
+        self.stats["rate_limit_wait_time"] += seconds
+
+class ChannelQueue():
+    def __init__(self, outbox, channel):
+        self.outbox = outbox
+        self.channel = channel
+
+        # Entries are (priority, sequence, content, embed, future), the sequence keeps messages of equal priority in order
+        self.queue = asyncio.PriorityQueue()
+        self.sequence = itertools.count()
+        self.message_times = deque()
+
+        self.pending_topic = None
+        self.topic_ready = asyncio.Event()
+        self.topic_times = deque()
+
+        self.message_worker = asyncio.ensure_future(self._send_messages())
+        self.topic_worker = asyncio.ensure_future(self._edit_topics())
+
+    def put(self, content, embed, priority):
+        future = asyncio.get_event_loop().create_future()
+        self.queue.put_nowait((priority, next(self.sequence), content, embed, future))
+
+        return future
+
+    def set_topic(self, topic):
+        if self.pending_topic is not None:
+            self.outbox.stats["topics_coalesced"] += 1
+
+        self.pending_topic = topic
+        self.topic_ready.set()
+
+    def depth(self):
+        return self.queue.qsize() + (1 if self.pending_topic is not None else 0)
+
+    # Wait until a request can be made without exceeding the budget, then record it
+    async def _wait_for_budget(self, times, budget):
+        limit, per = budget
+
+        while True:
+            now = time.monotonic()
+            while times and now - times[0] >= per:
+                times.popleft()
+
+            if len(times) < limit:
+                times.append(now)
+                return
+
+            wait = per - (now - times[0])
+            self.outbox._record_wait(wait)
+            await asyncio.sleep(wait)
+
+    async def _send_messages(self):
+        while True:
+            priority, sequence, content, embed, future = await self.queue.get()
+
+            try:
+                for attempt in range(1, MAX_ATTEMPTS + 1):
+                    await self._wait_for_budget(self.message_times, MESSAGE_BUDGET)
+
+                    try:
+                        message = await self.channel.send(content=content, embed=embed)
+                        self.outbox.stats["sent"] += 1
+                        if not future.done():
+                            future.set_result(message)
+                        break
+
+                    except discord.HTTPException as e:
+                        # Only rate limits and server errors are worth retrying
+                        if (e.status != 429 and e.status < 500) or attempt == MAX_ATTEMPTS:
+                            raise
+
+                        self.outbox.stats["retries"] += 1
+                        backoff = 2 ** attempt
+                        logging.warning(f"Send to #{self.channel} failed ({e.status}), retrying in {backoff}s")
+                        await asyncio.sleep(backoff)
+
+            except Exception as e:
+                self.outbox.stats["failed"] += 1
+                logging.error(f"Unable to send message to #{self.channel}: " + str(e))
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark the exception as retrieved, most callers don't await the future
+                    future.exception()
+
+            finally:
+                self.queue.task_done()
+
+    async def _edit_topics(self):
+        while True:
+            await self.topic_ready.wait()
+
+            # Wait for budget before taking the topic, so any edits made while waiting replace it
+            await self._wait_for_budget(self.topic_times, TOPIC_BUDGET)
+
+            topic = self.pending_topic
+            self.pending_topic = None
+            self.topic_ready.clear()
+
+            try:
+                await self.channel.edit(topic=topic)
+                logging.debug(f"Topic of #{self.channel} set to {topic}")
+
+            except Exception as e:
+                logging.error(f"Unable to set topic of #{self.channel}: " + str(e))
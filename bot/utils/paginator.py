@@ -0,0 +1,185 @@
+"""
+Paginated, reaction driven result views
+
+Instead of sending one message per result, a Paginator sends a single message holding one page of results and edits it
+as the command's author reacts with the previous/next emojis. The view stops responding after a timeout.
+
+Pages are fetched lazily from a page source, which only ever holds the current page:
+    - KeysetSource pages through a DB query using keyset pagination on an indexed sort field, so any page costs a
+      single indexed read no matter how deep it is
+    - ListSource pages through an in-memory list of keys (ie ranked search results), loading the items on each page
+      only when that page is displayed
+
+Usage:
+    source = KeysetSource(ScheduleShow, "time", page_size=5)
+    await Paginator(ctx, source, lambda page: embeds.schedule_shows_embed(page.items, len(page.items))).start()
+"""
+
+import asyncio
+import inspect
+from collections import namedtuple
+
+import discord
+from mongoengine import Q
+
+from utils import cache
+from settings.constants import CACHE_TTL, PAGINATOR_TIMEOUT
+
+PREVIOUS = "\N{BLACK LEFT-POINTING TRIANGLE}"
+NEXT = "\N{BLACK RIGHT-POINTING TRIANGLE}"
+
+# A page of items, the keys to fetch the pages either side of it and whether there are more items beyond it
+# more is in the direction the page was fetched in
+Page = namedtuple("Page", ["items", "first", "last", "more", "number"])
+
+class Paginator():
+    def __init__(self, ctx, source, render, timeout=PAGINATOR_TIMEOUT):
+        self.ctx = ctx
+        self.source = source
+        # Takes a Page and returns the embed to display, or a coroutine returning it if more has to be loaded
+        self.render = render
+        self.timeout = timeout
+
+    # Send the first page and handle navigation until the view times out
+    # Returns the sent message, or None if there were no results
+    async def start(self):
+        page = await self.source.page(number=1)
+        if not page.items:
+            return None
+
+        has_previous = False
+        has_next = page.more
+
+        message = await self.ctx.send(embed=await self._render(page))
+
+        # Single page results don't need navigating
+        if not has_next:
+            return message
+
+        for emoji in (PREVIOUS, NEXT):
+            await message.add_reaction(emoji)
+
+        def check(reaction, user):
+            return (reaction.message.id == message.id and user == self.ctx.author
+                    and str(reaction.emoji) in (PREVIOUS, NEXT))
+
+        while True:
+            try:
+                reaction, user = await self.ctx.bot.wait_for("reaction_add", timeout=self.timeout, check=check)
+            except asyncio.TimeoutError:
+                break
+
+            emoji = str(reaction.emoji)
+            new_page = None
+            if emoji == NEXT and has_next:
+                new_page = await self.source.page(after=page.last, number=page.number + 1)
+                if new_page.items:
+                    has_previous, has_next = True, new_page.more
+            elif emoji == PREVIOUS and has_previous:
+                new_page = await self.source.page(before=page.first, number=page.number - 1)
+                if new_page.items:
+                    has_previous, has_next = new_page.more, True
+
+            # Pages can come back empty if the data has changed since the view was opened
+            if new_page and new_page.items:
+                page = new_page
+                await message.edit(embed=await self._render(page))
+
+            # Removing the user's reaction lets them press it again, but needs the manage messages permission
+            try:
+                await message.remove_reaction(reaction.emoji, user)
+            except discord.HTTPException:
+                pass
+
+        try:
+            await message.clear_reactions()
+        except discord.HTTPException:
+            pass
+
+        return message
+
+    async def _render(self, page):
+        embed = self.render(page)
+        return await embed if inspect.isawaitable(embed) else embed
+
+class KeysetSource():
+    # filters are passed to document.objects(), only limits the fields fetched, limit caps the items across all pages
+    # sort_field should be indexed, it is combined with the document id to break ties
+    def __init__(self, document, sort_field, page_size, descending=False, filters=None, only=None, limit=None):
+        self.document = document
+        self.sort_field = sort_field
+        self.page_size = page_size
+        self.descending = descending
+        self.filters = filters or {}
+        self.only = only
+        self.limit = limit
+
+    async def page(self, after=None, before=None, number=1):
+        key = (self.document._get_collection_name(), "page", self.sort_field, self.descending,
+               tuple(sorted(self.filters.items())), self.only, self.page_size, after, before)
+        items = await cache.get(key, lambda: self._fetch(after, before), CACHE_TTL)
+
+        # One more item than needed is fetched to tell if there are more pages
+        more = len(items) > self.page_size
+        items = items[:self.page_size]
+        if before:
+            items.reverse()
+
+        # Every page before this one is full, so the page number gives how many items come before it
+        if self.limit is not None and not before:
+            remaining = self.limit - (number - 1) * self.page_size
+            more = more and remaining > self.page_size
+            items = items[:max(0, remaining)]
+
+        if not items:
+            return Page([], None, None, False, number)
+
+        return Page(items, self._key(items[0]), self._key(items[-1]), more, number)
+
+    def _key(self, item):
+        return (getattr(item, self.sort_field), item.id)
+
+    # Runs in the DB executor. Items fetched with before are returned in reverse order
+    def _fetch(self, after, before):
+        field = self.sort_field
+
+        # Paging backwards flips the direction of both the comparison and the sort
+        forwards = before is None
+        ascending = forwards != self.descending
+        cursor = after if forwards else before
+        op = "gt" if ascending else "lt"
+        order = "" if ascending else "-"
+
+        queryset = self.document.objects(**self.filters)
+        if cursor:
+            queryset = queryset.filter(
+                Q(**{f"{field}__{op}": cursor[0]}) | Q(**{field: cursor[0], f"id__{op}": cursor[1]})
+            )
+        if self.only:
+            queryset = queryset.only(*self.only)
+
+        return list(queryset.order_by(order + field, order + "id").limit(self.page_size + 1))
+
+class ListSource():
+    # keys is a list held in memory, ie names from a search, load is a coroutine function taking a list of keys and
+    # returning the items to display
+    def __init__(self, keys, load, page_size):
+        self.keys = keys
+        self.load = load
+        self.page_size = page_size
+
+    async def page(self, after=None, before=None, number=1):
+        if before is not None:
+            start = max(0, before - self.page_size)
+            end = before
+            more = start > 0
+        else:
+            start = after + 1 if after is not None else 0
+            end = start + self.page_size
+            more = end < len(self.keys)
+
+        keys = self.keys[start:end]
+        if not keys:
+            return Page([], None, None, False, number)
+
+        return Page(await self.load(keys), start, start + len(keys) - 1, more, number)
@@ -0,0 +1,249 @@
+"""
+In-memory search indexes over wrestler profile names and podcast episodes
+
+Profile searches used an unanchored, case-insensitive regex which has to scan the whole collection. Instead, names
+are folded (lower case, accents removed) and indexed by n-gram in memory, so a search only looks at names that share
+n-grams with the query and never touches the DB.
+
+Results are ranked: exact match, then prefix, then start of a word, then anywhere in the name, then matches on the
+wrestler's unit, then near misses within a small edit distance (so "okda" still finds "Kazuchika Okada").
+
+The index is rebuilt by the Profiles cog whenever the profile collection changes.
+
+Podcast episodes are searched by word through an inverted index over their titles and descriptions, ranked with BM25
+(rare words and title words count for most). The index holds everything displayed in the results, so a search never
+touches the DB. It is rebuilt by the Podcast cog whenever the podcast_episode collection changes.
+"""
+
+import bisect
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+
+# Scores for each type of match, higher is better
+EXACT = 100
+PREFIX = 90
+WORD_PREFIX = 80
+SUBSTRING = 70
+UNIT = 50
+FUZZY = 40
+
+# Everything needed to answer a search, swapped in as a whole when the index is rebuilt
+IndexData = namedtuple("IndexData", ["names", "folded", "units", "tokens", "trigrams", "bigrams"])
+
+# BM25 term frequency saturation and length normalisation, the usual defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# A word in an episode's title counts as this many words in its description
+TITLE_WEIGHT = 3
+
+# Query words with no exact match are matched to words they are the start of ("wrestle" finds "wrestlekingdom"),
+# up to this many, scoring this fraction of an exact match
+MAX_PREFIX_TERMS = 20
+PREFIX_WEIGHT = 0.5
+
+# episodes is a list of {"title", "link", "published"} in index order (newest first), postings is word: {episode: count}
+EpisodeData = namedtuple("EpisodeData", ["episodes", "lengths", "average_length", "postings", "vocabulary"])
+
+# Lower case, strip accents and punctuation, and collapse whitespace, ie "Los Ingobernables de Japón" -> "los ingobernables de japon"
+def fold(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+# Edit distance allowing for transpositions, giving up once it is known to exceed max_distance
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+
+    return previous[-1]
+
+# Number of typos tolerated for a query word of the given length
+def max_typos(length):
+    if length < 4:
+        return 0
+    return 1 if length < 8 else 2
+
+class ProfileIndex():
+    def __init__(self, max_results=5):
+        self.max_results = max_results
+        self.data = IndexData([], [], [], [], {}, {})
+        self.generation = None
+
+    def __len__(self):
+        return len(self.data.names)
+
+    # Build a new index from a list of (name, unit) pairs and swap it in
+    # Safe to run in a thread, as searches always see either the old or the new data
+    def build(self, entries, generation=None):
+        names, folded, units, tokens = [], [], [], []
+        trigrams = defaultdict(set)
+        bigrams = defaultdict(set)
+
+        for i, (name, unit) in enumerate(entries):
+            names.append(name)
+            folded.append(fold(name))
+            units.append(fold(unit))
+            tokens.append(folded[i].split())
+
+            for gram in ngrams(folded[i], 3) | ngrams(units[i], 3):
+                trigrams[gram].add(i)
+            for token in tokens[i]:
+                for gram in ngrams(token, 2):
+                    bigrams[gram].add(i)
+
+        self.data = IndexData(names, folded, units, tokens, dict(trigrams), dict(bigrams))
+        self.generation = generation
+
+    # Return up to limit names matching the query, best match first
+    def search(self, query, limit=None):
+        data = self.data
+        limit = limit or self.max_results
+        query = fold(query)
+        if not query:
+            return []
+
+        scores = {}
+
+        # Substring matches, candidates are the names/units containing every trigram of the query
+        grams = sorted(ngrams(query, 3), key=lambda g: len(data.trigrams.get(g, ())))
+        if grams:
+            candidates = set(data.trigrams.get(grams[0], ()))
+            for gram in grams[1:]:
+                candidates &= data.trigrams.get(gram, set())
+                if not candidates:
+                    break
+        else:
+            candidates = range(len(data.names))
+
+        for i in candidates:
+            name = data.folded[i]
+            if name == query:
+                scores[i] = EXACT
+            elif name.startswith(query):
+                scores[i] = PREFIX
+            elif (" " + query) in (" " + name):
+                scores[i] = WORD_PREFIX
+            elif query in name:
+                scores[i] = SUBSTRING
+            elif query in data.units[i]:
+                scores[i] = UNIT
+
+        # Near misses, only looked for when there aren't enough better matches
+        if len(scores) < limit:
+            for i, distance in self._fuzzy(data, query):
+                if i not in scores:
+                    scores[i] = FUZZY - distance
+
+        ranked = sorted(scores, key=lambda i: (-scores[i], len(data.names[i]), data.names[i]))
+        return [data.names[i] for i in ranked[:limit]]
+
+    # Yield (index, total distance) for names where every word of the query is within a few typos of a word in the name
+    def _fuzzy(self, data, query):
+        words = query.split()
+        if not all(max_typos(len(w)) for w in words):
+            return
+
+        # Each typo can break at most 2 bigrams, so a candidate must share enough of the first word's bigrams
+        first = words[0]
+        grams = ngrams(first, 2)
+        needed = max(1, len(grams) - 2 * max_typos(len(first)))
+
+        counts = defaultdict(int)
+        for gram in grams:
+            for i in data.bigrams.get(gram, ()):
+                counts[i] += 1
+
+        for i, count in counts.items():
+            if count < needed:
+                continue
+
+            total = 0
+            for word in words:
+                allowed = max_typos(len(word))
+                best = min((edit_distance(word, token, allowed) for token in data.tokens[i]), default=allowed + 1)
+                if best > allowed:
+                    break
+                total += best
+            else:
+                yield i, total
+
+class EpisodeIndex():
+    def __init__(self, max_results=25):
+        self.max_results = max_results
+        self.data = EpisodeData([], [], 0, {}, [])
+        self.generation = None
+
+    def __len__(self):
+        return len(self.data.episodes)
+
+    # Build a new index from a list of episodes, dicts with title, description, link and published, newest first
+    # Safe to run in a thread, as searches always see either the old or the new data
+    def build(self, entries, generation=None):
+        episodes, lengths = [], []
+        postings = defaultdict(dict)
+
+        for i, entry in enumerate(entries):
+            episodes.append({"title": entry["title"], "link": entry["link"], "published": entry["published"]})
+
+            counts = Counter(fold(entry["description"]).split())
+            for word in fold(entry["title"]).split():
+                counts[word] += TITLE_WEIGHT
+
+            lengths.append(sum(counts.values()))
+            for word, count in counts.items():
+                postings[word][i] = count
+
+        average_length = sum(lengths) / len(lengths) if lengths else 0
+        self.data = EpisodeData(episodes, lengths, average_length, dict(postings), sorted(postings))
+        self.generation = generation
+
+    # Return up to limit episodes matching any word of the query, best match first, newest first for equal scores
+    def search(self, query, limit=None):
+        data = self.data
+        limit = limit or self.max_results
+
+        scores = defaultdict(float)
+        for word in set(fold(query).split()):
+            for term, weight in self._terms(data, word):
+                matches = data.postings[term]
+                idf = math.log(1 + (len(data.episodes) - len(matches) + 0.5) / (len(matches) + 0.5))
+
+                for i, count in matches.items():
+                    length = BM25_B * data.lengths[i] / data.average_length
+                    scores[i] += weight * idf * count * (BM25_K1 + 1) / (count + BM25_K1 * (1 - BM25_B + length))
+
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))
+        return [data.episodes[i] for i in ranked[:limit]]
+
+    # Return [(word in the index, weight)] for a query word, the word itself if indexed, otherwise words it starts
+    def _terms(self, data, word):
+        if word in data.postings:
+            return [(word, 1.0)]
+
+        terms = []
+        for term in data.vocabulary[bisect.bisect_left(data.vocabulary, word):]:
+            if not term.startswith(word) or len(terms) >= MAX_PREFIX_TERMS:
+                break
+            terms.append((term, PREFIX_WEIGHT))
+
+        return terms
@@ -0,0 +1,53 @@
+"""
+Request coalescing for identical concurrent lookups
+
+When several identical lookups are in flight at once (ie many users sending !nextshow as a show starts), only the
+first one is executed. The others wait on it and share its result, or its exception.
+
+Keys follow the same shape as the cache, a tuple whose first item names the lookup, ie ("nextshows", 3).
+
+Usage:
+    embed = await singleflight.do(("nextshows", 3), lambda: build_next_shows_embed(3))
+"""
+
+import asyncio
+from collections import Counter
+
+# key: task of the lookup currently running for that key
+in_flight = {}
+
+# Counters per lookup name, displayed by !cachestats
+executions = Counter()
+coalesced = Counter()
+
+# Run the coroutine returned by coro_func, unless an identical lookup is already running, in which case wait for that one
+async def do(key, coro_func):
+    name = key[0]
+
+    task = in_flight.get(key)
+    if task:
+        coalesced[name] += 1
+    else:
+        executions[name] += 1
+        task = asyncio.ensure_future(coro_func())
+        in_flight[key] = task
+        task.add_done_callback(lambda t: _done(key, t))
+
+    # Shield the shared task so that one waiter being cancelled doesn't cancel it for the others
+    return await asyncio.shield(task)
+
+# Remove a finished lookup so the next request for the key runs again
+def _done(key, task):
+    in_flight.pop(key, None)
+
+    # Retrieve the exception so asyncio doesn't warn about it if every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+# Return a list of lines summarising executions and coalesced requests per lookup
+def summary():
+    lines = []
+    for name in sorted(executions):
+        lines.append(f"{name}: {executions[name]} executed, {coalesced[name]} coalesced")
+
+    return lines
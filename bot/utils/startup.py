@@ -0,0 +1,130 @@
+"""
+Bot subclass with a one-time startup pipeline
+
+on_ready runs again after every gateway reconnect, so work that should only happen once is done before login instead:
+    - Extensions (cogs) are loaded once, before connecting
+    - Caches and in-memory state are warmed concurrently, through each cog's optional warm_up coroutine
+    - Background loops wait for the first on_ready before their first iteration (see wait_until_started), as they
+      need the channel attributes set there
+
+Each phase is timed and logged, along with the time from process start to ready.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from discord.ext.commands import Bot
+
+import utils.tasks
+from utils import cache
+from utils import metrics
+from settings.constants import MEMBER_CACHE, METRICS_PORT
+
+class SuperJBot(Bot):
+    def __init__(self, *args, start_time=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Time the process started, used to log the total time taken to be ready
+        self.start_time = start_time or time.perf_counter()
+        # Duration in seconds of each startup phase, in the order they ran
+        self.startup_phases = {}
+        # Set once the first on_ready has finished
+        self.started = asyncio.Event()
+        # Runner for the metrics endpoint, if it is enabled
+        self.metrics_runner = None
+
+    # Record how long the body of the with statement takes as a startup phase
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_phases[name] = time.perf_counter() - start
+            logging.info(f"Startup phase {name} took {self.startup_phases[name]:.2f}s")
+
+    # Run the setup hook before logging in, it isn't called again on reconnect
+    async def start(self, *args, **kwargs):
+        await self.setup_hook()
+        await super().start(*args, **kwargs)
+
+    async def setup_hook(self):
+        self.lag_monitor.start()
+
+        if METRICS_PORT:
+            self.metrics_runner = await metrics.start_server(self, METRICS_PORT)
+
+        # Load all of the cogs in the cogs/ folder
+        # Background loops started by cogs wait for startup to finish before using any channels
+        with self.phase("extensions"):
+            for filename in sorted(os.listdir("./bot/cogs")):
+                if filename.endswith(".py") and filename != "__init__.py":
+                    self.load_extension(f"cogs.{filename[:-3]}")
+
+                    logging.info(f"Loaded Cog: {filename[:-3]}")
+
+        # Collection versions are read first, so that in-memory indexes are built against them and aren't rebuilt
+        # as soon as the first version poll runs
+        with self.phase("collection_versions"):
+            try:
+                await cache.poll_versions()
+            except Exception as e:
+                logging.error("Unable to read collection versions during startup: " + str(e))
+
+        with self.phase("warm_up"):
+            await self.warm_up()
+
+    # Run each cog's warm_up coroutine concurrently, failures are logged and left for the cog's loops to retry
+    async def warm_up(self):
+        cogs = [cog for cog in self.cogs.values() if hasattr(cog, "warm_up")]
+        results = await asyncio.gather(*[self.timed_warm_up(cog) for cog in cogs], return_exceptions=True)
+
+        for cog, result in zip(cogs, results):
+            if isinstance(result, Exception):
+                logging.error(f"Unable to warm up {cog.qualified_name}: " + str(result))
+
+    async def timed_warm_up(self, cog):
+        start = time.perf_counter()
+        await cog.warm_up()
+        logging.info(f"Warmed up {cog.qualified_name} in {time.perf_counter() - start:.2f}s")
+
+    # Run when the bot succesfully logs into Discord, and again after each reconnect
+    async def on_ready(self):
+        if self.started.is_set():
+            logging.info("Reconnected to Discord")
+            return
+
+        # For each guild that the bot is logged into, prints user, guild name and ID
+        for i in self.guilds:
+            logging.info(f"Logged in as \'{self.user}\' in \'{i.name}\' (Guild ID: {i.id})")
+
+        # Store guild, channel and user IDs in bot attributes
+        with self.phase("set_ids"):
+            logging.info("Creating bot attributes from IDs")
+            utils.tasks.set_ids(self)
+            if not self.owner:
+                await utils.tasks.fetch_owner(self)
+
+        # Log startup time and memory use, ie to compare member cache modes
+        logging.info(f"Ready in {time.perf_counter() - self.start_time:.2f}s "
+                     f"({', '.join(f'{k}: {v:.2f}s' for k, v in self.startup_phases.items())}), "
+                     f"member cache: {MEMBER_CACHE}, {sum(len(g.members) for g in self.guilds)} members cached, "
+                     f"RSS: {utils.tasks.memory_usage():.1f}MB")
+
+        self.started.set()
+        logging.info("Finished logging in")
+
+    # Used as the before_loop of background loops
+    async def wait_until_started(self):
+        await self.started.wait()
+
+    # Send queued notifications while still connected, then unload extensions and disconnect
+    async def close(self):
+        await self.outbox.drain()
+        await super().close()
+
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
@@ -5,6 +5,7 @@ Includes tasks which are run once, ie at login, or on demand rather than on loop
 """
 
 import logging
+import resource
 
 from settings.constants import (
     OWNER_ID, GUILD_ID, GENERAL_CHANNEL, NON_NJPW_CHANNEL, 
@@ -47,9 +48,31 @@ def set_ids(bot):
     logging.info(
         f"aew_channel: {bot.aew_channel.name}, id: {bot.aew_channel.id}, category: {bot.aew_channel.category}")
 
+    # The owner won't be in the user cache if members aren't cached, in which case fetch_owner is needed
     logging.info("Setting Owner ID")
     bot.owner = bot.get_user(OWNER_ID)
-    logging.info(f"owner: {bot.owner.name}, display_name: {bot.owner.display_name}, id: {bot.owner.id}")
+    if bot.owner:
+        logging.info(f"owner: {bot.owner.name}, display_name: {bot.owner.display_name}, id: {bot.owner.id}")
+    else:
+        logging.info("Owner not in user cache")
 
     logging.info("Setting Guild ID")
-    bot.guild = bot.get_guild(GUILD_ID)
\ No newline at end of file
+    bot.guild = bot.get_guild(GUILD_ID)
+
+# Fetch the owner from the API, for when they aren't in the user cache
+async def fetch_owner(bot):
+    bot.owner = await bot.fetch_user(OWNER_ID)
+    logging.info(f"owner: {bot.owner.name}, display_name: {bot.owner.display_name}, id: {bot.owner.id} (fetched)")
+
+# Return the resident memory of the process in MB
+# Uses /proc where available, otherwise falls back to the peak resident memory
+def memory_usage():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -7,206 +7,484 @@ import asyncio
 import datetime
 import logging
 import os
-from mongoengine import connect, errors
+import signal
+import time
+from mongoengine import Q, connect, errors
 
+import appearances
+import ledger
+import logs
+from leases import LEASE_SECONDS, Leases
+from pipeline import Pipeline, summary as pipeline_summary
+from pool import ParsePool
 from scraper import Scraper
-from database.models import (NonNJPWShow, PodcastEpisode, PodcastInfo, Profile,
-                             ResultShow, ScheduleShow)
+from database.models import (CollectionVersion, MatchResult, NonNJPWShow, PodcastEpisode, PodcastInfo, Profile,
+                             ProfileBio, ResultShow, ScheduleShow)
 
 # Configure Logging
 
-# Create handlers
-c_handler = logging.StreamHandler()
-f_handler = logging.FileHandler('scraper.log')
-c_handler.setLevel(logging.INFO)
-f_handler.setLevel(logging.DEBUG)
-
-# Create formatters and add it to handlers
-c_format = logging.Formatter('%(asctime)s:%(name)s:%(levelname)s# %(message)s', datefmt='%d.%m.%y-%H:%M:%S')
-f_format = logging.Formatter('%(asctime)s:%(name)s:%(levelname)s# %(message)s', datefmt='%d.%m.%y-%H:%M:%S')
-c_handler.setFormatter(c_format)
-f_handler.setFormatter(f_format)
-
-# Add handlers to the logger
-# Level also set here as logs weren't being output without it
-logging.basicConfig(
-    level=logging.DEBUG,
-    handlers=[c_handler, f_handler]
-    )
+# Records are written by a background thread, so logging never blocks the event loop
+# Chatty loggers are rate limited, as (records, per seconds)
+logs.setup('scraper.log', rate_limits={
+    # Several lines for every show parsed
+    "scraper.shows": (100, 60)
+})
+
+# Errors logged during a job's run are also recorded in the scrape run ledger
+logging.getLogger().addHandler(ledger.ErrorCollector())
 
 # Establish connection to the mongodb cluster
 # http://docs.mongoengine.org/apireference.html?highlight=connect#mongoengine.connect
 connect(host=os.environ['DBURL'])
 
-# Instantiate the Scraper
-scraper = Scraper()
+# Instantiate the Scraper, parsing pages in a pool of worker processes
+scraper = Scraper(ParsePool())
+
+# Jobs are shared with any other scraper workers, each run only by the worker holding its lease
+leases = Leases()
+
+# Seconds between attempts to take a job's lease held by another worker
+LEASE_RETRY = int(os.environ.get("LEASE_RETRY", LEASE_SECONDS // 5))
+
+# Days after a show its card is scraped for match results each run, rather than only once
+RESULTS_RECHECK_DAYS = int(os.environ.get("RESULTS_RECHECK_DAYS", 2))
+
+# Most show cards scraped for match results each run
+RESULTS_PER_RUN = int(os.environ.get("RESULTS_PER_RUN", 20))
+
+# Hours before a card which failed to scrape, or had no matches, is tried again, doubling with each failure in a row
+# up to RESULTS_RETRY_MAX_DAYS
+RESULTS_RETRY_HOURS = int(os.environ.get("RESULTS_RETRY_HOURS", 2))
+RESULTS_RETRY_MAX_DAYS = int(os.environ.get("RESULTS_RETRY_MAX_DAYS", 7))
+
+# Days ahead the cards of scheduled shows are scraped for the appearances index
+CARD_LOOKAHEAD_DAYS = int(os.environ.get("CARD_LOOKAHEAD_DAYS", 7))
+
+# Show fields needed to store match results and appearances
+CARD_SHOW_FIELDS = ("name", "date", "time", "city", "venue", "card")
+
+# Run a scraper method in a thread, so that fetching and parsing don't hold up the other update loops
+# The thread records into the same ledger run as the calling job
+async def scrape(func, *args):
+    return await asyncio.get_event_loop().run_in_executor(None, ledger.in_context(func), *args)
 
 # Store general podcast data from the Podcast's RedCircle Page
 # Info pulled: title, description, img_url, url
 async def update_pod_info():
-    while True:
-        try:
-            # Scrape the podcast information
-            pod_info = scraper.pod_info()
+    try:
+        # Scrape the podcast information
+        pod_info = await scrape(scraper.pod_info)
 
-            # Attempt to update the existing podcast information with the scraped data            
-            update = PodcastInfo.objects(title=pod_info['title']).update(**pod_info, full_result=True)
-            
-            # If any changes are actually made, timestamp and log
-            if update.modified_count > 0:
-                PodcastInfo.objects(title=pod_info['title']).update(updated_at=datetime.datetime.now)
-                logging.info("Podcast info updated")
-        
-        # Catch exceptions during the scraper and DB update
-        except Exception as e:
-            logging.error("Unable to update pod info: " + str(e))
+        # Attempt to update the existing podcast information with the scraped data            
+        update = PodcastInfo.objects(title=pod_info['title']).update(**pod_info, full_result=True)
+
+        # If any changes are actually made, timestamp and log
+        if update.modified_count > 0:
+            PodcastInfo.objects(title=pod_info['title']).update(updated_at=datetime.datetime.now)
+            CollectionVersion.bump("podcast_info")
+            ledger.counted(seen=1, modified=1)
+            logging.info("Podcast info updated")
+        else:
+            ledger.counted(seen=1, skipped=1)
 
-        # Sleep for one day
-        await asyncio.sleep(86400)
+    # Catch exceptions during the scraper and DB update
+    except Exception as e:
+        logging.error("Unable to update pod info: " + str(e))
 
 # Store data related to the latest podcast episode
 # Info pulled: title, description, link, published, duration, file
 async def update_pod_episode():
-    while True:
+    try:
+        # Scrape the last pod episode from the RSS feed
+        last_pod = await scrape(scraper.pod_episode)
+
+        # Check if the latest episode is already in the DB
+        if PodcastEpisode.objects(link=last_pod['link']):
+
+            # If the episode already exists, update to reflect any changes to the data
+            update = PodcastEpisode.objects(link=last_pod['link']).update(**last_pod, full_result=True)
+
+            # If any changes are actually made, timestamp and log
+            if update.modified_count > 0:
+                PodcastEpisode.objects(name=last_pod['name'], date=last_pod['date']).update(updated_at=datetime.datetime.now)
+                CollectionVersion.bump("podcast_episode")
+                ledger.counted(seen=1, modified=1)
+                logging.info(f"Podcast Episode Updated: {last_pod['name']}")
+            else:
+                ledger.counted(seen=1, skipped=1)
+
+        else:
+            # If episode is not already in DB, add it
+            episode = PodcastEpisode(**last_pod).save()
+            CollectionVersion.bump("podcast_episode")
+            ledger.counted(seen=1, inserted=1)
+            logging.info(f"New Podcast Episode Added: {episode.title}")
+
+    # Catch exceptions during the scraper and DB update
+    except Exception as e:
+        logging.error("Unable to update pod episode: " + str(e))
+
+# Store scheduled shows, returning whether any were added or changed
+# Data pulled per show: name, city, venue, thumbnail url, date (in local time)
+async def write_schedule_shows(schedule_shows):
+    logging.debug(f"schedule_shows: {schedule_shows}")
+
+    # Track whether the collection was written to, so the bot's cache is only invalidated when needed
+    schedule_changed = False
+
+    for s in schedule_shows:
         try:
-            # Scrape the last pod episode from the RSS feed
-            last_pod = scraper.pod_episode()
+            logging.debug(f"schedule_show: {s}")
+
+            # For each show in the scraped date, check if it already exists in the DB
+            if ScheduleShow.objects(name=s['name'], date=s['date']):
 
-            # Check if the latest episode is already in the DB
-            if PodcastEpisode.objects(link=last_pod['link']):
-                
                 # If the episode already exists, update to reflect any changes to the data
-                update = PodcastEpisode.objects(link=last_pod['link']).update(**last_pod, full_result=True)
-                
+                update = ScheduleShow.objects(name=s['name'], date=s['date']).update(**s, full_result=True)
+
                 # If any changes are actually made, timestamp and log
                 if update.modified_count > 0:
-                    PodcastEpisode.objects(name=last_pod['name'], date=last_pod['date']).update(updated_at=datetime.datetime.now)
-                    logging.info(f"Podcast Episode Updated: {last_pod['name']}")
-            
+                    ScheduleShow.objects(name=s['name'], date=s['date']).update(updated_at=datetime.datetime.now)
+                    schedule_changed = True
+                    ledger.counted(seen=1, modified=1)
+                    logging.info(f"Show updated: {s['name']} ({str(s['date'])})")
+                else:
+                    ledger.counted(seen=1, skipped=1)
+
             else:
                 # If episode is not already in DB, add it
-                episode = PodcastEpisode(**last_pod).save()
-                logging.info(f"New Podcast Episode Added: {episode.title}")
+                show = ScheduleShow(**s).save()
+                schedule_changed = True
+                ledger.counted(seen=1, inserted=1)
+                logging.info(f"New scheduled show added: {show.name} ({str(show.date)})")
 
-        # Catch exceptions during the scraper and DB update
         except Exception as e:
-            logging.error("Unable to update pod episode: " + str(e))
-        
-        # Sleep for one minute
-        await asyncio.sleep(60)
+            logging.error(f"Error adding {s['name']} ({str(s['date'])}) to DB: " + str(e))
 
-# Store data related to the currently scheduled shows
-# Data pulled per show: name, city, venue, thumbnail url, date (in local time)
-async def update_shows():
-    while True:
-        # Scrape the shows listed on njpw1972.com/schedule
-        schedule_shows = scraper.shows("schedule")
+    return schedule_changed
 
-        logging.debug(f"schedule_shows: {schedule_shows}")
+# Find ScheduleShow objects that are now in the past and remove them, returning whether any were
+async def prune_schedule_shows():
+    schedule_changed = False
 
-        for s in schedule_shows:
-            try:
-                logging.debug(f"schedule_show: {s}")
-                
-                # For each show in the scraped date, check if it already exists in the DB
-                if ScheduleShow.objects(name=s['name'], date=s['date']):
-
-                    # If the episode already exists, update to reflect any changes to the data
-                    update = ScheduleShow.objects(name=s['name'], date=s['date']).update(**s, full_result=True)
-                    
-                    # If any changes are actually made, timestamp and log
-                    if update.modified_count > 0:
-                        ScheduleShow.objects(name=s['name'], date=s['date']).update(updated_at=datetime.datetime.now)
-                        logging.info(f"Show updated: {s['name']} ({str(s['date'])})")
-                
+    old_shows = ScheduleShow.objects(time__lte=datetime.datetime.now)
+    for s in old_shows:
+        logging.info(f"Removing past show from schedule_show collection: {s.name} ({str(s['date'])})")
+        s.delete()
+        schedule_changed = True
+        ledger.counted(modified=1)
+
+    return schedule_changed
+
+# Remove appearances on scheduled shows which have started, returning whether any were removed
+async def prune_scheduled_appearances():
+    removed = appearances.prune_scheduled()
+    ledger.counted(modified=removed)
+
+    return removed > 0
+
+# Store result shows, returning whether any were added or changed
+async def write_result_shows(result_shows):
+    result_changed = False
+
+    for s in result_shows:
+        try:
+            # For each show in the scraped date, check if it already exists in the DB
+            if ResultShow.objects(name=s['name'], date=s['date']):
+
+                # If the episode already exists, update to reflect any changes to the data
+                update = ResultShow.objects(name=s['name'], date=s['date']).update(**s, full_result=True)
+
+                # If any changes are actually made, timestamp and log
+                if update.modified_count > 0:
+                    # The card is scraped for match results again, in case they've changed too
+                    ResultShow.objects(name=s['name'], date=s['date']).update(updated_at=datetime.datetime.now,
+                                                                             unset__results_fetched_at=True,
+                                                                             set__results_failures=0,
+                                                                             unset__results_retry_at=True)
+                    result_changed = True
+                    ledger.counted(seen=1, modified=1)
+                    logging.info(f"Show updated: {s['name']}")
                 else:
-                    # If episode is not already in DB, add it
-                    show = ScheduleShow(**s).save()
-                    logging.info(f"New scheduled show added: {show.name} ({str(show.date)})")
-                
-            except Exception as e:
-                logging.error(f"Error adding {s['name']} ({str(s['date'])}) to DB: " + str(e))
-
-        # Find ScheduleShow objects that are now in the past and remove them
-        old_shows = ScheduleShow.objects(time__lte=datetime.datetime.now)
-        for s in old_shows:
-            logging.info(f"Removing past show from schedule_show collection: {s.name} ({str(s['date'])})")
-            s.delete()
-
-        # Scrape the shows listed on njpw1972.com/result
-        result_shows = scraper.shows("result")
-        
-        for s in result_shows:
+                    ledger.counted(seen=1, skipped=1)
+
+            else:
+                # If episode is not already in DB, add it
+                show = ResultShow(**s).save()
+                result_changed = True
+                ledger.counted(seen=1, inserted=1)
+                logging.info(f"New result show added: {show.name} ({str(show.date)})")
+
+        except Exception as e:
+            logging.error(f"Error adding {s['name']} ({str(s['date'])}) to DB: " + str(e))
+
+    return result_changed
+
+# Result shows whose cards are due to be scraped for match results: those never scraped or changed since, newest first,
+# plus shows from the last RESULTS_RECHECK_DAYS as results are often filled in after the show
+# Limited to RESULTS_PER_RUN, so the archive is backfilled a few shows at a time and a normal run only fetches a handful
+# Cards which failed or had no matches last time are left out until their retry time, so they can't fill every run
+def due_result_shows():
+    now = datetime.datetime.now()
+    recent = now - datetime.timedelta(days=RESULTS_RECHECK_DAYS)
+    due = Q(results_fetched_at=None) | Q(time__gte=recent)
+    not_backing_off = Q(results_retry_at=None) | Q(results_retry_at__lte=now)
+    return list(ResultShow.objects(due & not_backing_off, card__ne=None)
+                .only(*CARD_SHOW_FIELDS, "results_failures").order_by("-time").limit(RESULTS_PER_RUN))
+
+# Record a failed or empty scrape of a show's card, so it isn't tried again until its backoff has passed
+def results_failed(show):
+    failures = (show.results_failures or 0) + 1
+    delay = min(datetime.timedelta(hours=RESULTS_RETRY_HOURS * 2 ** min(failures - 1, 16)),
+                datetime.timedelta(days=RESULTS_RETRY_MAX_DAYS))
+    show.update(set__results_failures=failures, set__results_retry_at=datetime.datetime.now() + delay)
+    logging.info(f"No match results for {show.name} ({str(show.date)}), {failures} failures in a row, "
+                 f"retrying in {delay}")
+
+# Scheduled shows in the next CARD_LOOKAHEAD_DAYS, whose cards are scraped each run for the appearances index
+# Cards are usually only announced in the days before a show, and can change up until it starts
+def due_schedule_shows():
+    now = datetime.datetime.now()
+    soon = now + datetime.timedelta(days=CARD_LOOKAHEAD_DAYS)
+    return list(ScheduleShow.objects(time__gte=now, time__lte=soon, card__ne=None)
+                .only(*CARD_SHOW_FIELDS).order_by("time").limit(RESULTS_PER_RUN))
+
+# Scrape the cards of the given shows, returning (shows, {card: [match dicts]})
+async def fetch_cards(shows):
+    if not shows:
+        return shows, {}
+
+    return shows, await scrape(scraper.results, [s.card for s in shows])
+
+# Store match results for each show scraped, replacing any already stored, returning whether any changed
+async def write_match_results(fetched):
+    shows, results = fetched
+    results_changed = False
+
+    for show in shows:
+        # Cards which couldn't be scraped, or had no matches, are left due, to be tried again once they've backed off
+        matches = results.get(show.card)
+        if not matches:
             try:
-                # For each show in the scraped date, check if it already exists in the DB
-                if ResultShow.objects(name=s['name'], date=s['date']):
-
-                    # If the episode already exists, update to reflect any changes to the data
-                    update = ResultShow.objects(name=s['name'], date=s['date']).update(**s, full_result=True)
-                    
-                    # If any changes are actually made, timestamp and log
-                    if update.modified_count > 0:
-                        ResultShow.objects(name=s['name'], date=s['date']).update(updated_at=datetime.datetime.now)
-                        logging.info(f"Show updated: {s['name']}")
-                
-                else:
-                    # If episode is not already in DB, add it
-                    show = ResultShow(**s).save()
-                    logging.info(f"New result show added: {show.name} ({str(show.date)})")
-                
+                results_failed(show)
             except Exception as e:
-                logging.error(f"Error adding {s['name']} ({str(s['date'])}) to DB: " + str(e))
+                logging.error(f"Error recording failed results for {show.name} ({str(show.date)}) to DB: " + str(e))
+            continue
+
+        try:
+            stored = MatchResult.objects(card=show.card).exclude("id", "card", "show", "date", "updated_at").as_pymongo()
+            stored = [_match_fields(m) for m in stored]
+            if stored != [_match_fields(m) for m in matches]:
+                MatchResult.objects(card=show.card).delete()
+                if matches:
+                    MatchResult.objects.insert([MatchResult(card=show.card, show=show.name, date=show.date, **m)
+                                                for m in matches])
+                results_changed = True
+                if stored:
+                    ledger.counted(seen=1, modified=1)
+                else:
+                    ledger.counted(seen=1, inserted=1)
+                logging.info(f"Match results updated: {show.name} ({str(show.date)}), {len(matches)} matches")
+            else:
+                ledger.counted(seen=1, skipped=1)
+
+            show.update(set__results_fetched_at=datetime.datetime.now(), set__results_failures=0,
+                        unset__results_retry_at=True)
+
+        except Exception as e:
+            logging.error(f"Error adding match results for {show.name} ({str(show.date)}) to DB: " + str(e))
+
+    return results_changed
+
+# Mark scheduled shows which are live on njpwworld.com, returning how many were
+async def match_broadcasts(times):
+    updated = await scrape(scraper.broadcasts, times)
+    ledger.counted(modified=updated)
+
+    return updated
+
+# Fields of a match which are compared to tell if it has changed, empty fields aren't stored so they're left out
+def _match_fields(match):
+    return {k: v for k, v in match.items() if v not in (None, "", [])}
+
+# Replace the appearances index entries for each card scraped, returning whether any changed
+async def write_appearances(fetched, scheduled):
+    shows, results = fetched
+    if not shows:
+        return False
+
+    roster = appearances.roster()
+    appearances_changed = False
+
+    for show in shows:
+        matches = results.get(show.card)
+        if matches is None:
+            continue
+
+        try:
+            if appearances.replace(show, matches, roster, scheduled):
+                appearances_changed = True
+        except Exception as e:
+            logging.error(f"Error adding appearances for {show.name} ({str(show.date)}) to DB: " + str(e))
+
+    return appearances_changed
+
+# Update the scheduled and result shows from njpw1972.com, and mark shows which are live on njpwworld.com
+# The three pages are fetched concurrently, each write starts as soon as its fetch is done, and broadcasts are matched
+# as soon as the schedule is written, so new shows get their live flag in the same cycle
+# Match results are scraped once result shows are written, so new shows get their results in the same cycle too
+# The appearances index is updated from the result cards, and from the cards of shows coming up in the next few days,
+# and appearances on scheduled shows are dropped once they've started
+async def update_shows():
+    start = time.perf_counter()
+
+    pipeline = (Pipeline("shows")
+        .stage("fetch_schedule", lambda: scrape(scraper.shows, "schedule"))
+        .stage("fetch_results", lambda: scrape(scraper.shows, "result"))
+        .stage("fetch_broadcasts", lambda: scrape(scraper.broadcast_times))
+        .stage("write_schedule", write_schedule_shows, ["fetch_schedule"])
+        .stage("prune_schedule", lambda written: prune_schedule_shows(), ["write_schedule"])
+        .stage("prune_index", prune_scheduled_appearances)
+        .stage("write_results", write_result_shows, ["fetch_results"])
+        .stage("match_broadcasts", lambda written, times: match_broadcasts(times),
+               ["write_schedule", "fetch_broadcasts"])
+        .stage("fetch_matches", lambda written: fetch_cards(due_result_shows()), ["write_results"])
+        .stage("write_matches", write_match_results, ["fetch_matches"])
+        .stage("index_results", lambda fetched: write_appearances(fetched, False), ["fetch_matches"])
+        .stage("fetch_cards", lambda written: fetch_cards(due_schedule_shows()), ["write_schedule"])
+        .stage("index_schedule", lambda fetched: write_appearances(fetched, True), ["fetch_cards"]))
+    results = await pipeline.run()
 
-        # Update shows which are live on njpwworld.com
-        scraper.broadcasts()
+    # Failed and skipped stages have no result, so only completed writes count as changes
+    schedule_changed = any(results[name].result for name in ("write_schedule", "prune_schedule", "match_broadcasts"))
+    result_changed = bool(results["write_results"].result)
+    matches_changed = bool(results["write_matches"].result)
+    appearances_changed = any(results[name].result for name in ("index_results", "index_schedule", "prune_index"))
 
-        # Sleep for one hour
-        await asyncio.sleep(3600)
+    try:
+        if schedule_changed:
+            CollectionVersion.bump("schedule_show")
+        if result_changed:
+            CollectionVersion.bump("result_show")
+        if matches_changed:
+            CollectionVersion.bump("match_result")
+        if appearances_changed:
+            CollectionVersion.bump("appearance")
+    except Exception as e:
+        logging.error("Unable to update collection versions: " + str(e))
+
+    run = ledger.current()
+    if run:
+        run.document.stages = {name: round(result.seconds, 3) for name, result in results.items()}
+
+    logging.info(pipeline_summary("shows", results, time.perf_counter() - start))
 
 # Store data related to the latest podcast episode
 # Info pulled: title, description, link, published, duration, file
 async def update_profiles():
+    # Scrape the profiles listed on njpw1972.com/profiles
+    profiles = await scrape(scraper.profiles)
+    profiles_changed = False
+
+    for p in profiles:
+        try:
+            # Bios are stored in their own collection, so they're only loaded when displayed
+            bio = p.pop("bio", None)
+            if bio is not None:
+                update = ProfileBio.objects(name=p["name"]).update_one(set__bio=bio, upsert=True, full_result=True)
+                if update.modified_count > 0 or update.upserted_id:
+                    ProfileBio.objects(name=p["name"]).update_one(set__updated_at=datetime.datetime.now())
+                    logging.info(f"Profile bio updated: {p['name']}")
+
+            # For each profile in the scraped data, check if it already exists in the DB
+            if Profile.objects(name=p["name"]):
+
+                # If the profile already exists, update to reflect any changes to the data
+                # Any bio left over from before bios were moved to their own collection is removed
+                update = Profile.objects(name=p["name"]).update(**p, unset__bio=True, full_result=True)
+
+                # If any changes are actually made, timestamp and log
+                if update.modified_count > 0:
+                    Profile.objects(name=p["name"]).update(updated_at=datetime.datetime.now, full_result=True)
+                    profiles_changed = True
+                    ledger.counted(seen=1, modified=1)
+                    logging.info(f"Profile updated: {p['name']}")
+                else:
+                    ledger.counted(seen=1, skipped=1)
+            else:
+                # If profile is not already in DB, add it
+                profile = Profile(**p).save()
+                profiles_changed = True
+                ledger.counted(seen=1, inserted=1)
+                logging.info(f"New profile added: {profile.name}")
+
+        except Exception as e:
+            logging.error(f"Error adding updating profile {p['name']}: " + str(e))
+
+    # Mark removed profiles as such - they will be deleted by the bot after notifying @here
+    for p in Profile.objects.all():
+        if not [x for x in profiles if x['name'] == p.name]:
+            p.update(removed=True)
+            profiles_changed = True
+            ledger.counted(modified=1)
+            logging.info(f"Profile no longer exists: {p.name}")
+
+    if profiles_changed:
+        CollectionVersion.bump("profile")
+
+# Run a job every interval seconds, while this worker holds its lease
+# Workers without the lease check back every LEASE_RETRY seconds, so a job is picked up soon after its owner dies
+async def run_job(job, func, interval):
     while True:
-            # Scrape the profiles listed on njpw1972.com/profiles
-            profiles = scraper.profiles()
-
-            for p in profiles:
-                try:
-                    # For each profile in the scraped data, check if it already exists in the DB
-                    if Profile.objects(name=p["name"]):
-
-                        # If the profile already exists, update to reflect any changes to the data
-                        update = Profile.objects(name=p["name"]).update(**p, full_result=True)
-                        
-                        # If any changes are actually made, timestamp and log
-                        if update.modified_count > 0:
-                            Profile.objects(name=p["name"]).update(updated_at=datetime.datetime.now, full_result=True)
-                            logging.info(f"Profile updated: {p['name']}")
-                    else:
-                        # If profile is not already in DB, add it
-                        profile = Profile(**p).save()
-                        logging.info(f"New profile added: {profile.name}")
-               
-                except Exception as e:
-                    logging.error(f"Error adding updating profile {p.name}: " + str(e))
-                
-            # Mark removed profiles as such - they will be deleted by the bot after notifying @here
-            for p in Profile.objects.all():
-                if not [x for x in profiles if x['name'] == p.name]:
-                    p.update(removed=True)
-                    logging.info(f"Profile no longer exists: {p.name}")
-
-            # Sleep for 45 minutes
-            await asyncio.sleep(2700)
-
-# Add the scraper functions to the main event loop
+        try:
+            held = leases.acquire(job)
+        except Exception as e:
+            logging.error(f"Unable to acquire lease on {job}: " + str(e))
+            held = False
+
+        if not held:
+            await asyncio.sleep(LEASE_RETRY)
+            continue
+
+        # Everything fetched, parsed, written or logged as an error during the run is recorded in the ledger
+        run = ledger.Run(job, leases.owner)
+        token = ledger.current_run.set(run)
+        try:
+            await func()
+        except Exception as e:
+            logging.error(f"Error encountered while running {job}: " + str(e))
+        finally:
+            ledger.current_run.reset(token)
+
+        try:
+            run.save()
+        except Exception as e:
+            logging.error(f"Unable to record {job} run in the ledger: " + str(e))
+
+        await asyncio.sleep(interval)
+
+# Add the scraper jobs to the main event loop, as (job, function, interval in seconds)
 async def main():
+    # docker stop sends SIGTERM, which would otherwise end the process without giving up its leases
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    leases.start()
     await asyncio.gather(
-        update_pod_info(),
-        update_pod_episode(),
-        update_shows(),
-        update_profiles()
+        # Once a day
+        run_job("pod_info", update_pod_info, 86400),
+        # Once a minute
+        run_job("pod_episode", update_pod_episode, 60),
+        # Once an hour, including njpwworld broadcasts
+        run_job("shows", update_shows, 3600),
+        # Every 45 minutes
+        run_job("profiles", update_profiles, 2700)
     )
 
-# Run the main event loop
-asyncio.run(main())
+# Run the main event loop, until it is stopped by SIGTERM
+# Leases are given up on the way out, so another worker can take over straight away
+try:
+    asyncio.run(main())
+except asyncio.CancelledError:
+    logging.info("Stopping scraper")
+finally:
+    leases.release_all()
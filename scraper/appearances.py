@@ -0,0 +1,72 @@
+"""
+Appearances index, from each wrestler on the roster to the shows they're on
+
+Names on show cards are matched to Profile names after folding both (lower case, accents and punctuation removed), so
+"Hiromu Takahashi" on a card finds the "Hiromu Takahashi" profile however either is written. Names which don't match a
+profile (ie visiting wrestlers) are left out.
+
+Appearances are replaced per card whenever a card is scraped, so the index is built up incrementally as cards are.
+Appearances on scheduled shows are removed once the show has started, as they'd otherwise stay upcoming until the same
+card happened to be scraped again as a result.
+"""
+import datetime
+import logging
+import re
+import unicodedata
+
+from database.models import Appearance, Profile
+
+# Lower case, strip accents and punctuation, and collapse whitespace, as the bot's search does
+def fold(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+# Return {folded name: profile name} for the current roster
+def roster():
+    return {fold(p.name): p.name for p in Profile.objects(removed__ne=True).only("name")}
+
+# Build the appearances on a show's card from its parsed matches, one per wrestler on the roster
+def from_card(show, matches, roster, scheduled):
+    appearances = {}
+
+    for match in matches:
+        for participant in match["participants"]:
+            wrestler = roster.get(fold(participant))
+            if not wrestler or wrestler in appearances:
+                continue
+
+            result = None
+            if participant in match["winners"]:
+                result = "won"
+            elif participant in match["losers"]:
+                result = "lost"
+
+            appearances[wrestler] = Appearance(wrestler=wrestler, card=show.card, show=show.name, date=show.date,
+                                               time=show.time, city=show.city, venue=show.venue,
+                                               scheduled=scheduled, result=result)
+
+    return list(appearances.values())
+
+# Replace the appearances stored for a show's card, returning whether they changed
+def replace(show, matches, roster, scheduled):
+    appearances = from_card(show, matches, roster, scheduled)
+
+    stored = {(a.wrestler, a.time, a.scheduled, a.result) for a in Appearance.objects(card=show.card)}
+    if stored == {(a.wrestler, a.time, a.scheduled, a.result) for a in appearances}:
+        return False
+
+    Appearance.objects(card=show.card).delete()
+    if appearances:
+        Appearance.objects.insert(appearances)
+
+    logging.info(f"Appearances updated: {show.name} ({str(show.date)}), {len(appearances)} wrestlers")
+    return True
+
+# Delete the appearances on scheduled shows which have started, returning how many were deleted
+def prune_scheduled():
+    removed = Appearance.objects(scheduled=True, time__lte=datetime.datetime.now()).delete()
+    if removed:
+        logging.info(f"Removed {removed} appearances on past scheduled shows")
+
+    return removed
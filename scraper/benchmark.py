@@ -0,0 +1,276 @@
+"""
+Offline benchmark for the scraper's parsers
+
+Runs each parser in parsers.py against a corpus of recorded pages, and for each parser reports throughput, latency
+percentiles and peak memory. Output is checked against golden files, and timings and memory against a stored baseline,
+so layout changes and regressions are found before they reach production.
+
+Files are kept in scraper/benchmarks/:
+    corpus/<page type>/<name>     Recorded pages, as fetched
+    golden/<parser>/<name>.json   Expected output of the parser for each page
+    baseline.json                 Timings and memory from the last run saved as the baseline
+
+The committed corpus is a few small, anonymised pages of each type, built from the layouts documented in parsers.py,
+so the golden output is checked without fetching anything. --record adds the live pages, replacing committed pages of
+the same name. The baseline isn't committed, as timings depend on the machine, so save one before comparing against it.
+
+Usage (from the repo root):
+    python scraper/benchmark.py --record            Fetch the live pages into the corpus
+    python scraper/benchmark.py --update-golden     Save the current parser output as the golden files, after checking it
+    python scraper/benchmark.py                     Run the benchmark, failing on wrong output or a regression
+    python scraper/benchmark.py --save-baseline     Run the benchmark and store the results as the new baseline
+
+Exits with 1 if any output doesn't match its golden file, or any parser is slower or uses more memory than the
+baseline by more than the tolerance.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import parsers
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+CORPUS_DIR = os.path.join(BENCHMARK_DIR, "corpus")
+GOLDEN_DIR = os.path.join(BENCHMARK_DIR, "golden")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+POD_INFO_URL = "https://redcircle.com/shows/super-j-cast/"
+
+# parser name: (parser, type of page in the corpus it runs against)
+PARSERS = {
+    "pod_info": (lambda content: parsers.pod_info(content, POD_INFO_URL), "pod_info"),
+    "pod_episode": (parsers.pod_episode, "feed"),
+    "all_episodes": (parsers.all_episodes, "feed"),
+    "shows": (parsers.shows, "shows"),
+    "broadcast_times": (parsers.broadcast_times, "njpwworld"),
+    "profile_list": (parsers.profile_list, "profiles"),
+    "profile_detail": (parsers.profile_detail, "profile"),
+    "match_results": (parsers.match_results, "card"),
+}
+
+# Fetch the live pages into the corpus
+def record(profile_pages, card_pages):
+    from scraper import Scraper
+    scraper = Scraper()
+
+    pages = [
+        ("pod_info", "redcircle.html", scraper.pod_info_url, None),
+        ("feed", "redcircle.xml", scraper.pod_rss_feed, None),
+        ("njpwworld", "schedule.html", scraper.njpw_world_schedule_url, scraper.njpw_world_headers),
+        ("profiles", "profiles.html", scraper.njpw_profiles_url, None),
+    ]
+    for type in ("schedule", "result"):
+        for i, url in enumerate(scraper.show_urls(type), 1):
+            pages.append(("shows", f"{type}-{i}.html", url, None))
+
+    for page_type, name, url, headers in pages:
+        _write_page(page_type, name, scraper.fetch(url, headers=headers))
+
+    # Individual profile pages are linked from the profile list
+    with open(os.path.join(CORPUS_DIR, "profiles", "profiles.html"), "rb") as f:
+        profiles = parsers.profile_list(f.read())
+
+    for profile in profiles[:profile_pages]:
+        name = profile["link"].rstrip("/").rsplit("/", 1)[-1] + ".html"
+        _write_page("profile", name, scraper.fetch(profile["link"]))
+
+    # Show cards are linked from the first page of results
+    with open(os.path.join(CORPUS_DIR, "shows", "result-1.html"), "rb") as f:
+        shows = parsers.shows(f.read())
+
+    for show in shows[:card_pages]:
+        name = show["card"].rstrip("/").rsplit("/", 1)[-1] + ".html"
+        _write_page("card", name, scraper.fetch(show["card"]))
+
+def _write_page(page_type, name, content):
+    os.makedirs(os.path.join(CORPUS_DIR, page_type), exist_ok=True)
+    with open(os.path.join(CORPUS_DIR, page_type, name), "wb") as f:
+        f.write(content)
+
+    print(f"Recorded {page_type}/{name} ({len(content) / 1024:.0f}KB)")
+
+# Return [(name, content)] for each recorded page of the given type
+def load_corpus(page_type):
+    directory = os.path.join(CORPUS_DIR, page_type)
+    if not os.path.isdir(directory):
+        return []
+
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as f:
+            pages.append((name, f.read()))
+
+    return pages
+
+# Parser output as it is stored in golden files, with dates and times as ISO strings
+def normalise(records):
+    def encode(value):
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        raise TypeError(f"Can't store {type(value)} in golden files")
+
+    return json.loads(json.dumps(records, default=encode, sort_keys=True))
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+# Time the parser over each page repeat times, and measure its peak memory over one run of each page
+def measure(parser, pages, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for name, content in pages:
+            start = time.perf_counter()
+            parser(content)
+            latencies.append(time.perf_counter() - start)
+
+    # tracemalloc slows parsing down, so memory is measured separately from timings
+    peak = 0
+    for name, content in pages:
+        tracemalloc.start()
+        parser(content)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    latencies.sort()
+    total_bytes = sum(len(content) for name, content in pages) * repeat
+    return {
+        "pages": len(pages),
+        "pages_per_s": len(latencies) / sum(latencies),
+        "mb_per_s": total_bytes / sum(latencies) / 1024 / 1024,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+# Compare each page's output with its golden file, returning a list of problems
+# With update, the golden files are replaced with the current output instead
+def check_golden(parser_name, parser, pages, update):
+    problems = []
+
+    for name, content in pages:
+        path = os.path.join(GOLDEN_DIR, parser_name, os.path.splitext(name)[0] + ".json")
+        output = normalise(parser(content))
+
+        if update:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(output, f, indent=2, sort_keys=True, ensure_ascii=False)
+            continue
+
+        if not os.path.exists(path):
+            problems.append(f"{parser_name}/{name}: no golden output, run with --update-golden once the output is checked")
+            continue
+
+        with open(path) as f:
+            golden = json.load(f)
+
+        if output != golden:
+            problems.append(f"{parser_name}/{name}: output differs from golden, {describe_difference(golden, output)}")
+
+    return problems
+
+# Describe the first difference between two normalised outputs
+def describe_difference(expected, actual, path="output"):
+    if type(expected) != type(actual):
+        return f"{path} is {type(actual).__name__}, expected {type(expected).__name__}"
+
+    if isinstance(expected, dict):
+        for key in sorted(set(expected) | set(actual)):
+            if key not in actual:
+                return f"{path}[{key!r}] is missing"
+            if key not in expected:
+                return f"{path}[{key!r}] is unexpected"
+            if expected[key] != actual[key]:
+                return describe_difference(expected[key], actual[key], f"{path}[{key!r}]")
+
+    if isinstance(expected, list):
+        if len(expected) != len(actual):
+            return f"{path} has {len(actual)} items, expected {len(expected)}"
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            if e != a:
+                return describe_difference(e, a, f"{path}[{i}]")
+
+    return f"{path} is {actual!r}, expected {expected!r}"
+
+# Compare results with the baseline, returning a list of regressions
+def check_baseline(results, tolerance):
+    if not os.path.exists(BASELINE_FILE):
+        return []
+
+    with open(BASELINE_FILE) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for parser_name, result in results.items():
+        base = baseline.get(parser_name)
+        if not base:
+            continue
+
+        for metric in ("p50_ms", "p99_ms", "peak_kb"):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{parser_name}: {metric} {result[metric]:.2f}, baseline {base[metric]:.2f} "
+                                   f"(+{(result[metric] / base[metric] - 1) * 100:.0f}%)")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper's parsers against recorded pages")
+    parser.add_argument("--record", action="store_true", help="fetch the live pages into the corpus and exit")
+    parser.add_argument("--profile-pages", type=int, default=20, help="number of profile pages recorded (default 20)")
+    parser.add_argument("--card-pages", type=int, default=10, help="number of show card pages recorded (default 10)")
+    parser.add_argument("--update-golden", action="store_true", help="store the current output as the golden output")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=10, help="times each page is parsed (default 10)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown or memory growth over the baseline, as a fraction (default 0.25)")
+    parser.add_argument("--only", nargs="*", choices=PARSERS, help="parsers to run (default all)")
+    args = parser.parse_args()
+
+    # Parsers log every show, which would swamp the report and slow them down
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.record:
+        record(args.profile_pages, args.card_pages)
+        return 0
+
+    results = {}
+    problems = []
+
+    print(f"{'parser':<16}{'pages':>6}{'pages/s':>10}{'MB/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak KB':>10}")
+    for parser_name in args.only or PARSERS:
+        func, page_type = PARSERS[parser_name]
+        pages = load_corpus(page_type)
+        if not pages:
+            problems.append(f"{parser_name}: no recorded {page_type} pages, run with --record")
+            continue
+
+        problems += check_golden(parser_name, func, pages, args.update_golden)
+
+        result = measure(func, pages, args.repeat)
+        results[parser_name] = result
+        print(f"{parser_name:<16}{result['pages']:>6}{result['pages_per_s']:>10.1f}{result['mb_per_s']:>8.2f}"
+              f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['peak_kb']:>10.0f}")
+
+    regressions = check_baseline(results, args.tolerance)
+
+    if args.save_baseline:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {BASELINE_FILE}")
+
+    for line in problems + regressions:
+        print("FAIL " + line)
+
+    return 1 if problems or (regressions and not args.save_baseline) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@ http://docs.mongoengine.org/apireference.html?highlight=connect#documents
 from mongoengine import (
     Document, DynamicDocument, EmbeddedDocument, DynamicEmbeddedDocument, 
     StringField, DateField, DateTimeField, BooleanField, URLField, ListField,
-    EmbeddedDocumentField, DictField, IntField
+    EmbeddedDocumentField, DictField, IntField, FloatField
 )
 import os
 import datetime
@@ -60,7 +60,7 @@ class ScheduleShow(Document):
     source_tz = StringField()
 
     meta = {
-        "indexes": ["name", "time"],
+        "indexes": ["name", "date", "time"],
         "ordering": ["time"]
     }
 
@@ -87,9 +87,54 @@ class ResultShow(Document):
     updated_at = DateTimeField()
     added_at = DateTimeField(default=datetime.datetime.now)
     source_tz = StringField()
+    # When the card was last scraped for match results, unset until it has been and whenever the show changes
+    results_fetched_at = DateTimeField()
+    # Consecutive failed or empty scrapes of the card, and when it's next tried, so a failing card backs off
+    results_failures = IntField(default=0)
+    results_retry_at = DateTimeField()
+
+    meta = {
+        "indexes": ["name", "time", "results_fetched_at"],
+        "ordering": ["-time"]
+    }
+
+# Results of each match on a show's card, as scraped from ResultShow.card
+# Stored in their own collection, keyed by card, so they're only loaded when displayed
+class MatchResult(Document):
+    card = URLField(required=True, unique_with="number")
+    number = IntField(required=True)
+    show = StringField()
+    date = DateField()
+    title = StringField()
+    winners = ListField(StringField())
+    losers = ListField(StringField())
+    participants = ListField(StringField())
+    result = StringField()
+    duration = StringField()
+    finish = StringField()
+    updated_at = DateTimeField(default=datetime.datetime.now)
+
+    meta = {
+        "ordering": ["number"]
+    }
+
+# Inverted index from each wrestler on the Profile roster to the shows they're on, one document per wrestler per card
+# Built by the scraper from the show cards it scrapes, so a wrestler's appearances are a single indexed read
+# result is won, lost or unset (upcoming shows, draws and matches without a result)
+class Appearance(Document):
+    wrestler = StringField(required=True, unique_with="card")
+    card = URLField(required=True)
+    show = StringField()
+    date = DateField()
+    time = DateTimeField()
+    city = StringField()
+    venue = StringField()
+    scheduled = BooleanField(default=False)
+    result = StringField()
+    updated_at = DateTimeField(default=datetime.datetime.now)
 
     meta = {
-        "indexes": ["name"],
+        "indexes": ["card", ("wrestler", "-time")],
         "ordering": ["-time"]
     }
 
@@ -107,10 +152,69 @@ class Profile(DynamicDocument):
         "indexes": ["name"]
     }
 
+# Bios are several KB each, so are stored apart from profiles and only loaded for the profile being displayed
+class ProfileBio(Document):
+    name = StringField(required=True, unique=True)
+    bio = StringField()
+    updated_at = DateTimeField()
+
 class KennyAlarm(DynamicDocument):
     last_mention_time = DateTimeField()
     last_mention_user = StringField()
     last_mention_message = StringField()
     last_mention_link = StringField()
     record_days = IntField()
-    trigger_terms = ListField()
\ No newline at end of file
+    trigger_terms = ListField()
+
+# Incremented by the scraper whenever it writes to a collection, so the bot knows when to drop cached data
+class CollectionVersion(Document):
+    name = StringField(required=True, unique=True)
+    version = IntField(default=0)
+    updated_at = DateTimeField()
+
+    @classmethod
+    def bump(cls, *names):
+        for name in names:
+            cls.objects(name=name).update_one(
+                inc__version=1,
+                set__updated_at=datetime.datetime.now(),
+                upsert=True
+            )
+
+# Leases on the scraper's jobs, so only one worker runs each job at a time
+# Times are UTC, as workers may be on different machines
+class JobLease(Document):
+    job = StringField(required=True, unique=True)
+    owner = StringField()
+    expires_at = DateTimeField()
+    acquired_at = DateTimeField()
+    renewed_at = DateTimeField()
+
+# Ledger of scraper job runs, with what each fetched, parsed and wrote, and any errors
+# A capped collection, so the oldest runs drop off on their own. Times are UTC, as workers may be on different machines
+class ScrapeRun(Document):
+    job = StringField(required=True)
+    worker = StringField()
+    started_at = DateTimeField()
+    ended_at = DateTimeField()
+    seconds = FloatField()
+    ok = BooleanField()
+    requests = IntField(default=0)
+    bytes_fetched = IntField(default=0)
+    # HTTP status code (as a string): number of responses
+    statuses = DictField()
+    parse_seconds = FloatField(default=0)
+    # Stage name: seconds, for jobs run as a pipeline
+    stages = DictField()
+    seen = IntField(default=0)
+    inserted = IntField(default=0)
+    modified = IntField(default=0)
+    skipped = IntField(default=0)
+    errors = ListField(StringField())
+
+    meta = {
+        "max_documents": 20000,
+        "max_size": 16 * 1024 * 1024,
+        "indexes": [("job", "-started_at")],
+        "ordering": ["-started_at"]
+    }
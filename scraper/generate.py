@@ -0,0 +1,223 @@
+"""
+Synthetic dataset generator for capacity testing
+
+Fills the collections in database/models.py with realistic looking data at a configurable scale, ie tens of thousands
+of profiles with bios and years of results, so that queries, watchers and scraper upserts can be measured against far
+more data than staging holds.
+
+Output is deterministic: the same seed, scale and base date always produce the same documents. Documents are built
+with the models (so defaults and field names match what the scraper writes) and written with unordered bulk inserts.
+
+Usage (from the repo root), never against production:
+    python scraper/generate.py --db mongodb://localhost/superjbot_capacity --drop
+    python scraper/generate.py --db mongodb://localhost/superjbot_capacity --drop --profiles 50000 --years 20 --seed 7
+"""
+import argparse
+import datetime
+import logging
+import random
+import time
+
+from mongoengine import connect
+
+from database.models import (CollectionVersion, KennyAlarm, PodcastEpisode, PodcastInfo, Profile, ProfileBio,
+                             ResultShow, ScheduleShow, SpoilerMode)
+
+FIRST_NAMES = ["Kazuchika", "Tetsuya", "Hiroshi", "Shingo", "Hiromu", "Will", "Zack", "Jay", "Kota", "Taichi", "Yota",
+               "Tomohiro", "Toru", "Hirooki", "Yoshi", "Sanada", "Evil", "Yujiro", "Tama", "Master", "El", "Taiji",
+               "Ryusuke", "Yoh", "Sho", "Gabe", "Ren", "Yuya", "Shota", "Kosei", "Tiger", "Minoru", "Jeff", "Chase"]
+LAST_NAMES = ["Okada", "Naito", "Tanahashi", "Takagi", "Takahashi", "Ospreay", "Sabre Jr.", "White", "Ibushi", "Tsuji",
+              "Ishii", "Yano", "Goto", "Hashi", "Uemura", "Narita", "Umino", "Fujita", "Desperado", "Phantasmo",
+              "Ishimori", "Taguchi", "Suzuki", "Kidd", "Owens", "Cobb", "Finlay", "Henare", "Tonga", "Loa", "Robinson"]
+UNITS = ["CHAOS", "Los Ingobernables de Japon", "Suzuki-gun", "BULLET CLUB", "United Empire", "Just 5 Guys",
+         "HOUSE OF TORTURE", "TMDK", "Strong Style", "Main Unit"]
+CITIES = [("Tokyo", "Korakuen Hall"), ("Tokyo", "Ryogoku Sumo Hall"), ("Tokyo", "Tokyo Dome"), ("Osaka", "Osaka-jo Hall"),
+          ("Osaka", "Edion Arena"), ("Nagoya", "Aichi Prefectural Gym"), ("Sapporo", "Hokkai Kitayell"),
+          ("Fukuoka", "Fukuoka Kokusai Center"), ("Sendai", "Xebio Arena"), ("Los Angeles", "Walter Pyramid")]
+TOURS = ["Road to", "New Beginning in", "Wrestling Dontaku", "Best of the Super Juniors", "Dominion", "G1 Climax",
+         "Destruction in", "Power Struggle", "World Tag League", "Wrestle Kingdom", "Strong Style Evolved", "Lion's Break"]
+FINISHERS = ["Rainmaker", "Destino", "High Fly Flow", "Last of the Dragon", "Time Bomb", "Storm Breaker", "Zack Driver",
+             "Blade Runner", "Kamigoye", "Shining Triad", "Wind Breaker", "Rolling Elbow"]
+WORDS = ("debut match dojo excursion tour title champion heavyweight junior tag team victory defeat rivalry return "
+         "injury comeback tournament final main event dome arena crowd signature style veteran rookie stable leader "
+         "international world intercontinental never openweight united kingdom mexico america japan legend").split()
+
+# Write documents in batches of this size, to keep memory use flat at large scales
+BATCH_SIZE = 1000
+
+# Bulk insert documents built by a generator, returning the number written
+def insert(document, documents, batch_size):
+    collection = document._get_collection()
+
+    count = 0
+    batch = []
+    for doc in documents:
+        batch.append(doc.to_mongo())
+        if len(batch) >= batch_size:
+            count += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+
+    if batch:
+        count += len(collection.insert_many(batch, ordered=False).inserted_ids)
+
+    return count
+
+def sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+def bio(rng):
+    paragraphs = [" ".join(sentence(rng) for _ in range(rng.randint(4, 8))) for _ in range(rng.randint(2, 5))]
+    return "\n\n".join(paragraphs)
+
+# Unique wrestler names, numbered once the name combinations run out
+def profile_names(rng, count):
+    names = set()
+    while len(names) < count:
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        if name in names:
+            name = f"{name} {rng.randint(2, count)}"
+        names.add(name)
+
+    return sorted(names)
+
+def profiles(rng, names, base):
+    for i, name in enumerate(names):
+        slug = name.lower().replace(" ", "-").replace(".", "")
+        yield Profile(
+            name=name,
+            link=f"https://www.njpw1972.com/profile/{slug}/",
+            render=f"https://www.njpw1972.com/wp-content/uploads/profile/{slug}.png",
+            new=False,
+            updated_at=base,
+            added_at=base - datetime.timedelta(days=rng.randint(0, 3650)),
+            attributes={
+                "height": f"{rng.randint(165, 200)}cm",
+                "weight": f"{rng.randint(70, 140)}kg",
+                "birthday": f"{rng.randint(1970, 2002)}.{rng.randint(1, 12)}.{rng.randint(1, 28)}",
+                "birthplace": rng.choice(CITIES)[0],
+                "debut": f"{rng.randint(1990, 2021)}.{rng.randint(1, 12)}.{rng.randint(1, 28)}",
+                "finisher": rng.choice(FINISHERS),
+                "unit": rng.choice(UNITS),
+                "twitter": f"https://twitter.com/{slug.replace('-', '_')}",
+            }
+        )
+
+def bios(rng, names, base):
+    for name in names:
+        yield ProfileBio(name=name, bio=bio(rng), updated_at=base)
+
+# Shows from start, going forwards (schedule) or backwards (results) from base, with a few shows each week
+def shows(rng, document, base, count, step):
+    day = 0
+    for i in range(count):
+        day += rng.randint(1, 4)
+        time = base + datetime.timedelta(days=day * step, hours=rng.choice([18, 18, 18, 19, 17]), minutes=rng.choice([0, 30]))
+        city, venue = rng.choice(CITIES)
+        tour = rng.choice(TOURS)
+        fields = dict(
+            name=f"{tour} {city} {time.year} #{i}",
+            time=time,
+            date=time.date(),
+            city=city,
+            venue=venue,
+            thumb="https://www.njpw1972.com/wp-content/themes/njpw-en/images/common/noimage_poster.jpg",
+            card=f"https://www.njpw1972.com/tornament/{i}",
+            source_tz="utc",
+            updated_at=base,
+            added_at=base,
+        )
+        if document is ScheduleShow:
+            fields["new"] = False
+            fields["live_show"] = rng.random() < 0.3
+
+        yield document(**fields)
+
+def episodes(rng, base, count):
+    for i in range(count):
+        published = (base - datetime.timedelta(days=3 * i)).date()
+        yield PodcastEpisode(
+            title=f"Super J-Cast Episode {count - i}: {sentence(rng)[:60]}",
+            description=" ".join(sentence(rng) for _ in range(3)),
+            link=f"https://redcircle.com/shows/super-j-cast/episodes/{count - i}",
+            published=published,
+            duration=f"0{rng.randint(0, 2)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+            file=f"https://stream.redcircle.com/episodes/{count - i}/stream.mp3",
+            new=False,
+            added=base,
+        )
+
+# Spoiler modes ending at staggered times over the day after base, so they're all active for the whole of the base date
+# base is midnight, so ending within 24 hours of it would leave most of them ended by the time of day the data is used
+def spoiler_modes(rng, base, count):
+    for i in range(count):
+        yield SpoilerMode(
+            mode=rng.choice(["njpw", "non-njpw"]),
+            title=f"{rng.choice(TOURS)} Spoiler {i}",
+            ends_at=base + datetime.timedelta(days=1, minutes=rng.randint(60, 24 * 60)),
+            added_at=base,
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a DB with deterministic synthetic data for capacity testing")
+    parser.add_argument("--db", required=True, help="MongoDB URL to write to, never the production DB")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    parser.add_argument("--base-date", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="date the data is generated around, as YYYY-MM-DD (default today). "
+                             "Set it for identical output on different days")
+    parser.add_argument("--profiles", type=int, default=10000, help="number of profiles, each with a bio (default 10000)")
+    parser.add_argument("--years", type=int, default=10, help="years of results (default 10)")
+    parser.add_argument("--schedule", type=int, default=200, help="number of upcoming shows (default 200)")
+    parser.add_argument("--episodes", type=int, default=2000, help="number of podcast episodes (default 2000)")
+    parser.add_argument("--spoilers", type=int, default=50, help="number of spoiler modes, active until the day after the base date (default 50)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"documents per bulk insert (default {BATCH_SIZE})")
+    parser.add_argument("--drop", action="store_true", help="drop the generated collections first")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s:%(levelname)s# %(message)s")
+    connect(host=args.db)
+
+    documents = [Profile, ProfileBio, ResultShow, ScheduleShow, PodcastEpisode, PodcastInfo, SpoilerMode, KennyAlarm]
+    if args.drop:
+        for document in documents:
+            document.drop_collection()
+            logging.info(f"Dropped {document._get_collection_name()}")
+
+    # Indexes are created before inserting, as they would be in production
+    for document in documents:
+        document.ensure_indexes()
+
+    base = datetime.datetime.combine(args.base_date, datetime.time())
+    # Each collection has its own generator, so changing the scale of one doesn't change the others
+    rng = lambda name: random.Random(f"{args.seed}:{name}")
+
+    names = profile_names(rng("names"), args.profiles)
+    # Roughly 120 shows a year
+    results = args.years * 120
+
+    steps = [
+        ("profile", Profile, profiles(rng("profile"), names, base)),
+        ("profile_bio", ProfileBio, bios(rng("profile_bio"), names, base)),
+        ("result_show", ResultShow, shows(rng("result_show"), ResultShow, base, results, -1)),
+        ("schedule_show", ScheduleShow, shows(rng("schedule_show"), ScheduleShow, base, args.schedule, 1)),
+        ("podcast_episode", PodcastEpisode, episodes(rng("podcast_episode"), base, args.episodes)),
+        ("spoiler_mode", SpoilerMode, spoiler_modes(rng("spoiler_mode"), base, args.spoilers)),
+    ]
+
+    for name, document, generated in steps:
+        start = time.perf_counter()
+        count = insert(document, generated, args.batch_size)
+        elapsed = time.perf_counter() - start
+        logging.info(f"Inserted {count} {name} documents in {elapsed:.1f}s ({count / elapsed:.0f}/s)")
+
+    if not PodcastInfo.objects.first():
+        PodcastInfo(title="Super J-Cast", description="A podcast about New Japan Pro Wrestling",
+                    url="https://redcircle.com/shows/super-j-cast/", updated_at=base).save()
+    if not KennyAlarm.objects.first():
+        KennyAlarm(trigger_terms=["kenny", "omega"], whitelist_channels=[], record_days=0).save()
+
+    # A running bot drops anything it has cached for these collections
+    CollectionVersion.bump(*[name for name, document, generated in steps])
+
+if __name__ == "__main__":
+    main()
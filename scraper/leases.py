@@ -0,0 +1,99 @@
+"""
+Job leases, so that any number of scraper workers can run side by side
+
+Each scraper job (pod info, episodes, shows, profiles) is only run by the worker holding its lease, a JobLease document
+with an owner and an expiry time. A worker takes a lease when it is free, expired or already its own, and a background
+thread renews the leases it holds well before they expire. If a worker dies its leases expire after LEASE_SECONDS and
+are taken over by another worker, which runs the job straight away.
+
+Lease times come from each worker's clock, so LEASE_SECONDS should be far longer than any clock difference between
+machines.
+"""
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+
+from mongoengine import NotUniqueError
+from mongoengine.queryset.visitor import Q
+
+from database.models import JobLease
+
+# Seconds a lease lasts without being renewed, ie how long a job goes without an owner after a worker dies
+LEASE_SECONDS = int(os.environ.get("LEASE_SECONDS", 300))
+
+# Identifies this worker as the owner of its leases
+WORKER_ID = os.environ.get("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+class Leases():
+    def __init__(self, owner=WORKER_ID, duration=LEASE_SECONDS):
+        self.owner = owner
+        self.duration = datetime.timedelta(seconds=duration)
+        # Jobs this worker currently holds the lease for
+        self.held = set()
+        self.lock = threading.Lock()
+        self.renewer = None
+
+    # Take or renew the lease on a job, returning whether this worker holds it
+    def acquire(self, job):
+        with self.lock:
+            held = self._take(job)
+
+            if held and job not in self.held:
+                self.held.add(job)
+                logging.info(f"Acquired lease on {job} as {self.owner}")
+            elif not held and job in self.held:
+                self.held.discard(job)
+                logging.warning(f"Lost lease on {job} to another worker")
+
+        return held
+
+    # Give up the lease on a job, so another worker can take it without waiting for it to expire
+    def release(self, job):
+        with self.lock:
+            self.held.discard(job)
+            JobLease.objects(job=job, owner=self.owner).update_one(set__expires_at=datetime.datetime.utcnow())
+
+        logging.info(f"Released lease on {job}")
+
+    def release_all(self):
+        for job in list(self.held):
+            try:
+                self.release(job)
+            except Exception as e:
+                logging.error(f"Unable to release lease on {job}: " + str(e))
+
+    # Start renewing held leases in a background thread
+    # Renewal doesn't depend on the event loop, so a long blocking DB write can't let a lease lapse
+    def start(self):
+        if not self.renewer:
+            self.renewer = threading.Thread(target=self._renew, name="lease-renewer", daemon=True)
+            self.renewer.start()
+
+    def _renew(self):
+        while True:
+            time.sleep(self.duration.total_seconds() / 3)
+
+            for job in list(self.held):
+                try:
+                    self.acquire(job)
+                except Exception as e:
+                    logging.error(f"Unable to renew lease on {job}: " + str(e))
+
+    # A single atomic update, matching only if the lease is ours or has expired
+    # If another worker holds the lease, the upsert clashes with the unique job index and nothing is changed
+    def _take(self, job):
+        now = datetime.datetime.utcnow()
+        update = {"set__owner": self.owner, "set__expires_at": now + self.duration, "set__renewed_at": now}
+        if job not in self.held:
+            update["set__acquired_at"] = now
+
+        try:
+            lease = JobLease.objects(Q(owner=self.owner) | Q(expires_at__lte=now), job=job).modify(
+                upsert=True, new=True, **update)
+        except NotUniqueError:
+            return False
+
+        return lease is not None and lease.owner == self.owner
@@ -0,0 +1,94 @@
+"""
+Scrape run ledger
+
+Every run of a scraper job is recorded as a ScrapeRun document: when it ran, what it fetched (requests, bytes and HTTP
+statuses), how long parsing took, how many records it saw, inserted, modified or skipped, and any errors logged during
+the run. The bot's !scrapestatus command summarises freshness and latency per job from these.
+
+The run in progress is held in a context variable, so the fetch, parse and write code record into whichever job's run
+they are part of without it being passed around. Threads started for a run need the context copied to them, see
+in_context.
+"""
+import contextvars
+import datetime
+import logging
+import threading
+
+from database.models import ScrapeRun
+
+# Errors kept per run, and the length each is cut to, to keep ledger entries compact
+MAX_ERRORS = 20
+MAX_ERROR_LENGTH = 300
+
+current_run = contextvars.ContextVar("current_run", default=None)
+
+class Run():
+    def __init__(self, job, worker=None):
+        self.document = ScrapeRun(job=job, worker=worker, started_at=datetime.datetime.utcnow(), statuses={},
+                                  stages={}, errors=[])
+        # Fetches and parses are recorded from several threads at once
+        self.lock = threading.Lock()
+
+    def fetched(self, status, size):
+        with self.lock:
+            self.document.requests += 1
+            self.document.bytes_fetched += size
+            self.document.statuses[str(status)] = self.document.statuses.get(str(status), 0) + 1
+
+    def parsed(self, seconds):
+        with self.lock:
+            self.document.parse_seconds += seconds
+
+    def counted(self, seen=0, inserted=0, modified=0, skipped=0):
+        with self.lock:
+            self.document.seen += seen
+            self.document.inserted += inserted
+            self.document.modified += modified
+            self.document.skipped += skipped
+
+    def error(self, message):
+        with self.lock:
+            if len(self.document.errors) < MAX_ERRORS:
+                self.document.errors.append(message[:MAX_ERROR_LENGTH])
+
+    # Mark the run as finished and store it, a run with errors isn't ok
+    def save(self):
+        self.document.ended_at = datetime.datetime.utcnow()
+        self.document.seconds = (self.document.ended_at - self.document.started_at).total_seconds()
+        self.document.ok = not self.document.errors
+        self.document.save()
+
+# The run in progress, or None outside of a job (ie in tools.py or benchmark.py, where nothing is recorded)
+def current():
+    return current_run.get()
+
+def fetched(status, size):
+    run = current()
+    if run:
+        run.fetched(status, size)
+
+def parsed(seconds):
+    run = current()
+    if run:
+        run.parsed(seconds)
+
+def counted(**counts):
+    run = current()
+    if run:
+        run.counted(**counts)
+
+# Wrap a function to run with a copy of the current context, so that a thread running it records into the same run
+def in_context(func):
+    context = contextvars.copy_context()
+    return lambda *args: context.run(func, *args)
+
+# Logging handler which adds errors to the run in progress
+# Attached straight to the root logger rather than through the log queue, so it runs in the thread that logged
+class ErrorCollector(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        run = current()
+        if run:
+            run.error(record.getMessage())
@@ -0,0 +1,137 @@
+"""
+Non-blocking logging setup
+
+Records are put on an in-memory queue by the logging call and written to the console and a size rotated log file by a
+QueueListener thread, so logging never waits on disk I/O in the event loop. The message of each record is %-formatted
+as it is queued, so arguments are logged as they were at the time of the call, even if they're changed before the
+listener gets to them. Records dropped by a rate limit are never formatted.
+
+Chatty loggers can be rate limited by name, records over the limit are dropped and counted, and the count is added to
+the next record let through. Warnings and errors are never rate limited.
+
+Configured with environment variables:
+    LOG_JSON: set to output the log file as one JSON object per line
+    LOG_MAX_BYTES: size the log file is rotated at (default 10MB)
+    LOG_BACKUPS: number of rotated log files kept (default 5)
+
+Kept in step with bot/utils/logs.py.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+LOG_FORMAT = '%(asctime)s:%(name)s:%(levelname)s# %(message)s'
+DATE_FORMAT = '%d.%m.%y-%H:%M:%S'
+
+# One JSON object per line, for log shipping and querying
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+# Lets through at most count records per period seconds for each rate limited logger, and its children
+# Warnings and above are always let through, and don't count towards the limit
+# limits is a dict of logger name: (count, period)
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = limits
+        # logger name: [window start, records let through, records dropped]
+        self.windows = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        name = self._limited_name(record.name)
+        if not name:
+            return True
+
+        count, period = self.limits[name]
+        now = time.monotonic()
+        window = self.windows.setdefault(name, [now, 0, 0])
+        if now - window[0] >= period:
+            window[:] = [now, 0, window[2]]
+
+        if window[1] >= count:
+            window[2] += 1
+            return False
+
+        window[1] += 1
+        if window[2]:
+            # Messages without arguments aren't %-formatted, so any % in them must be left as it is
+            if isinstance(record.args, tuple) and record.args:
+                record.msg = str(record.msg) + " (%d similar messages suppressed)"
+                record.args = record.args + (window[2],)
+            else:
+                record.msg = f"{record.msg} ({window[2]} similar messages suppressed)"
+            window[2] = 0
+
+        return True
+
+    # Return the most specific rate limited logger name covering the given logger, if there is one
+    def _limited_name(self, name):
+        while name:
+            if name in self.limits:
+                return name
+            name = name.rpartition(".")[0]
+
+        return None
+
+# Puts records on the queue with their message formatted, leaving the rest of the line to the listener thread
+# Records never leave the process, so unlike QueueHandler.prepare the record isn't copied or stripped of exc_info
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+# Configure the root logger to log through a queue to the console (INFO) and a rotating log file (DEBUG)
+# rate_limits is a dict of logger name: (count, period) for chatty loggers
+# Returns the started QueueListener, which is stopped at exit so that queued records are written
+def setup(filename, rate_limits=None):
+    console_handler = logging.StreamHandler()
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename,
+        maxBytes=int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+        backupCount=int(os.environ.get("LOG_BACKUPS", 5)),
+        encoding="utf-8"
+    )
+    console_handler.setLevel(logging.INFO)
+    file_handler.setLevel(logging.DEBUG)
+
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT))
+    if os.environ.get("LOG_JSON"):
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    if rate_limits:
+        queue_handler.addFilter(RateLimitFilter(rate_limits))
+
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Level also set here as logs weren't being output without it
+    logging.basicConfig(
+        level=logging.DEBUG,
+        handlers=[queue_handler]
+        )
+
+    return listener
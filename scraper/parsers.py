@@ -0,0 +1,440 @@
+"""
+Parsers for scraped pages
+
+Each parser takes the content of a page as fetched (bytes or text) and returns plain records (dicts, lists, datetimes),
+without making requests or touching the DB. This keeps parsing separate from fetching and writing, so parsers can be
+run against recorded pages by benchmark.py, and moved off the scraper's event loop.
+"""
+from bs4 import BeautifulSoup
+from datetime import datetime
+import logging
+import pytz
+import re
+
+# Logs several lines for every show parsed, so it is rate limited when logging is set up
+shows_log = logging.getLogger("scraper.shows")
+
+# The podcast image on the RedCircle page isn't parsed correctly, so a hardcoded link is used
+POD_IMG_URL = "https://media.redcircle.com/images/2020/8/20/14/3b3c9e21-4329-4283-b1c4-6ab1b3be5a6a_93146d1b-2f16-477b-b6c1-c17069ef70dc_c8a8e6cf-7ba4-44bb-954c-53ec5023adc8_32630451.jpg?d=280x280"
+
+# Classes of the elements holding each match on a show's card page
+MATCH_CLASS = "matchBox"
+MATCH_TITLE_CLASS = "matchTitle"
+MATCH_RESULT_CLASS = "matchResult"
+
+# Create a dict of possible attributes so that we can loop through try/except statements
+# [name of key in wrestler's dict]: [text used to identify this data in the soup]
+PROFILE_ATTRIBUTES = {
+    "height": "HEIGHT",
+    "weight": "WEIGHT",
+    "birthday": "YEAR OF BIRTH",
+    "birthplace": "PLACE OF BIRTH",
+    "bloodtype": "BLOOD TYPE",
+    "debut": "DEBUT",
+    "finisher": "FINISH HOLD",
+    "theme": "THEME SONG",
+    "blog": "BLOG"
+}
+
+# General info about the podcast from its RedCircle page
+def pod_info(content, url):
+    soup = BeautifulSoup(content, "lxml")
+
+    return {
+        "title": soup.find(class_="show-title").get_text().strip(),
+        "description": soup.find_all("div", class_="show-page__about")[0].p.get_text().strip(),
+        # This isn't returning the right value at the moment, so using the hardcoded link
+        # "img_url": soup.find_all("img", class_="show-image")[0].src,
+        "img_url": POD_IMG_URL,
+        "url": url
+    }
+
+# The latest episode in the podcast's RSS feed
+def pod_episode(content):
+    soup = BeautifulSoup(content, "xml")
+
+    # .find pulls the first item in the RSS feed, which will be the latest episode
+    return _episode(soup.find("item"))
+
+# Every episode in the podcast's RSS feed, latest first
+def all_episodes(content):
+    soup = BeautifulSoup(content, "xml")
+
+    return [_episode(item) for item in soup.find_all("item")]
+
+def _episode(item):
+    # Remove some of the formatting around the date and convert to date object
+    published = datetime.strptime(
+        " ".join(item.pubDate.text.split(" ")[0:4]), 
+        "%a, %d %b %Y"
+        ).date()
+
+    return {
+        "title": item.title.text,
+        "description": item.description.text,
+        "link": item.link.text,
+        "published": published, 
+        "duration": item.duration.text,
+        "file": item.enclosure.get("url")
+    }
+
+# Every show on a page of the njpw1972.com schedule or results
+def shows(content):
+    soup = BeautifulSoup(content, "lxml")
+
+    shows = []
+
+    for event in soup.find_all("div", class_="event"):
+        # Each "event" can actually be one show, or a whole tour, with multiple dates
+        # event_name can be consistent across multiple dates, so is set here, outside of the next for loop
+        event_name = event.find("h3").get_text().strip()
+        dates = event.find_all("li")
+
+        for date in dates:
+            try:
+                show_dict = {
+                    "name": event_name,
+                    "city": date.find("p", class_="city").get_text().strip(),
+                    "venue": date.find("p", class_="venue").get_text().strip(),
+                    "thumb": event.find("img")["src"],
+                    "card": date.find("a")["href"]
+                }
+
+                shows_log.info("Found show %s", show_dict['name'])
+
+                # The url of their placeholder logo needs to be replaced with the full path
+                if show_dict['thumb'] == "/wp-content/themes/njpw-en/images/common/noimage_poster.jpg":
+                    show_dict['thumb'] = "https://www.njpw1972.com/wp-content/themes/njpw-en/images/common/noimage_poster.jpg"
+
+                # Scrape the scheduled time of the show and split our the date and time
+                date_time = " ".join(date.find("p", class_="date").get_text().strip().split())
+
+                show_date = " ".join(date_time.split(" ")[:4])
+                show_time = " ".join(date_time.split(" ")[5:])
+
+                shows_log.info("Found time for %s: %s", show_dict['name'], date_time)
+
+                # Check for the format of date time
+                # Match datetimes like: SUN. MAY. 15. 2022 | DOOR 15:30 | BELL 17:00 (Standard JPN shows)
+                if re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d\d:\d\d \| BELL \d\d:\d\d$", date_time, re.IGNORECASE):
+                    shows_log.info("Date time for %s matches format 'DAY. MONTH. 00. YEAR | DOOR 00:00 | BELL 00:00'", show_dict['name'])
+
+                    # Parse date and time from text
+                    # Time is text after "bell"
+                    show_time = date_time.split("BELL")[1].strip()
+
+                    # Convert the text into a datetime object
+                    fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %H:%M")
+                    shows_log.info("Formatted datetime for %s: %s", show_dict['name'], fmt_datetime)
+
+                    # Timezone for shows in this format is JST so start times are localised to UTC based on that
+                    tz = pytz.timezone("Asia/Tokyo")
+
+                    # Add full datetime to dict. These are duplicated here and "date" is then added to DB as date only for generic day matching 
+                    show_dict['time'] = tz.localize(fmt_datetime)
+                    show_dict['date'] = show_dict['time']
+                    show_dict['source_tz'] = "utc"
+
+                # Match datetimes like: SAT. MAY. 7. 2022
+                elif re.match(r"^\w{3}\. \w{3,9}\. [0-9]{1,2}\. [0-9]{4}$", date_time, re.IGNORECASE):
+                    shows_log.info("Date time for %s matches RE format 'DAY. MONTH. 00. YEAR'", show_dict['name'])
+
+                    # This format provides date only, so it is parsed directly.
+                    fmt_datetime = datetime.strptime(show_date, "%a. %B. %d. %Y")
+                    shows_log.info("Formatted datetime for %s: %s", show_dict['name'], fmt_datetime)
+
+                    # No time available, so don't add it to the dict
+                    show_dict['date'] = fmt_datetime
+                    show_dict['source_tz'] = "none"
+
+                    show_dict['time'] = show_dict['date']
+
+                # Match datetimes like: SAT. MAY. 14. 2022 | DOOR 6PM | BELL 7PM
+                elif re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d(\:\d\d)?[A|P]M( \(.+?\))? \| BELL \d(\:\d\d)?[A|P]M( \(.+?\))?$", date_time, re.IGNORECASE):
+                    shows_log.info("Date time for %s matches format 'DAY. MONTH. 00. YEAR | DOOR 0PM | BELL 0PM'", show_dict['name'])
+
+                    # Time is text after "bell"
+                    show_time = date_time.split("BELL")[1].strip()
+
+                    if len(show_time) == 3:
+                        show_time = "0" + show_time
+
+                    # Convert the text into a datetime object
+                    if ":" in show_time:
+                        fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I:%M%p")
+                    else:
+                        fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I%p")
+                    shows_log.info("Formatted datetime for %s: %s", show_dict['name'], fmt_datetime)
+
+                    # Times in this format usually indicates USA shows, but no TZ is indicated, so it is not localised
+                    show_dict['time'] = fmt_datetime
+                    show_dict['date'] = show_dict['time']
+                    show_dict['source_tz'] = "local"
+
+                # Match datetimes like: SUN. MAY. 15. 2022 | DOOR 4PM ET | BELL 5 PM ET or TUE. AUGUST. 16. 2022 | BELL 6PM JST
+                elif (re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d[A|P]M \w{2,4} \| BELL \d[A|P]M \w{2,4}$", date_time, re.IGNORECASE) or
+                      re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d[A|P]M \w{2,4} \| BELL \d [A|P]M \w{2,4}$", date_time, re.IGNORECASE) or
+                      re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| BELL \d[A|P]M \w{2,4}$", date_time, re.IGNORECASE)):
+
+                    shows_log.info("Date time for %s matches format 'DAY. MONTH. 00. YEAR (| DOOR 0PM TZ) | BELL 0PM TZ'", show_dict['name'])
+
+                    # Parse date and time from text
+                    # Date is the text up to the 4th space
+                    show_date = " ".join(date_time.split(" ")[:4])
+
+                    # Time is text after "bell" - convert it to eg 7PM
+                    show_time = date_time.split("BELL")[1].replace(" ", "")[:3]
+
+                    # Convert the text into a datetime object
+                    fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I%p")
+                    shows_log.info("Formatted datetime for %s: %s", show_dict['name'], fmt_datetime)
+
+                    # Timezone is at the end of the string
+                    show_tz = date_time.rsplit(" ", 1)[-1]
+                    shows_log.info("Timezone found for %s: %s", show_dict['name'], show_tz)
+
+                    # Match timezones from text into pytz format
+                    if show_tz == "JST":
+                        tz = pytz.timezone("Asia/Tokyo")
+                        show_dict['time'] = tz.localize(fmt_datetime)
+                        show_dict['source_tz'] = "utc"
+
+                    elif show_tz == "ET":
+                        tz = pytz.timezone("US/Eastern")
+                        show_dict['time'] = tz.localize(fmt_datetime)
+                        show_dict['source_tz'] = "utc"
+                    # If TZ is unrecognised, stick to local time
+                    else:
+                        show_dict['time'] = fmt_datetime
+
+                    show_dict['date'] = show_dict['time']
+
+                # Match datetimes like: WED. AUGUST. 10. 2022 | BELL 6:30PM JST
+                elif re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| BELL \d:\d\d[A|P]M \w{2,4}$", date_time, re.IGNORECASE):
+                    shows_log.info("Date time for %s matches format 'DAY. MONTH. 00. YEAR | BELL 0:00PM TZ'", show_dict['name'])
+
+                    # Parse date and time from text
+                    # Date is the text up to the 4th space
+                    show_date = " ".join(date_time.split(" ")[:4])
+
+                    # Time is text after "bell" up to the last space
+                    show_time = date_time.split("BELL")[1].rsplit(" ", 1)[0].replace(" ", "")
+
+                    if len(show_time) == 6:
+                        show_time = "0" + show_time
+
+                    # Timezone is at the end of the string
+                    show_tz = date_time.rsplit(" ", 1)[-1]
+                    shows_log.info("Timezone found for %s: %s", show_dict['name'], show_tz)
+
+                    # Convert the text into a datetime object
+                    fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I:%M%p")
+                    shows_log.info("Formatted datetime for %s: %s", show_dict['name'], fmt_datetime)
+
+                    # Match timezones from text into pytz format
+                    if show_tz == "JST":
+                        tz = pytz.timezone("Asia/Tokyo")
+                        show_dict['time'] = tz.localize(fmt_datetime)
+                        show_dict['source_tz'] = "utc"
+
+                    elif show_tz == "ET":
+                        tz = pytz.timezone("US/Eastern")
+                        show_dict['time'] = tz.localize(fmt_datetime)
+                        show_dict['source_tz'] = "utc"
+                    # If TZ is unrecognised, stick to local time
+                    else:
+                        show_dict['time'] = fmt_datetime
+
+                    show_dict['date'] = show_dict['time']
+
+                # Match datetimes like: SAT. AUGUST. 13. 2022 | BELL 8/7c
+                elif re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| \w{4} \d/\dc$", date_time, re.IGNORECASE):
+                    # Parse date and time from text
+                    # Date is the text up to the 4th space
+                    show_date = " ".join(date_time.split(" ")[:4])
+
+                    # Time is text after "/", central time - 
+                    show_time = "0" + date_time.split("/")[1][0] + "PM"
+
+                    # Convert the text into a datetime object
+                    fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I%p")
+                    shows_log.info("Formatted datetime for %s: %s", show_dict['name'], fmt_datetime)
+
+                    # Shows in this format are always central time as far as I can tell
+                    tz = pytz.timezone("US/Central")
+                    show_dict['time'] = tz.localize(fmt_datetime)
+                    show_dict['source_tz'] = "local"
+
+                    show_dict['date'] = show_dict['time']
+
+                else:
+                    shows_log.warning("Cannot match format of %s", show_dict['name'])
+
+                shows_log.debug("show_dict: %s", show_dict)
+
+                shows.append(show_dict)
+                shows_log.info("Finished with %s, moving to next show.", show_dict['name'])            
+            except Exception as e:
+                logging.error(f"Unable to scrape show {event_name}: " + str(e))
+
+    return shows
+
+# Every match on a show's card page, in card order
+# Each match is a div with a title (ie the championship) and a result line, where winners are marked with ○ and losers
+# with ●, ie "○Kazuchika Okada vs Tetsuya Naito●", followed by the time and finish, ie "(35:12 Rainmaker)"
+# Matches without a result (the card before the show) are returned with no winners or losers
+def match_results(content):
+    soup = BeautifulSoup(content, "lxml")
+
+    matches = []
+
+    for number, match in enumerate(soup.find_all("div", class_=MATCH_CLASS), 1):
+        try:
+            match_dict = {
+                "number": number,
+                "title": None,
+                "winners": [],
+                "losers": [],
+                "participants": [],
+                "result": None,
+                "duration": None,
+                "finish": None
+            }
+
+            title = match.find(class_=MATCH_TITLE_CLASS)
+            if title:
+                match_dict["title"] = " ".join(title.get_text().split())
+
+            # Upcoming cards have no result yet, so the wrestlers are read from the rest of the match box
+            result_tag = match.find(class_=MATCH_RESULT_CLASS)
+            if result_tag:
+                result = " ".join(result_tag.get_text(" ").split())
+                match_dict["result"] = result
+            else:
+                if title:
+                    title.extract()
+                result = " ".join(match.get_text(" ").split())
+
+            # Time and finish are in brackets after the result line, ie "(35:12 Rainmaker)"
+            finish = re.search(r"\((\d{1,2}:\d\d)\s*([^)]*)\)", result)
+            if finish:
+                match_dict["duration"] = finish.group(1)
+                match_dict["finish"] = finish.group(2).strip() or None
+                result = result[:finish.start()]
+
+            # Only the wrestler taking or giving up the fall is marked, the rest of their team shares the result
+            for side in re.split(r"\s+vs\.?\s+", result, flags=re.IGNORECASE):
+                names = [n.replace("○", "").replace("●", "").strip() for n in re.split(r"\s*(?:&|,|\band\b)\s*", side)]
+                names = [n for n in names if n]
+
+                match_dict["participants"] += names
+                if "○" in side:
+                    match_dict["winners"] += names
+                elif "●" in side:
+                    match_dict["losers"] += names
+
+            matches.append(match_dict)
+
+        except Exception as e:
+            logging.error(f"Unable to parse match {number}: " + str(e))
+
+    return matches
+
+# Times of the shows in the njpwworld schedule, in JST
+# Shows without a confirmed time are skipped
+def broadcast_times(content):
+    soup = BeautifulSoup(content, "html.parser")
+
+    # Tab1 contains the schedule, tab2 is past events
+    schedule = soup.find("div", id="tab1")
+    # Each month's shows is listed in a seperate table
+    months = schedule.find_all("table")
+    # The year isn't in individual dates, so pull it from the table headers
+    years = soup.find_all("h1", class_="ttl-schedule menu-ja")
+
+    # In the source text, both the english and japanese calendars are there - even indices are japanese tables, odds are english
+    # Ignore tr[0] as it's the table header. The year is spliced from the text header (ie "2021年2月配信予定一覧")
+    
+    # Current month's shows
+    times = _broadcast_times(months[0].find_all('tr')[1:], years[0].text[:4])
+
+    # Next month's shows if the schedule exists
+    if len(months) > 2:
+        times += _broadcast_times(months[2].find_all('tr')[1:], years[1].text[:4])
+
+    return times
+
+def _broadcast_times(broadcasts, year):
+    times = []
+
+    for broadcast in broadcasts:
+        try:
+            # Pull the date and time from the first 2 columns
+            show_details = [s.text for s in (broadcast.find_all('td'))][:2]
+
+            # If 後日配信 is in the show details, the time has not yet been confirmed
+            if "後日配信" in show_details:
+                logging.info(f"No time set for {show_details}, skipping...")
+
+            else:
+                # Create a datetime object for the show by building a string and formatting it (Japanese time)
+                times.append(pytz.timezone("Asia/Tokyo").localize(datetime.strptime(show_details[1][:5] + " " + show_details[0].split("(")[0] + " " + year, "%H:%M %m/%d %Y")))
+
+        except Exception as e:
+            logging.error("Error trying to parse broadcast show: " + str(e))
+
+    return times
+
+# The list of profiles on njpw1972.com, without the details from each wrestler's own page
+def profile_list(content):
+    soup = BeautifulSoup(content, "lxml")
+    profile_list = soup.find("ul", class_="wrestlerList").find_all("li")
+
+    profiles = []
+
+    for profile in profile_list:
+        profile_dict = {
+            "name": profile.find("p", class_="name").get_text().strip(),
+            "link": profile.find("a")["href"],
+            "render": profile.find("img")["src"],
+            "attributes": {}
+        }
+        profiles.append(profile_dict)
+
+        logging.debug("Found profile: %s", profile_dict['name'])
+
+    return profiles
+
+# The attributes and bio from a wrestler's profile page, as {"attributes": {...}, "bio": str or None}
+def profile_detail(content):
+    profile_soup = BeautifulSoup(content, "lxml").find("div", class_="profileDetail")
+
+    detail = {"attributes": {}, "bio": None}
+
+    # Loop through the profile attributes, adding the key and value to the attributes of the wrestler
+    for key in PROFILE_ATTRIBUTES:
+        # BeautifulSoup throws an AttributeError exception if the element is not found, so we need to catch these because the attributes listed for each wrestler is not consistent
+        try:
+            detail["attributes"][key] = profile_soup.find("dt", text=PROFILE_ATTRIBUTES[key]).findNext("dd").get_text().strip()
+        except AttributeError:
+            pass
+
+    # Find UNIT separately from the loop as it's stored in a p tag
+    try:
+        detail["attributes"]["unit"] = profile_soup.find("p", text="UNIT").findNext("p").get_text().strip()
+    except AttributeError:
+        pass
+
+    # For twitter, we're pulling the link, not the text, so this is done separately
+    try:
+        detail["attributes"]["twitter"] = profile_soup.find("dt", text="TWITTER").findNext("a")["href"]
+    except AttributeError:
+        pass
+
+    # The bio is in a textBox div
+    try:
+        detail["bio"] = profile_soup.find("div", class_="textBox").get_text().strip()
+    except AttributeError:
+        pass
+
+    return detail
@@ -0,0 +1,67 @@
+"""
+A small dependency graph of async stages
+
+Each stage starts as soon as the stages it depends on have finished, and is passed their results in order, so
+independent stages (ie fetches from different sites) run concurrently. If a stage fails, the stages depending on it are
+skipped, while the rest of the graph carries on.
+
+Each run returns the result and timing of every stage, for the summary logged at the end of a cycle.
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+Stage = namedtuple("Stage", ["name", "func", "depends_on"])
+
+# status is one of ok, failed or skipped, seconds is how long the stage itself ran for
+StageResult = namedtuple("StageResult", ["name", "status", "result", "seconds"])
+
+class Pipeline():
+    def __init__(self, name):
+        self.name = name
+        # name: Stage, in the order added
+        self.stages = {}
+
+    # Add a stage, which must come after the stages it depends on
+    def stage(self, name, func, depends_on=()):
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+
+        self.stages[name] = Stage(name, func, tuple(depends_on))
+        return self
+
+    # Run every stage, returning {name: StageResult}
+    async def run(self):
+        tasks = {}
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(self._run_stage(stage, [tasks[d] for d in stage.depends_on]))
+
+        await asyncio.gather(*tasks.values())
+        return {name: task.result() for name, task in tasks.items()}
+
+    async def _run_stage(self, stage, dependencies):
+        results = [await d for d in dependencies]
+
+        failed = [r.name for r in results if r.status != "ok"]
+        if failed:
+            logging.warning(f"Skipping {self.name} stage {stage.name}, as {', '.join(failed)} didn't complete")
+            return StageResult(stage.name, "skipped", None, 0.0)
+
+        start = time.perf_counter()
+        try:
+            result = await stage.func(*[r.result for r in results])
+        except Exception as e:
+            logging.error(f"Error encountered while running {self.name} stage {stage.name}: " + str(e))
+            return StageResult(stage.name, "failed", None, time.perf_counter() - start)
+
+        return StageResult(stage.name, "ok", result, time.perf_counter() - start)
+
+# One line per stage, ie "fetch_schedule    ok       1.92s"
+def summary(name, results, elapsed):
+    lines = [f"{name} cycle finished in {elapsed:.2f}s"]
+    for result in results.values():
+        lines.append(f"  {result.name:<18}{result.status:<9}{result.seconds:>6.2f}s")
+
+    return "\n".join(lines)
@@ -0,0 +1,144 @@
+"""
+Process pool for parsing
+
+Parsing pages is the CPU heavy part of the scraper, so it is run in a pool of worker processes while pages are fetched
+and records written in the main process. Page content (bytes) is sent to the workers and plain records are returned,
+so little has to be pickled either way.
+
+The number of workers is set with PARSE_WORKERS, defaulting to the number of CPUs the process may run on, up to
+DEFAULT_MAX_WORKERS. With PARSE_WORKERS=0 parsing is done inline in the calling thread, as before.
+
+Records logged by the parsers in worker processes are sent back over a queue and logged again in the main process,
+through the same loggers, rate limits and ledger error collection as records logged there. Each record is tagged with
+the scrape run its parse was submitted from, so errors are added to that run.
+
+Workers are started with spawn rather than fork, as the scraper process has threads (log writing, scraping) which
+could be holding locks at the moment of a fork.
+"""
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import time
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import ledger
+
+# Cap on the default number of workers
+# CPU quotas (ie docker --cpus) aren't visible to the process, so on a large host the CPU count alone would start far
+# more workers than the container can run
+DEFAULT_MAX_WORKERS = 4
+
+# CPUs this process may run on, which unlike os.cpu_count() respects CPU sets
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", min(_available_cpus(), DEFAULT_MAX_WORKERS)))
+
+# In a worker, the id of the scrape run the parse in progress was submitted from
+# Each worker process runs one parse at a time, so a global is enough
+_run_id = None
+
+# Runs the parser in a worker, returning its records and how long it took
+def _timed(run_id, parser, *args):
+    global _run_id
+    _run_id = run_id
+
+    start = time.perf_counter()
+    return parser(*args), time.perf_counter() - start
+
+# Tags each record logged in a worker with the scrape run it belongs to
+class _RunFilter(logging.Filter):
+    def filter(self, record):
+        record.run_id = _run_id
+        return True
+
+# Runs in each worker process as it starts, sending all log records back to the main process
+def _init_worker(log_queue):
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(_RunFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(logging.DEBUG)
+
+# Passes records from the workers to the logger they were logged to in the main process, with the run they belong to
+# as the current run, as if they had been logged there
+class _Redispatch(logging.Handler):
+    def __init__(self, runs):
+        super().__init__()
+        self.runs = runs
+
+    def emit(self, record):
+        token = ledger.current_run.set(self.runs.get(getattr(record, "run_id", None)))
+        try:
+            # getLogger("root") isn't the root logger before Python 3.9
+            logging.getLogger(None if record.name == "root" else record.name).handle(record)
+        finally:
+            ledger.current_run.reset(token)
+
+class ParsePool():
+    def __init__(self, workers=PARSE_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.log_listener = None
+        # id: scrape run, for the runs with parses in progress
+        self.runs = weakref.WeakValueDictionary()
+
+        if workers > 0:
+            context = multiprocessing.get_context("spawn")
+            log_queue = context.Queue()
+            self.log_listener = logging.handlers.QueueListener(log_queue, _Redispatch(self.runs))
+            self.log_listener.start()
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                initializer=_init_worker, initargs=(log_queue,))
+
+        logging.info(f"Parsing with {workers or 'no'} worker processes")
+
+    # Parse in a worker, returning a Future for the records
+    # Without workers, the parser is run straight away and the Future is already resolved
+    # Parse time is added to the scrape run in progress when the parser finishes
+    def submit(self, parser, *args):
+        run = ledger.current()
+        future = Future()
+
+        def done(timed):
+            try:
+                records, seconds = timed.result()
+            except Exception as e:
+                future.set_exception(e)
+                return
+
+            if run:
+                run.parsed(seconds)
+            future.set_result(records)
+
+        if self.executor:
+            run_id = None
+            if run:
+                run_id = id(run)
+                self.runs[run_id] = run
+            self.executor.submit(_timed, run_id, parser, *args).add_done_callback(done)
+        else:
+            timed = Future()
+            try:
+                timed.set_result(_timed(None, parser, *args))
+            except Exception as e:
+                timed.set_exception(e)
+            done(timed)
+
+        return future
+
+    # Parse and wait for the result
+    def parse(self, parser, *args):
+        return self.submit(parser, *args).result()
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown()
+        if self.log_listener:
+            self.log_listener.stop()
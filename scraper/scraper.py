@@ -2,47 +2,53 @@
 A web scraper Class instantiated once the bot starts running and is logged in
 
 Provides class methods to scrape information from various sources to then be stored in the DB
+Pages are fetched here and parsed by the functions in parsers.py, in the parse pool's worker processes
 """
-from bs4 import BeautifulSoup
-from datetime import datetime
 import logging
+import os
 import requests
-import pytz
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import ledger
+import parsers
 from database.models import ScheduleShow
+from pool import ParsePool
+
+# Number of show cards fetched at once when scraping match results
+RESULTS_CONCURRENCY = int(os.environ.get("RESULTS_CONCURRENCY", 4))
+
+# Number of profile pages fetched at once when updating profiles
+PROFILES_CONCURRENCY = int(os.environ.get("PROFILES_CONCURRENCY", 4))
 
 class Scraper():
-    def __init__(self):
+    # Without a parse pool, pages are parsed inline
+    def __init__(self, parse_pool=None):
+        self.parse_pool = parse_pool or ParsePool(workers=0)
+
         # Store some commonly used URLs
         self.pod_info_url = "https://redcircle.com/shows/super-j-cast/"
         self.pod_rss_feed = "https://feeds.redcircle.com/cf1d4e82-ac3d-47e6-948d-1d299cf6744e"
         self.njpw_profiles_url = "https://www.njpw1972.com/profiles/"
+        self.njpw_world_schedule_url = "https://njpwworld.com/feature/schedule#googtrans(en)"
 
-    # Take a url and create a Beautiful soup object
-    # Features is usually lxml or xml
-    def create_soup(self, url, features):
-        page = requests.get(url)
-        soup = BeautifulSoup(page.content, features)
+        # Custom headers are needed otherwise njpwworld gives an unsupported browser error
+        self.njpw_world_headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.190 Safari/537.36'}
 
-        return soup
+    # Fetch a url and return the raw content of the page
+    def fetch(self, url, headers=None):
+        response = requests.get(url, headers=headers)
+        ledger.fetched(response.status_code, len(response.content))
+        # Error pages would otherwise be parsed as if they were empty
+        response.raise_for_status()
+
+        return response.content
 
     # Pull general info about the podcast and create a dict
     def pod_info(self):
         logging.info("Updating podcast information")
-        
-        soup = self.create_soup(self.pod_info_url, "lxml")
 
-        pod_info = {
-            "title": soup.find(class_="show-title").get_text().strip(),
-            "description": soup.find_all("div", class_="show-page__about")[0].p.get_text().strip(),
-            # This isn't returning the right value at the moment, so using the hardcoded link
-            # "img_url": soup.find_all("img", class_="show-image")[0].src,
-            "img_url": "https://media.redcircle.com/images/2020/8/20/14/3b3c9e21-4329-4283-b1c4-6ab1b3be5a6a_93146d1b-2f16-477b-b6c1-c17069ef70dc_c8a8e6cf-7ba4-44bb-954c-53ec5023adc8_32630451.jpg?d=280x280",
-            "url": self.pod_info_url
-        }
-
-        logging.debug("pod_info: " + str(pod_info))
+        pod_info = self.parse_pool.parse(parsers.pod_info, self.fetch(self.pod_info_url), self.pod_info_url)
+        logging.debug("pod_info: %s", pod_info)
 
         return pod_info
 
@@ -50,28 +56,8 @@ class Scraper():
     def pod_episode(self):
         logging.info("Updating latest podcast episode")
 
-        soup = self.create_soup(self.pod_rss_feed, "xml")
-        
-        # .find pulls the first item in the RSS feed, which will be the latest episode
-        item = soup.find("item")
-
-        # Remove some of the formatting around the date and convert to date object
-        published = datetime.strptime(
-            " ".join(item.pubDate.text.split(" ")[0:4]), 
-            "%a, %d %b %Y"
-            ).date()
-
-        # Put the last episode info into a dict and return it
-        last_pod = {
-            "title": item.title.text,
-            "description": item.description.text,
-            "link": item.link.text,
-            "published": published, 
-            "duration": item.duration.text,
-            "file": item.enclosure.get("url")
-        }
-
-        logging.debug("last_pod: " + str(last_pod))
+        last_pod = self.parse_pool.parse(parsers.pod_episode, self.fetch(self.pod_rss_feed))
+        logging.debug("last_pod: %s", last_pod)
 
         return last_pod
     
@@ -79,369 +65,143 @@ class Scraper():
     def all_episodes(self):
         logging.info("Updating all podcast episodes")
 
-        soup = self.create_soup(self.pod_rss_feed, "xml")
-        items = soup.find_all("item")
-
-        all_pods = []
-
-        for item in items:
-            published = datetime.strptime(
-            " ".join(item.pubDate.text.split(" ")[0:4]), 
-            "%a, %d %b %Y"
-            ).date()
-
-        # Put the last episode info into a dict and return it
-            episode = {
-                "title": item.title.text,
-                "description": item.description.text,
-                "link": item.link.text,
-                "published": published, 
-                "duration": item.duration.text,
-                "file": item.enclosure.get("url")
-            }
-
-            all_pods.append(episode)
-
-        logging.debug("all_pods: " + str(all_pods))
+        all_pods = self.parse_pool.parse(parsers.all_episodes, self.fetch(self.pod_rss_feed))
+        logging.debug("all_pods: %s", all_pods)
         
         return all_pods
 
+    # URLs of the pages listing past or future shows
+    # type is either result (past) or schedule (future)
+    def show_urls(self, type):
+        return ["https://www.njpw1972.com/" + type + "?pageNum=" + str(x) for x in range(1, 3)]
 
     # Pull info on past or future shows
     # type is either result (past) or schedule (future)
     def shows(self, type):
         logging.info("Updating " + type + " shows")
         
-        shows = []
-        
-        for x in range(1, 3):
-            url = "https://www.njpw1972.com/" + type + "?pageNum=" + str(x)
-            soup = self.create_soup(url, "lxml")
-            all_events = soup.find_all("div", class_="event")
+        # Each page is parsed while the next is fetched
+        pages = []
+        for url in self.show_urls(type):
             logging.info(f"Scraping {url} for shows.")
+            pages.append(self.parse_pool.submit(parsers.shows, self.fetch(url)))
 
-            for event in all_events:
-                    # Each "event" can actually be one show, or a whole tour, with multiple dates
-                    # event_name can be consistent across multiple dates, so is set here, outside of the next for loop
-                    event_name = event.find("h3").get_text().strip()
-                    dates = event.find_all("li")
-
-                    for date in dates:
-                        try:
-                            show_dict = {
-                                "name": event_name,
-                                "city": date.find("p", class_="city").get_text().strip(),
-                                "venue": date.find("p", class_="venue").get_text().strip(),
-                                "thumb": event.find("img")["src"],
-                                "card": date.find("a")["href"]
-                            }
-
-                            logging.info(f"Found show {show_dict['name']}")
-
-                            # The url of their placeholder logo needs to be replaced with the full path
-                            if show_dict['thumb'] == "/wp-content/themes/njpw-en/images/common/noimage_poster.jpg":
-                                show_dict['thumb'] = "https://www.njpw1972.com/wp-content/themes/njpw-en/images/common/noimage_poster.jpg"
-
-                            # Scrape the scheduled time of the show and split our the date and time
-                            date_time = " ".join(date.find("p", class_="date").get_text().strip().split())
-
-                            show_date = " ".join(date_time.split(" ")[:4])
-                            show_time = " ".join(date_time.split(" ")[5:])
-
-                            logging.info(f"Found time for {show_dict['name']}: {date_time}")
-                            
-                            # Check for the format of date time
-                            # Match datetimes like: SUN. MAY. 15. 2022 | DOOR 15:30 | BELL 17:00 (Standard JPN shows)
-                            if re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d\d:\d\d \| BELL \d\d:\d\d$", date_time, re.IGNORECASE):
-                                logging.info(f"Date time for {show_dict['name']} matches format 'DAY. MONTH. 00. YEAR | DOOR 00:00 | BELL 00:00'")
-                                
-                                # Parse date and time from text
-                                # Time is text after "bell"
-                                show_time = date_time.split("BELL")[1].strip()
-                                
-                                # Convert the text into a datetime object
-                                fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %H:%M")
-                                logging.info(f"Formatted datetime for {show_dict['name']}: {fmt_datetime}")
-                                
-                                # Timezone for shows in this format is JST so start times are localised to UTC based on that
-                                tz = pytz.timezone("Asia/Tokyo")
-                                
-                                # Add full datetime to dict. These are duplicated here and "date" is then added to DB as date only for generic day matching 
-                                show_dict['time'] = tz.localize(fmt_datetime)
-                                show_dict['date'] = show_dict['time']
-                                show_dict['source_tz'] = "utc"
-
-                            # Match datetimes like: SAT. MAY. 7. 2022
-                            elif re.match(r"^\w{3}\. \w{3,9}\. [0-9]{1,2}\. [0-9]{4}$", date_time, re.IGNORECASE):
-                                logging.info(f"Date time for {show_dict['name']} matches RE format 'DAY. MONTH. 00. YEAR'")
-                                
-                                # This format provides date only, so it is parsed directly.
-                                fmt_datetime = datetime.strptime(show_date, "%a. %B. %d. %Y")
-                                logging.info(f"Formatted datetime for {show_dict['name']}: {fmt_datetime}")
-                                
-                                # No time available, so don't add it to the dict
-                                show_dict['date'] = fmt_datetime
-                                show_dict['source_tz'] = "none"
-
-                                show_dict['time'] = show_dict['date']
-
-                            # Match datetimes like: SAT. MAY. 14. 2022 | DOOR 6PM | BELL 7PM
-                            elif re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d(\:\d\d)?[A|P]M( \(.+?\))? \| BELL \d(\:\d\d)?[A|P]M( \(.+?\))?$", date_time, re.IGNORECASE):
-                                logging.info(f"Date time for {show_dict['name']} matches format 'DAY. MONTH. 00. YEAR | DOOR 0PM | BELL 0PM'")
-                                
-                                # Time is text after "bell"
-                                show_time = date_time.split("BELL")[1].strip()
-
-                                if len(show_time) == 3:
-                                    show_time = "0" + show_time
-
-                                # Convert the text into a datetime object
-                                if ":" in show_time:
-                                    fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I:%M%p")
-                                else:
-                                    fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I%p")
-                                logging.info(f"Formatted datetime for {show_dict['name']}: {fmt_datetime}")
-                                
-                                # Times in this format usually indicates USA shows, but no TZ is indicated, so it is not localised
-                                show_dict['time'] = fmt_datetime
-                                show_dict['date'] = show_dict['time']
-                                show_dict['source_tz'] = "local"
-
-                            # Match datetimes like: SUN. MAY. 15. 2022 | DOOR 4PM ET | BELL 5 PM ET or TUE. AUGUST. 16. 2022 | BELL 6PM JST
-                            elif (re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d[A|P]M \w{2,4} \| BELL \d[A|P]M \w{2,4}$", date_time, re.IGNORECASE) or
-                                  re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| DOOR \d[A|P]M \w{2,4} \| BELL \d [A|P]M \w{2,4}$", date_time, re.IGNORECASE) or
-                                  re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| BELL \d[A|P]M \w{2,4}$", date_time, re.IGNORECASE)):
-                                
-                                logging.info(f"Date time for {show_dict['name']} matches format 'DAY. MONTH. 00. YEAR (| DOOR 0PM TZ) | BELL 0PM TZ'")
-                                
-                                # Parse date and time from text
-                                # Date is the text up to the 4th space
-                                show_date = " ".join(date_time.split(" ")[:4])
-                                
-                                # Time is text after "bell" - convert it to eg 7PM
-                                show_time = date_time.split("BELL")[1].replace(" ", "")[:3]
-                                
-                                # Convert the text into a datetime object
-                                fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I%p")
-                                logging.info(f"Formatted datetime for {show_dict['name']}: {fmt_datetime}")
-                                
-                                # Timezone is at the end of the string
-                                show_tz = date_time.rsplit(" ", 1)[-1]
-                                logging.info(f"Timezone found for {show_dict['name']}: {show_tz}")
-                                
-                                # Match timezones from text into pytz format
-                                if show_tz == "JST":
-                                    tz = pytz.timezone("Asia/Tokyo")
-                                    show_dict['time'] = tz.localize(fmt_datetime)
-                                    show_dict['source_tz'] = "utc"
-
-                                elif show_tz == "ET":
-                                    tz = pytz.timezone("US/Eastern")
-                                    show_dict['time'] = tz.localize(fmt_datetime)
-                                    show_dict['source_tz'] = "utc"
-                                # If TZ is unrecognised, stick to local time
-                                else:
-                                    show_dict['time'] = fmt_datetime
-
-                                show_dict['date'] = show_dict['time']
-
-                            # Match datetimes like: WED. AUGUST. 10. 2022 | BELL 6:30PM JST
-                            elif re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| BELL \d:\d\d[A|P]M \w{2,4}$", date_time, re.IGNORECASE):
-                                logging.info(f"Date time for {show_dict['name']} matches format 'DAY. MONTH. 00. YEAR | BELL 0:00PM TZ'")
-                                
-                                # Parse date and time from text
-                                # Date is the text up to the 4th space
-                                show_date = " ".join(date_time.split(" ")[:4])
-
-                                # Time is text after "bell" up to the last space
-                                show_time = date_time.split("BELL")[1].rsplit(" ", 1)[0].replace(" ", "")
-
-                                if len(show_time) == 6:
-                                    show_time = "0" + show_time
-
-                                # Timezone is at the end of the string
-                                show_tz = date_time.rsplit(" ", 1)[-1]
-                                logging.info(f"Timezone found for {show_dict['name']}: {show_tz}")
-
-                                # Convert the text into a datetime object
-                                fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I:%M%p")
-                                logging.info(f"Formatted datetime for {show_dict['name']}: {fmt_datetime}")
-
-                                # Match timezones from text into pytz format
-                                if show_tz == "JST":
-                                    tz = pytz.timezone("Asia/Tokyo")
-                                    show_dict['time'] = tz.localize(fmt_datetime)
-                                    show_dict['source_tz'] = "utc"
-
-                                elif show_tz == "ET":
-                                    tz = pytz.timezone("US/Eastern")
-                                    show_dict['time'] = tz.localize(fmt_datetime)
-                                    show_dict['source_tz'] = "utc"
-                                # If TZ is unrecognised, stick to local time
-                                else:
-                                    show_dict['time'] = fmt_datetime
-
-                                show_dict['date'] = show_dict['time']
-
-                            # Match datetimes like: SAT. AUGUST. 13. 2022 | BELL 8/7c
-                            elif re.match(r"^\w{3}\. \w{3,9}\. \d{1,2}\. \d{4} \| \w{4} \d/\dc$", date_time, re.IGNORECASE):
-                                # Parse date and time from text
-                                # Date is the text up to the 4th space
-                                show_date = " ".join(date_time.split(" ")[:4])
-
-                                # Time is text after "/", central time - 
-                                show_time = "0" + date_time.split("/")[1][0] + "PM"
-
-                                # Convert the text into a datetime object
-                                fmt_datetime = datetime.strptime(show_date + " " + show_time, "%a. %B. %d. %Y %I%p")
-                                logging.info(f"Formatted datetime for {show_dict['name']}: {fmt_datetime}")
-
-                                # Shows in this format are always central time as far as I can tell
-                                tz = pytz.timezone("US/Central")
-                                show_dict['time'] = tz.localize(fmt_datetime)
-                                show_dict['source_tz'] = "local"
-
-                                show_dict['date'] = show_dict['time']
-
-                            else:
-                                logging.warn(f"Cannot match format of {show_dict['name']}")
-                            
-                            logging.debug("show_dict: " + str(show_dict))
-
-                            shows.append(show_dict)
-                            logging.info(f"Finished with {show_dict['name']}, moving to next show.")
-                        
-                        except Exception as e:
-                            logging.error(f"Unable to scrape show {event_name}: " + str(e))
+        shows = []
+        for page in pages:
+            shows += page.result()
 
         return shows
 
-    def broadcasts(self):
+    # Fetch the start times of the shows being broadcast on njpwworld
+    def broadcast_times(self):
+        logging.info("Scraping broadcasted shows")
+
+        return self.parse_pool.parse(parsers.broadcast_times,
+                                     self.fetch(self.njpw_world_schedule_url, headers=self.njpw_world_headers))
+
+    # Mark scheduled shows as live if they're broadcast on njpwworld
+    # times can be passed in if already scraped, so they can be fetched while the schedule is being updated
+    def broadcasts(self, times=None):
         logging.info("Updating broadcasted shows")
 
-        def update_live_broadcasts(broadcasts, year):
-            for broadcast in broadcasts:
+        # Count of shows updated, returned so the caller knows whether the schedule changed
+        updated = 0
+
+        if times is None:
+            try:
+                times = self.broadcast_times()
+            except Exception as e:
+                logging.error("Error trying to scrape broadcast shows: " + str(e))
+                return updated
+
+        for time in times:
+            try:
+                # Find a show with a matching datetime
+                # If live_show is already True, we don't need to update it, so filter those out
+                show = ScheduleShow.objects(time=time, live_show=False).first()
+
+                # If there's a match, update the DB
+                if show:
+                    show.update(live_show=True)
+                    updated += 1
+                    logging.info(f"New broadcast found: {show.name} ({show.date})")
+
+            except Exception as e:
+                logging.error("Error trying to update broadcast shows: " + str(e))
+
+        return updated
+
+
+    # Pull the match results from the card pages of past shows
+    # Pages are fetched RESULTS_CONCURRENCY at a time, each parsed as soon as it arrives
+    # Returns {card url: [match dicts]}, leaving out cards which couldn't be scraped or had no matches, so they're retried
+    # next time
+    def results(self, cards):
+        logging.info(f"Scraping {len(cards)} show cards")
+
+        parsed = {}
+        with ThreadPoolExecutor(max_workers=RESULTS_CONCURRENCY) as executor:
+            pages = {executor.submit(ledger.in_context(self.fetch), card): card for card in cards}
+            for page in as_completed(pages):
                 try:
-                    # Pull the date and time from the first 2 columns
-                    show_details = [s.text for s in (broadcast.find_all('td'))][:2]
-                    # Create a datetime object for the show by building a string and formatting it (Japanese time)
-
-                    # If 後日配信 is in the show details, the time has not yet been confirmed
-                    if "後日配信" in show_details:
-                        logging.info(f"No time set for {show_details}, skipping...")
-                    
-                    else: 
-                        time = pytz.timezone("Asia/Tokyo").localize(datetime.strptime(show_details[1][:5] + " " + show_details[0].split("(")[0] + " " + year, "%H:%M %m/%d %Y"))
-                        # Find a show with a matching datetime
-                        # If live_show is already True, we don't need to update it, so filter those out
-                        show = ScheduleShow.objects(time=time, live_show=False).first()
-
-                        # If there's a match, update the DB
-                        if show:
-                            show.update(live_show=True)
-                            logging.info(f"New broadcast found: {show.name} ({show.date})")
-                    
+                    parsed[pages[page]] = self.parse_pool.submit(parsers.match_results, page.result())
                 except Exception as e:
-                    logging.error("Error trying to update broadcast shows: " + str(e))
-        
-        try:
-            # Custom headers are needed otherwise njpwworld gives an unsupported browser error
-            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.190 Safari/537.36'}
-            session = requests.get("https://njpwworld.com/feature/schedule#googtrans(en)", headers=headers)
-            soup = BeautifulSoup(session.text, "html.parser")
-
-            # Tab1 contains the schedule, tab2 is past events
-            schedule = soup.find("div", id="tab1")
-            # Each month's shows is listed in a seperate table
-            months = schedule.find_all("table")
-            # The year isn't in individual dates, so pull it from the table headers
-            years = soup.find_all("h1", class_="ttl-schedule menu-ja")
-
-            # In the source text, both the english and japanese calendars are there - even indices are japanese tables, odds are english
-            # Ignore tr[0] as it's the table header. The year is spliced from the text header (ie "2021年2月配信予定一覧")
-            
-            # Update current month's shows
-            update_live_broadcasts(months[0].find_all('tr')[1:], years[0].text[:4])
-            
-            # Update next month's shows if the schedule exists
-            if len(months) > 2:
-                update_live_broadcasts(months[2].find_all('tr')[1:], years[1].text[:4])
-        
-        except Exception as e:
-            logging.error("Error trying to scrape broadcast shows: " + str(e))
+                    logging.error(f"Error trying to scrape results from {pages[page]}: " + str(e))
 
+        results = {}
+        for card, matches in parsed.items():
+            try:
+                matches = matches.result()
+            except Exception as e:
+                logging.error(f"Error trying to parse results from {card}: " + str(e))
+                continue
+
+            # A card with no matches is either not announced yet or a page that didn't parse, so it is left out rather
+            # than replacing what's stored, and the show stays due
+            if matches:
+                results[card] = matches
+            else:
+                logging.warning(f"No matches found on {card}")
 
-    # TODO: create function to pull the results from past show(s)
-    def results(self):
-        pass
+        return results
 
     # Build a list of the profiles on njpw1972.com
     # Loop through the profiles to pull more info from each wrestler's individual profile page
     def profiles(self):
         logging.info("Updating profiles")
 
-        soup = self.create_soup(self.njpw_profiles_url, "lxml")
-        profile_list = soup.find("ul", class_="wrestlerList").find_all("li")
-
-        # Create the list of profile dicts
-        profiles = []
-
-        # For each profile on the page, we create a dict containing info which is then added to with the info in the individual profile page
-        for profile in profile_list:
-            profile_dict = {
-                "name": profile.find("p", class_="name").get_text().strip(),
-                "link": profile.find("a")["href"],
-                "render": profile.find("img")["src"],
-                "attributes": {}
-            }
-            profiles.append(profile_dict)
-
-            logging.debug("Found profile: " + profile_dict['name'])
-
-        # Create a dict of possible attributes so that we can loop through try/except statements
-        # [name of key in wrestler's dict]: [text used to identify this data in the soup]
-        profile_attributes = {
-            "height": "HEIGHT",
-            "weight": "WEIGHT",
-            "birthday": "YEAR OF BIRTH",
-            "birthplace": "PLACE OF BIRTH",
-            "bloodtype": "BLOOD TYPE",
-            "debut": "DEBUT",
-            "finisher": "FINISH HOLD",
-            "theme": "THEME SONG",
-            "blog": "BLOG"
-        }
-
-        # For each profile found on the profiles page and pull all of their attributes into a dict
-        for profile in profiles:
-            profile_soup = self.create_soup(profile["link"], "lxml").find("div", class_="profileDetail")
-
-            # Loop through the profile_attributes dict, adding the key and value to the individual dict of the wrestler
-            for key in profile_attributes:
-                # BeautifulSoup throws an AttributeError exception if the element is not found, so we need to catch these because the attributes listed for each wrestler is not consistent
-                try:
-                    profile["attributes"][key] = profile_soup.find("dt", text=profile_attributes[key]).findNext("dd").get_text().strip()
-                except AttributeError:
-                    pass
-
-            # Find UNIT separately from the loop as it's stored in a p tag
-            try:
-                profile["attributes"]["unit"] = profile_soup.find("p", text="UNIT").findNext("p").get_text().strip()
-            except AttributeError:
-                pass
+        profiles = self.parse_pool.parse(parsers.profile_list, self.fetch(self.njpw_profiles_url))
 
-            # For twitter, we're pulling the link, not the text, so this is done separately
-            try:
-                profile["attributes"]["twitter"] = profile_soup.find("dt", text="TWITTER").findNext("a")["href"]
-            except AttributeError:
-               pass
+        # For each profile found on the profiles page, pull all of their attributes and their bio from their own page
+        # Pages are fetched PROFILES_CONCURRENCY at a time and handed to the parse pool as each arrives, so several are
+        # parsed at once while the rest are fetched
+        details = [None] * len(profiles)
+        with ThreadPoolExecutor(max_workers=PROFILES_CONCURRENCY) as executor:
+            pages = {executor.submit(ledger.in_context(self.fetch), profile["link"]): i
+                     for i, profile in enumerate(profiles)}
+            for page in as_completed(pages):
+                try:
+                    details[pages[page]] = self.parse_pool.submit(parsers.profile_detail, page.result())
+                except Exception as e:
+                    logging.error(f"Error trying to scrape profile {profiles[pages[page]]['name']}: " + str(e))
 
-            # The bio is in a textBox div
+        for profile, detail in zip(profiles, details):
             try:
-                profile["bio"] = profile_soup.find("div", class_="textBox").get_text().strip()
-            except AttributeError:
-                pass
-
-            logging.debug("profile: " + str(profile))
+                detail = detail.result() if detail else None
+            except Exception as e:
+                logging.error(f"Error trying to parse profile {profile['name']}: " + str(e))
+                detail = None
+
+            # A profile whose page couldn't be scraped is still returned, so it isn't marked as removed, but without
+            # attributes, so those already stored are kept until its page can be scraped again
+            if detail is None:
+                del profile["attributes"]
+                continue
+
+            profile["attributes"].update(detail["attributes"])
+            if detail["bio"] is not None:
+                profile["bio"] = detail["bio"]
+
+            logging.debug("profile: %s", profile)
         
         return profiles
@@ -1,11 +1,13 @@
 """
 A set of tools for manual interaction with the scraper
 """
+import datetime
 import logging
 
+import appearances
 from scraper import Scraper
 from database.models import (
-    PodcastEpisode
+    CollectionVersion, MatchResult, PodcastEpisode, Profile, ProfileBio, ResultShow
 )
 
 scraper = Scraper()
@@ -21,4 +23,31 @@ def update_all_pods():
             # Overwrite the new field to prevent spamming the discord
             e["new"] = False
             episode = PodcastEpisode(**e).save()
-            logging.info("New Podcast Episode Added: " + episode.title)
\ No newline at end of file
+            logging.info("New Podcast Episode Added: " + episode.title)
+
+    CollectionVersion.bump("podcast_episode")
+
+# Move bios stored on profile documents into the profile_bio collection
+# update_profiles does this gradually as it scrapes, this does it in one go
+def migrate_bios():
+    profiles = Profile.objects(__raw__={"bio": {"$exists": True}}).only("name", "bio")
+
+    for p in profiles:
+        ProfileBio.objects(name=p.name).update_one(set__bio=p.bio, set__updated_at=datetime.datetime.now(), upsert=True)
+        Profile.objects(name=p.name).update_one(unset__bio=True)
+        logging.info("Bio moved to profile_bio: " + p.name)
+
+# Build the appearances index from the match results already stored, ie for cards scraped before the index existed
+# update_shows keeps it up to date from then on
+def rebuild_appearances():
+    roster = appearances.roster()
+
+    for show in ResultShow.objects(results_fetched_at__ne=None, card__ne=None).only("name", "date", "time", "city",
+                                                                                      "venue", "card"):
+        matches = [
+            {"participants": m.participants, "winners": m.winners, "losers": m.losers}
+            for m in MatchResult.objects(card=show.card).only("participants", "winners", "losers")
+        ]
+        appearances.replace(show, matches, roster, scheduled=False)
+
+    CollectionVersion.bump("appearance")